@@ -0,0 +1,191 @@
+import concurrent.futures
+import struct
+import time
+
+from testUtils import Account
+from testUtils import Utils
+from TransactionSigner import PrivateKey
+from TransactionSigner import packPublicKey
+from TransactionSigner import signatureDigest
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import packAction
+from TransactionCorpus import packAsset
+from TransactionCorpus import packName
+from TransactionCorpus import packString
+from TransactionCorpus import packTransaction
+from TransactionCorpus import packVarUint32
+
+###############################################################
+# AccountFactory
+#  Creates test accounts in bulk.  Instead of a cleos call per account (and per newaccount, buyram, delegatebw and
+#  funding transfer), the factory packs the actions of accountsPerTransaction accounts into one transaction, signs it
+#  with the creator's key in process (TransactionSigner) and pushes the transactions over http to all given nodes
+#  concurrently.  A transaction the chain refuses (e.g. for exceeding the transaction cpu or net limit) is split in
+#  half and retried, down to single accounts.  Keys are generated in process as well, see createAccountKeys.
+#
+#  verify checks that the accounts exist with as few queries as possible: funded accounts are listed page by page
+#  with get_table_by_scope on the eosio.token accounts table, otherwise get_account is fanned out over the nodes.
+###############################################################
+
+class AccountFactory(object):
+    DefaultAccountsPerTransaction=100
+    DefaultWorkers=8
+    ScopesPerPage=1000
+    NameCharacters="12345abcdefghijklmnopqrstuvwxyz"
+
+    def __init__(self, nodes, creator, accountsPerTransaction=DefaultAccountsPerTransaction, systemContract=False, stakeNet=100, stakeCPU=100,
+                 buyRAM=10000, stakedDeposit=0, workers=DefaultWorkers):
+        """nodes: the nodes the transactions are pushed to, round-robin.
+        creator: Account creating and paying for the accounts, needs activePrivateKey.
+        systemContract: also buy ram and delegate stakeNet and stakeCPU (whole units of CORE_SYMBOL), as cleos system
+                        newaccount does, for chains running eosio.system.
+        stakedDeposit: amount in the smallest unit of CORE_SYMBOL transferred from creator to each account."""
+        assert(len(nodes) > 0)
+        assert(isinstance(creator, Account))
+        assert(creator.activePrivateKey is not None)
+        self.nodes=nodes
+        self.creator=creator
+        self.creatorKey=PrivateKey.fromString(creator.activePrivateKey)
+        self.accountsPerTransaction=accountsPerTransaction
+        self.systemContract=systemContract
+        self.stakeNet=stakeNet
+        self.stakeCPU=stakeCPU
+        self.buyRAM=buyRAM
+        self.stakedDeposit=stakedDeposit
+        self.workers=workers
+
+    @staticmethod
+    def accountName(prefix, index):
+        """Account name of prefix followed by index in the 31 characters valid in names, 12 characters long."""
+        digits=12 - len(prefix)
+        assert(digits > 0 and index < len(AccountFactory.NameCharacters) ** digits)
+        chars=[]
+        for _ in range(digits):
+            chars.append(AccountFactory.NameCharacters[index % len(AccountFactory.NameCharacters)])
+            index//=len(AccountFactory.NameCharacters)
+        return prefix + "".join(reversed(chars))
+
+    @staticmethod
+    def createAccountKeys(count, prefix="acct", first=0):
+        """count Accounts named accountName(prefix, first...), with new owner and active keys, without a cleos call."""
+        accounts=[]
+        for index in range(first, first + count):
+            account=Account(AccountFactory.accountName(prefix, index))
+            ownerKey=PrivateKey.generate()
+            activeKey=PrivateKey.generate()
+            account.ownerPrivateKey=ownerKey.toWif()
+            account.ownerPublicKey=ownerKey.publicKey()
+            account.activePrivateKey=activeKey.toWif()
+            account.activePublicKey=activeKey.publicKey()
+            accounts.append(account)
+        return accounts
+
+    @staticmethod
+    def packAuthority(publicKey):
+        """Single key authority of weight 1, threshold 1."""
+        return struct.pack("<I", 1) + packVarUint32(1) + packPublicKey(publicKey) + struct.pack("<H", 1) + packVarUint32(0) + packVarUint32(0)
+
+    def actions(self, account):
+        """The packed actions creating one account."""
+        creator=self.creator.name
+        authorization=[(creator, "active")]
+        actions=[packAction("eosio", "newaccount", authorization, packName(creator) + packName(account.name) +
+                            AccountFactory.packAuthority(account.ownerPublicKey) + AccountFactory.packAuthority(account.activePublicKey))]
+        if self.systemContract:
+            actions.append(packAction("eosio", "buyram", authorization, packName(creator) + packName(account.name) + packAsset(self.buyRAM * 10000)))
+            actions.append(packAction("eosio", "delegatebw", authorization, packName(creator) + packName(account.name) + packAsset(self.stakeNet * 10000) +
+                                      packAsset(self.stakeCPU * 10000) + b"\0"))
+        if self.stakedDeposit > 0:
+            actions.append(packAction("eosio.token", "transfer", authorization, packName(creator) + packName(account.name) + packAsset(self.stakedDeposit) +
+                                      packString("init")))
+        return actions
+
+    def __transaction(self, accounts, tapos):
+        actions=[action for account in accounts for action in self.actions(account)]
+        packedTrx=packTransaction(tapos["expiration"], tapos["refBlockNum"], tapos["refBlockPrefix"], actions)
+        signature=self.creatorKey.sign(signatureDigest(tapos["chainId"], packedTrx))
+        return '{"signatures":["%s"],"compression":"none","packed_context_free_data":"","packed_trx":"%s"}' % (signature, packedTrx.hex())
+
+    def __push(self, node, accounts, tapos):
+        """Push the creation of accounts to node, splitting the transaction on failure. Returns the transaction ids,
+        None if a single account could not be created."""
+        trans=node.processUrllibRequest("chain", "push_transaction", self.__transaction(accounts, tapos), silentErrors=len(accounts) > 1)
+        if trans is not None:
+            return [trans["transaction_id"]]
+        if len(accounts) == 1:
+            Utils.Print("ERROR: Failed to create account %s on node port %d" % (accounts[0].name, node.port))
+            return None
+        half=len(accounts) // 2
+        if Utils.Debug: Utils.Print("Splitting creation of %d accounts on node port %d" % (len(accounts), node.port))
+        first=self.__push(node, accounts[:half], tapos)
+        second=self.__push(node, accounts[half:], tapos)
+        return None if first is None or second is None else first + second
+
+    def create(self, accounts, waitForTransBlock=True, timeout=None):
+        """Create accounts. With waitForTransBlock, also wait until all creating transactions are in blocks of the
+        first node. Returns the transaction ids, None on failure."""
+        if len(accounts) == 0:
+            return []
+        node=self.nodes[0]
+        tapos=TransactionCorpus.taposFromNode(node)
+        firstBlockNum=node.getHeadBlockNum()
+        batches=[accounts[i:i + self.accountsPerTransaction] for i in range(0, len(accounts), self.accountsPerTransaction)]
+        start=time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures=[executor.submit(self.__push, self.nodes[i % len(self.nodes)], batch, tapos) for i, batch in enumerate(batches)]
+            results=[future.result() for future in futures]
+        if any(result is None for result in results):
+            return None
+        transIds=[transId for result in results for transId in result]
+        Utils.Print("Pushed creation of %d accounts in %d transactions in %.3f sec" % (len(accounts), len(transIds), time.perf_counter() - start))
+
+        if waitForTransBlock and not node.waitForTransactionsInBlocks(transIds, firstBlockNum, timeout=timeout):
+            return None
+        return transIds
+
+    def __existingScopes(self, node, accounts):
+        """Names of the accounts with a row in the eosio.token accounts table, one get_table_by_scope per page."""
+        names=sorted(account.name for account in accounts)
+        found=set()
+        lowerBound=names[0]
+        while True:
+            page=node.processUrllibRequest("chain", "get_table_by_scope", {"code": "eosio.token", "table": "accounts", "lower_bound": lowerBound,
+                                            "upper_bound": names[-1], "limit": AccountFactory.ScopesPerPage}, exitOnError=True)
+            found.update(row["scope"] for row in page["rows"])
+            if not page["more"]:
+                return found
+            lowerBound=page["more"]
+
+    def verify(self, accounts):
+        """Check that all accounts exist. Returns False if any is missing."""
+        if len(accounts) == 0:
+            return True
+        start=time.perf_counter()
+        if self.stakedDeposit > 0:
+            found=self.__existingScopes(self.nodes[0], accounts)
+            missing=[account.name for account in accounts if account.name not in found]
+        else:
+            def exists(index):
+                node=self.nodes[index % len(self.nodes)]
+                return node.processUrllibRequest("chain", "get_account", {"account_name": accounts[index].name}, silentErrors=True) is not None
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                missing=[account.name for account, found in zip(accounts, executor.map(exists, range(len(accounts)))) if not found]
+        if len(missing) > 0:
+            Utils.Print("ERROR: %d of %d accounts not found, e.g. %s" % (len(missing), len(accounts), ", ".join(missing[:5])))
+            return False
+        if Utils.Debug: Utils.Print("Verified %d accounts in %.3f sec" % (len(accounts), time.perf_counter() - start))
+        return True
+
+class NewAccountFactory(object):
+    """TransactionCorpus factory creating one account per transaction, named AccountFactory.accountName(prefix, index)
+    with publicKey as owner and active key, by the corpus accounts round-robin.  For chains without eosio.system."""
+    def __init__(self, publicKey, prefix="corp"):
+        self.publicKey=publicKey
+        self.prefix=prefix
+
+    def __call__(self, index, accountNames):
+        creatorIndex=index % len(accountNames)
+        creator=accountNames[creatorIndex]
+        authority=AccountFactory.packAuthority(self.publicKey)
+        data=packName(creator) + packName(AccountFactory.accountName(self.prefix, index)) + authority + authority
+        return creatorIndex, [packAction("eosio", "newaccount", [(creator, "active")], data)], []
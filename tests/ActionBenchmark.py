@@ -0,0 +1,121 @@
+import time
+
+from testUtils import Utils
+
+###############################################################
+# ActionBenchmark
+#  Microbenchmark of contract actions.  Every invocation is pushed as its own transaction (cleos push action) and the
+#  trace nodeos returns is kept: the billed cpu_usage_us and net_usage_words of the receipt and the elapsed time of
+#  the benchmarked action itself (its action trace, so it excludes the rest of the transaction).  Billed cpu is what
+#  the VM and contract changes show up in, the push wall time is recorded too but is dominated by cleos.
+#
+#  Statistics are robust to the occasional slow invocation (a block switch, a page fault, a gc): samples whose
+#  modified z-score, 0.6745 * |x - median| / MAD, is above OutlierCutoff are rejected before the median, MAD and
+#  mean are reported.
+###############################################################
+
+OutlierCutoff=3.5
+
+def median(samples):
+    ordered=sorted(samples)
+    middle=len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 == 1 else (ordered[middle - 1] + ordered[middle]) / 2
+
+def robustSummary(samples, cutoff=OutlierCutoff):
+    """median, MAD (median absolute deviation), mean, min and max of samples after rejecting outliers, None without
+    samples."""
+    if len(samples) == 0:
+        return None
+    center=median(samples)
+    mad=median([abs(sample - center) for sample in samples])
+    kept=samples if mad == 0 else [sample for sample in samples if 0.6745 * abs(sample - center) / mad <= cutoff]
+    center=median(kept)
+    return {
+        "count": len(samples),
+        "rejected": len(samples) - len(kept),
+        "median": center,
+        "mad": median([abs(sample - center) for sample in kept]),
+        "mean": sum(kept) / len(kept),
+        "min": min(kept),
+        "max": max(kept)
+    }
+
+class ActionBenchmark(object):
+    Metrics=[("cpuUs", "us"), ("netWords", "words"), ("elapsedUs", "us"), ("pushSeconds", "s")]
+
+    def __init__(self, node, contract, forceUnique=True):
+        """contract: account the contract is deployed to. forceUnique: let cleos add a nonce so that identical
+        invocations are not rejected as duplicates, the nonce is billed with the transaction but not in elapsedUs."""
+        self.node=node
+        self.contract=contract
+        self.forceUnique=forceUnique
+        self.samples={}
+        self.transIds=[]
+
+    @staticmethod
+    def deploy(node, creator, account, contractDir, wasmFile, abiFile):
+        """Create account (an Account with keys in the wallet) and publish the contract to it, e.g. from
+        unittests/contracts/eosio.token. Returns an ActionBenchmark for it."""
+        node.createAccount(account, creator, stakedDeposit=0, waitForTransBlock=True, exitOnError=True)
+        if node.publishContract(account.name, contractDir, wasmFile, abiFile, waitForTransBlock=True) is None:
+            Utils.errorExit("Failed to publish contract %s to %s" % (contractDir, account.name))
+        return ActionBenchmark(node, account.name)
+
+    def __actionElapsed(self, trans, action):
+        for actionTrace in trans["processed"]["action_traces"]:
+            if actionTrace["act"]["account"] == self.contract and actionTrace["act"]["name"] == action:
+                return actionTrace["elapsed"]
+        return None
+
+    def run(self, action, dataFunc, count, authorizers, warmup=5):
+        """Push warmup + count invocations of action, the data of invocation index is dataFunc(index) (a json string),
+        authorized by the active permission of authorizers[index % len(authorizers)]. Returns the samples of the
+        count measured invocations. The ids of all pushed transactions, warm-up included, are appended to transIds."""
+        samples=self.samples.setdefault(action, {metric: [] for metric, _ in ActionBenchmark.Metrics})
+        opts="-f " if self.forceUnique else ""
+        for index in range(warmup + count):
+            authorizer=authorizers[index % len(authorizers)]
+            start=time.perf_counter()
+            success, trans=self.node.pushMessage(self.contract, action, dataFunc(index), opts + "--permission %s@active" % (authorizer.name))
+            pushSeconds=time.perf_counter() - start
+            if not success:
+                Utils.errorExit("Failed to push %s::%s invocation %d: %s" % (self.contract, action, index, trans))
+            self.transIds.append(trans["transaction_id"])
+            if index < warmup:
+                continue
+            receipt=trans["processed"]["receipt"]
+            samples["cpuUs"].append(receipt["cpu_usage_us"])
+            samples["netWords"].append(receipt["net_usage_words"])
+            samples["elapsedUs"].append(self.__actionElapsed(trans, action))
+            samples["pushSeconds"].append(pushSeconds)
+        return samples
+
+    def results(self):
+        """robustSummary of every metric of every benchmarked action."""
+        return {action: {metric: robustSummary([sample for sample in samples[metric] if sample is not None]) for metric, _ in ActionBenchmark.Metrics}
+                for action, samples in self.samples.items()}
+
+    def warmupCurve(self, action, metric="elapsedUs", bucket=10):
+        """Median of metric over consecutive buckets of invocations, in push order. With a run without warmup it
+        shows how an action speeds up once its code is cached or, with EOS VM OC, compiled."""
+        samples=self.samples.get(action, {}).get(metric, [])
+        return [median([sample for sample in samples[first:first + bucket] if sample is not None] or [0]) for first in range(0, len(samples), bucket)]
+
+    def addToResults(self, benchmarkResults, benchmark):
+        """Add the median billed cpu and action elapsed time of every action as one sample each to a Benchmark.BenchmarkResults."""
+        for action, summaries in self.results().items():
+            for metric in ("cpuUs", "elapsedUs"):
+                if summaries[metric] is not None:
+                    benchmarkResults.addSample(benchmark, "%s.%sMedian" % (action, metric), summaries[metric]["median"], "us", False)
+
+    def printReport(self, results=None):
+        results=self.results() if results is None else results
+        Utils.Print("Action benchmark of contract %s" % (self.contract))
+        for action, summaries in results.items():
+            for metric, unit in ActionBenchmark.Metrics:
+                summary=summaries[metric]
+                if summary is None:
+                    continue
+                Utils.Print("  %-16s %-12s median=%10.3f MAD=%9.3f mean=%10.3f min=%10.3f max=%10.3f %-5s n=%d rejected=%d" %
+                            (action, metric, summary["median"], summary["mad"], summary["mean"], summary["min"], summary["max"], unit,
+                             summary["count"], summary["rejected"]))
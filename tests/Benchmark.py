@@ -0,0 +1,188 @@
+import collections
+import datetime
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+
+from testUtils import Utils
+
+###############################################################
+# Benchmark
+#  Result keeping and comparison for nodeos performance benchmarks.  BenchmarkResults collects repeated samples of
+#  named metrics per benchmark together with the environment they were measured in (host, nodeos build, version
+#  label, seed), and reads and writes them as json.  compareResults tests every metric of two result files for a
+#  change between the builds with a permutation test on the sample means, and flags a regression when the change is
+#  both significant and larger than a minimum relative change in the metric's bad direction.
+###############################################################
+
+class BenchmarkResults(object):
+    FormatVersion=1
+
+    def __init__(self, environment=None, benchmarks=None):
+        self.environment=environment if environment is not None else {}
+        self.benchmarks=benchmarks if benchmarks is not None else collections.OrderedDict()
+
+    @staticmethod
+    def collectEnvironment(label="current", seed=None, nodeosPath=None):
+        """Description of where and with what the results are measured."""
+        nodeosPath=Utils.EosServerPath if nodeosPath is None else nodeosPath
+        environment={
+            "formatVersion": BenchmarkResults.FormatVersion,
+            "utcTime": str(datetime.datetime.utcnow()),
+            "label": label,
+            "seed": seed,
+            "nodeosPath": nodeosPath,
+            "nodeosVersion": BenchmarkResults.__commandOutput([nodeosPath, "--full-version"]) or BenchmarkResults.__commandOutput([nodeosPath, "--version"]),
+            "clientVersion": BenchmarkResults.__commandOutput([Utils.EosClientPath, "version", "full"]),
+            "host": platform.node(),
+            "os": platform.platform(),
+            "processor": platform.processor(),
+            "cpuCount": multiprocessing.cpu_count(),
+            "memTotalKb": BenchmarkResults.__memTotal(),
+            "python": platform.python_version()
+        }
+        return environment
+
+    @staticmethod
+    def __commandOutput(cmd):
+        try:
+            return subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode("utf-8").strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def __memTotal():
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
+
+    def addSample(self, benchmark, metric, value, unit, higherIsBetter):
+        metrics=self.benchmarks.setdefault(benchmark, collections.OrderedDict())
+        entry=metrics.setdefault(metric, {"unit": unit, "higherIsBetter": higherIsBetter, "samples": []})
+        entry["samples"].append(value)
+
+    def samples(self, benchmark, metric):
+        return self.benchmarks.get(benchmark, {}).get(metric, {}).get("samples", [])
+
+    def toDict(self):
+        benchmarks=collections.OrderedDict()
+        for benchmark, metrics in self.benchmarks.items():
+            benchmarks[benchmark]=collections.OrderedDict()
+            for metric, entry in metrics.items():
+                summary=dict(entry)
+                summary["summary"]=BenchmarkResults.summarize(entry["samples"])
+                benchmarks[benchmark][metric]=summary
+        return {"environment": self.environment, "benchmarks": benchmarks}
+
+    def write(self, path):
+        directory=os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w") as f:
+            json.dump(self.toDict(), f, indent=2)
+
+    @staticmethod
+    def load(path):
+        with open(path, "r") as f:
+            content=json.load(f, object_pairs_hook=collections.OrderedDict)
+        benchmarks=collections.OrderedDict()
+        for benchmark, metrics in content["benchmarks"].items():
+            benchmarks[benchmark]=collections.OrderedDict((metric, {"unit": entry["unit"], "higherIsBetter": entry["higherIsBetter"], "samples": entry["samples"]}) for metric, entry in metrics.items())
+        return BenchmarkResults(content["environment"], benchmarks)
+
+    @staticmethod
+    def summarize(samples):
+        if len(samples) == 0:
+            return None
+        mean=sum(samples) / len(samples)
+        stdev=math.sqrt(sum((sample - mean) ** 2 for sample in samples) / (len(samples) - 1)) if len(samples) > 1 else 0.0
+        return {"count": len(samples), "mean": mean, "stdev": stdev, "min": min(samples), "max": max(samples)}
+
+    def printReport(self):
+        Utils.Print("Benchmark results for %s (seed %s)" % (self.environment.get("label"), self.environment.get("seed")))
+        for benchmark, metrics in self.benchmarks.items():
+            for metric, entry in metrics.items():
+                summary=BenchmarkResults.summarize(entry["samples"])
+                if summary is None:
+                    continue
+                Utils.Print("  %-20s %-24s mean=%12.3f stdev=%10.3f n=%d %s" % (benchmark, metric, summary["mean"], summary["stdev"], summary["count"], entry["unit"]))
+
+def permutationPValue(baseline, candidate, rounds=20000, seed=0):
+    """Two sided p-value of the difference of the sample means, over all relabelings of the pooled samples when there
+    are at most rounds of them, otherwise over rounds random ones."""
+    pooled=list(baseline) + list(candidate)
+    n=len(baseline)
+    observed=abs(sum(candidate) / len(candidate) - sum(baseline) / n)
+    total=sum(pooled)
+    # a tiny tolerance, so relabelings with the same difference as the observed one count despite rounding
+    threshold=observed - 1e-12 * max(1.0, abs(observed))
+    def extreme(indices):
+        baselineSum=sum(pooled[i] for i in indices)
+        return abs((total - baselineSum) / len(candidate) - baselineSum / n) >= threshold
+
+    if math.factorial(len(pooled)) // (math.factorial(n) * math.factorial(len(candidate))) <= rounds:
+        count=0
+        hits=0
+        for indices in itertools.combinations(range(len(pooled)), n):
+            count+=1
+            if extreme(indices):
+                hits+=1
+        return hits / count
+
+    rng=random.Random(seed)
+    hits=sum(1 for _ in range(rounds) if extreme(rng.sample(range(len(pooled)), n)))
+    return (hits + 1) / (rounds + 1)
+
+Regression="regression"
+Improvement="improvement"
+Unchanged="unchanged"
+Insufficient="insufficient samples"
+
+def compareResults(baseline, candidate, alpha=0.05, minChange=0.05):
+    """Compare every metric present in both BenchmarkResults. Returns a list of rows with the relative change of the
+    mean (positive is worse), the p-value and a verdict: regression, improvement, unchanged or insufficient samples
+    (fewer than 2 samples on a side, or too few for any relabeling to reach alpha)."""
+    rows=[]
+    for benchmark, metrics in candidate.benchmarks.items():
+        for metric, entry in metrics.items():
+            baseSamples=baseline.samples(benchmark, metric)
+            candSamples=entry["samples"]
+            if len(baseSamples) == 0 or len(candSamples) == 0:
+                continue
+            baseMean=sum(baseSamples) / len(baseSamples)
+            candMean=sum(candSamples) / len(candSamples)
+            change=(candMean - baseMean) / abs(baseMean) if baseMean != 0 else (0.0 if candMean == 0 else math.inf)
+            if entry["higherIsBetter"]:
+                change=-change
+            pValue=None
+            combinations=math.factorial(len(baseSamples) + len(candSamples)) // (math.factorial(len(baseSamples)) * math.factorial(len(candSamples)))
+            if len(baseSamples) < 2 or len(candSamples) < 2 or 2.0 / combinations > alpha:
+                verdict=Insufficient
+            else:
+                pValue=permutationPValue(baseSamples, candSamples)
+                if pValue >= alpha or abs(change) < minChange:
+                    verdict=Unchanged
+                else:
+                    verdict=Regression if change > 0 else Improvement
+            rows.append({"benchmark": benchmark, "metric": metric, "unit": entry["unit"], "baseline": baseMean, "candidate": candMean,
+                         "change": change, "pValue": pValue, "verdict": verdict})
+    return rows
+
+def printComparison(rows, baselineLabel, candidateLabel):
+    """Print the rows of compareResults, returns the number of regressions."""
+    Utils.Print("Comparing %s (baseline) to %s, change is positive when worse" % (baselineLabel, candidateLabel))
+    for row in rows:
+        pValue="p=%.3f" % (row["pValue"]) if row["pValue"] is not None else "p=n/a"
+        Utils.Print("  %-20s %-24s %12.3f -> %12.3f %s  %+7.1f%%  %-8s %s" % (row["benchmark"], row["metric"], row["baseline"], row["candidate"], row["unit"],
+                    row["change"] * 100, pValue, row["verdict"].upper() if row["verdict"] == Regression else row["verdict"]))
+    return sum(1 for row in rows if row["verdict"] == Regression)
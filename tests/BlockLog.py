@@ -0,0 +1,287 @@
+import array
+import errno
+import fcntl
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+from testUtils import Utils
+
+###############################################################
+# BlockLog
+#  Reads the blocks.log / blocks.index pair written by nodeos and builds new, valid block logs out of block number
+#  ranges of it (extract, split, trim, prefix clones).  Block bytes are moved with os.copy_file_range (falling back
+#  to os.sendfile) or reflinked when the filesystem supports it, so they never pass through python.  Only the header,
+#  the 8 byte position stored after each block and the index are regenerated.
+#
+#  blocks.log layout (version 3):
+#    uint32 version | uint32 first_block_num | genesis_state (first_block_num == 1) or chain_id |
+#    uint64 totem (npos) | { packed signed_block | uint64 position of that block } ...
+#  blocks.index: uint64 position of each block, starting with first_block_num
+###############################################################
+
+class BlockLog(object):
+    LogFileName="blocks.log"
+    IndexFileName="blocks.index"
+    MinSupportedVersion=1
+    MaxSupportedVersion=3
+    Npos=0xffffffffffffffff
+    ChainIdSize=32
+    PosSize=8
+    # offset from the start of a packed block to the big endian number of the block before it (see trim_data::blknum_offset)
+    BlockNumOffset=14
+    # linux FICLONE ioctl, used to reflink a file on filesystems that support it (btrfs, xfs)
+    Ficlone=0x40049409
+
+    def __init__(self, blocksDir):
+        self.blocksDir=blocksDir
+        self.logFileName=os.path.join(blocksDir, BlockLog.LogFileName)
+        self.indexFileName=os.path.join(blocksDir, BlockLog.IndexFileName)
+
+        with open(self.logFileName, "rb") as f:
+            (self.version,)=struct.unpack("<I", f.read(4))
+            if self.version < BlockLog.MinSupportedVersion or self.version > BlockLog.MaxSupportedVersion:
+                raise RuntimeError("Unsupported version %d of block log %s" % (self.version, self.logFileName))
+            self.firstBlockNum=1 if self.version == 1 else struct.unpack("<I", f.read(4))[0]
+
+        self.logSize=os.path.getsize(self.logFileName)
+        indexSize=os.path.getsize(self.indexFileName)
+        if indexSize % BlockLog.PosSize != 0:
+            raise RuntimeError("Block index %s has a partial entry, size %d" % (self.indexFileName, indexSize))
+        self.lastBlockNum=self.firstBlockNum + indexSize // BlockLog.PosSize - 1
+        if self.lastBlockNum < self.firstBlockNum:
+            raise RuntimeError("Block log %s does not contain any blocks" % (self.logFileName))
+
+        self.firstBlockPos=self.blockPos(self.firstBlockNum)
+        with open(self.logFileName, "rb") as f:
+            self.header=f.read(self.firstBlockPos)
+        self.chainId=self.__chainId()
+        if Utils.Debug: Utils.Print("Block log %s version %d contains blocks %d through %d" % (self.logFileName, self.version, self.firstBlockNum, self.lastBlockNum))
+
+    def containsGenesisState(self):
+        return self.version <= 2 or self.firstBlockNum == 1
+
+    def __genesisBytes(self):
+        assert(self.containsGenesisState())
+        if self.version == 1:
+            return self.header[4:]
+        return self.header[8:-BlockLog.PosSize]
+
+    def __chainId(self):
+        if self.containsGenesisState():
+            # chain id is the sha256 of the packed genesis state
+            return hashlib.sha256(self.__genesisBytes()).digest()
+        return self.header[8:8+BlockLog.ChainIdSize]
+
+    def extractGenesis(self, genesisFile):
+        """Write the genesis state of the chain as json to genesisFile (nodeos --extract-genesis-json), as the chain was
+        started; the launcher overrides the timestamp of the genesis.json in the config dir. Returns genesisFile, None
+        if nodeos could not extract it."""
+        scratchDir=tempfile.mkdtemp(prefix="genesis-extract", dir=os.path.dirname(os.path.abspath(genesisFile)))
+        cmd=[Utils.EosServerPath, "--blocks-dir", os.path.abspath(self.blocksDir), "--data-dir", scratchDir, "--config-dir", scratchDir,
+             "--extract-genesis-json", genesisFile]
+        if Utils.Debug: Utils.Print("cmd: %s" % (" ".join(cmd)))
+        try:
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        finally:
+            shutil.rmtree(scratchDir, ignore_errors=True)
+        return genesisFile if os.path.exists(genesisFile) else None
+
+    def blockPositions(self, first=None, last=None):
+        """Return an array('Q') with the blocks.log position of each block from first to last (inclusive)."""
+        first=self.firstBlockNum if first is None else first
+        last=self.lastBlockNum if last is None else last
+        self.__checkRange(first, last)
+        positions=array.array("Q")
+        with open(self.indexFileName, "rb") as f:
+            f.seek((first - self.firstBlockNum) * BlockLog.PosSize)
+            positions.fromfile(f, last - first + 1)
+        if sys.byteorder != "little":
+            positions.byteswap()
+        return positions
+
+    def blockPos(self, blockNum):
+        """Return the blocks.log position of blockNum, or the end of the block log for lastBlockNum+1."""
+        if blockNum == self.lastBlockNum + 1:
+            return self.logSize
+        pos=self.blockPositions(blockNum, blockNum)[0]
+        self.__verifyBlockNum(blockNum, pos)
+        return pos
+
+    def __verifyBlockNum(self, blockNum, pos):
+        with open(self.logFileName, "rb") as f:
+            f.seek(pos + BlockLog.BlockNumOffset)
+            (previous,)=struct.unpack(">I", f.read(4))
+        if previous + 1 != blockNum:
+            raise RuntimeError("Block log %s has block %d at position %d where block %d was expected" % (self.logFileName, previous + 1, pos, blockNum))
+
+    def __checkRange(self, first, last):
+        if first < self.firstBlockNum or last > self.lastBlockNum or first > last:
+            raise RuntimeError("Block range [%d, %d] is not within [%d, %d] of %s" % (first, last, self.firstBlockNum, self.lastBlockNum, self.logFileName))
+
+    def headerFor(self, firstBlockNum):
+        """Return a version 3 blocks.log header for a log starting at firstBlockNum on this chain."""
+        header=struct.pack("<II", BlockLog.MaxSupportedVersion, firstBlockNum)
+        if firstBlockNum == 1:
+            header+=self.__genesisBytes()
+        else:
+            header+=self.chainId
+        return header + struct.pack("<Q", BlockLog.Npos)
+
+    @staticmethod
+    def copyFileRange(srcFd, dstFd, count, srcOffset, dstOffset):
+        """Copy count bytes between file descriptors inside the kernel, with os.copy_file_range when available
+        (which reflinks on filesystems that support it) and os.sendfile otherwise."""
+        remaining=count
+        try:
+            while remaining > 0:
+                copied=os.copy_file_range(srcFd, dstFd, remaining, srcOffset, dstOffset)
+                if copied == 0:
+                    break
+                remaining-=copied
+                srcOffset+=copied
+                dstOffset+=copied
+        except (AttributeError, OSError) as ex:
+            if isinstance(ex, OSError) and ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            if Utils.Debug: Utils.Print("copy_file_range unavailable (%s), falling back to sendfile" % (ex))
+            os.lseek(dstFd, dstOffset, os.SEEK_SET)
+            while remaining > 0:
+                copied=os.sendfile(dstFd, srcFd, srcOffset, remaining)
+                if copied == 0:
+                    break
+                remaining-=copied
+                srcOffset+=copied
+        if remaining != 0:
+            raise RuntimeError("Source ended with %d of %d bytes left to copy" % (remaining, count))
+
+    @staticmethod
+    def reflinkFile(sourceFile, destinationFile):
+        """Make destinationFile a copy-on-write clone of sourceFile. Returns False if the filesystem cannot reflink."""
+        with open(sourceFile, "rb") as src, open(destinationFile, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), BlockLog.Ficlone, src.fileno())
+                return True
+            except OSError as ex:
+                if Utils.Debug: Utils.Print("reflink of %s unavailable: %s" % (sourceFile, ex))
+        return False
+
+    @staticmethod
+    def cloneFile(sourceFile, destinationFile, size=None):
+        """Copy the first size bytes (default all) of sourceFile to destinationFile, reflinking when possible."""
+        fullSize=os.path.getsize(sourceFile)
+        size=fullSize if size is None else size
+        assert(size <= fullSize)
+        if BlockLog.reflinkFile(sourceFile, destinationFile):
+            os.truncate(destinationFile, size)
+            return
+        with open(sourceFile, "rb") as src, open(destinationFile, "wb") as dst:
+            BlockLog.copyFileRange(src.fileno(), dst.fileno(), size, 0, 0)
+
+    def extract(self, destinationDir, first=None, last=None):
+        """Write blocks first through last (inclusive) as a new, valid block log in destinationDir and return it as a BlockLog.
+        The header and index are regenerated; the block bytes are copied in the kernel."""
+        first=self.firstBlockNum if first is None else first
+        last=self.lastBlockNum if last is None else last
+        self.__checkRange(first, last)
+        os.makedirs(destinationDir, exist_ok=True)
+        logFileName=os.path.join(destinationDir, BlockLog.LogFileName)
+        indexFileName=os.path.join(destinationDir, BlockLog.IndexFileName)
+
+        header=self.headerFor(first)
+        srcStart=self.blockPos(first)
+        srcEnd=self.blockPos(last + 1)
+        delta=srcStart - len(header)
+        positions=self.blockPositions(first, last)
+
+        if delta == 0 and header == self.header:
+            # a prefix of this block log, every byte (including the positions after each block) stays the same
+            BlockLog.cloneFile(self.logFileName, logFileName, srcEnd)
+            BlockLog.cloneFile(self.indexFileName, indexFileName, len(positions) * BlockLog.PosSize)
+            return BlockLog(destinationDir)
+
+        newPositions=array.array("Q", (pos - delta for pos in positions))
+        newSize=len(header) + (srcEnd - srcStart)
+        with open(self.logFileName, "rb") as src, open(logFileName, "wb+") as dst:
+            dst.write(header)
+            dst.flush()
+            BlockLog.copyFileRange(src.fileno(), dst.fileno(), srcEnd - srcStart, srcStart, len(header))
+            # each block is followed by its own position, which moved by delta
+            with mmap.mmap(dst.fileno(), newSize) as mm:
+                numBlocks=len(newPositions)
+                for i in range(numBlocks):
+                    nextPos=newPositions[i+1] if i + 1 < numBlocks else newSize
+                    struct.pack_into("<Q", mm, nextPos - BlockLog.PosSize, newPositions[i])
+                mm.flush()
+
+        if sys.byteorder != "little":
+            newPositions.byteswap()
+        with open(indexFileName, "wb") as f:
+            newPositions.tofile(f)
+
+        return BlockLog(destinationDir)
+
+    def split(self, destinationRoot, blocksPerArchive):
+        """Split the block log into archives of blocksPerArchive blocks, each a valid block log in
+        destinationRoot/blocks-<first>-<last>. Returns the list of BlockLog archives."""
+        assert(blocksPerArchive > 0)
+        archives=[]
+        for first in range(self.firstBlockNum, self.lastBlockNum + 1, blocksPerArchive):
+            last=min(first + blocksPerArchive - 1, self.lastBlockNum)
+            archiveDir=os.path.join(destinationRoot, "blocks-%d-%d" % (first, last))
+            archives.append(self.extract(archiveDir, first, last))
+        return archives
+
+    def snapshot(self, destinationDir, last=None, hardlink=False):
+        """Instant copy of the prefix of the block log ending at last. With hardlink, the whole block log is hard linked,
+        which is only safe if neither copy is written to again (e.g. a fixture); otherwise a reflink or in kernel copy is made."""
+        last=self.lastBlockNum if last is None else last
+        if hardlink:
+            assert last == self.lastBlockNum, "hard links can only share the complete block log"
+            os.makedirs(destinationDir, exist_ok=True)
+            os.link(self.logFileName, os.path.join(destinationDir, BlockLog.LogFileName))
+            os.link(self.indexFileName, os.path.join(destinationDir, BlockLog.IndexFileName))
+            return BlockLog(destinationDir)
+        return self.extract(destinationDir, self.firstBlockNum, last)
+
+    def trim(self, first=None, last=None):
+        """Trim the block log in place to blocks first through last, like eosio-blocklog --trim-blocklog.
+        Trimming the end only truncates the files, trimming the front rewrites the log through extract."""
+        first=self.firstBlockNum if first is None else first
+        last=self.lastBlockNum if last is None else last
+        self.__checkRange(first, last)
+        if last < self.lastBlockNum:
+            os.truncate(self.logFileName, self.blockPos(last + 1))
+            os.truncate(self.indexFileName, (last - self.firstBlockNum + 1) * BlockLog.PosSize)
+            self.logSize=os.path.getsize(self.logFileName)
+            self.lastBlockNum=last
+
+        if first > self.firstBlockNum:
+            tempDir=os.path.join(self.blocksDir, "trim-%d" % (first))
+            self.extract(tempDir, first, last)
+            os.replace(os.path.join(tempDir, BlockLog.LogFileName), self.logFileName)
+            os.replace(os.path.join(tempDir, BlockLog.IndexFileName), self.indexFileName)
+            os.rmdir(tempDir)
+            self.__init__(self.blocksDir)
+
+    @staticmethod
+    def cloneBlocksDir(sourceDir, destinationDir, hardlink=False):
+        """Copy a nodeos blocks directory. blocks.log and blocks.index are reflinked, copied in the kernel or (with hardlink,
+        for immutable sources only) hard linked; everything else (e.g. the reversible database) is copied normally."""
+        os.makedirs(destinationDir)
+        for entry in os.scandir(sourceDir):
+            destination=os.path.join(destinationDir, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                shutil.copytree(entry.path, destination)
+            elif entry.name in (BlockLog.LogFileName, BlockLog.IndexFileName):
+                if hardlink:
+                    os.link(entry.path, destination)
+                else:
+                    BlockLog.cloneFile(entry.path, destination)
+            else:
+                shutil.copy2(entry.path, destination)
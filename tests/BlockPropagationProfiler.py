@@ -0,0 +1,199 @@
+import datetime
+import threading
+import time
+
+from testUtils import Utils
+from Cluster import Cluster
+
+###############################################################
+# BlockPropagationProfiler
+#  Follows the head block of every node with one polling thread per node (get_info over http) and timestamps the
+#  first time each node reports each block id.  From those observations it computes, per node, how long after the
+#  block timestamp and after the producing node's own observation the block showed up, and with the p2p peer graph
+#  of the cluster, the latency by number of hops from the producing node and the latency added by each single hop.
+#  A node can advance more than one block between two polls, those intermediate blocks are counted as skipped and
+#  do not contribute to the latencies of that node.
+###############################################################
+
+class BlockPropagationProfiler(object):
+    DefaultPollInterval=0.02
+    Percents=(50, 90, 99)
+    UnixEpoch=datetime.datetime(1970, 1, 1)
+
+    def __init__(self, nodes, peerGraph=None, producerNodes=None, topo=None, pollInterval=DefaultPollInterval):
+        """nodes: dictionary of label (e.g. node extension) to Node.
+        peerGraph: optional dictionary of label to the set of labels of its p2p peers (see Cluster.parsePeerGraph),
+                   needed for the per hop results.  Peers that are not in nodes are ignored.
+        producerNodes: optional dictionary of producer name to the label of the node producing for it.  Without it the
+                       first node to report a block is taken as its producing node.
+        topo: name of the topology shape, to tell the results of different runs apart."""
+        self.nodes=nodes
+        self.peerGraph=None
+        if peerGraph is not None:
+            self.peerGraph={label: set(peer for peer in peers if peer in nodes) for label, peers in peerGraph.items() if label in nodes}
+        self.producerNodes=producerNodes if producerNodes is not None else {}
+        self.topo=topo
+        self.pollInterval=pollInterval
+        self.firstSeen={}
+        self.blocks={}
+        self.skipped={label: 0 for label in nodes}
+        self.__lock=threading.Lock()
+        self.__stopEvent=threading.Event()
+        self.__threads=[]
+
+    @staticmethod
+    def fromCluster(cluster, topo=None, parseConfig=None, pollInterval=DefaultPollInterval):
+        """Profile all (non bios) nodes of cluster.  Peer graph and producers are parsed from the node config files,
+        which are only available for a local cluster."""
+        nodes=dict(enumerate(cluster.getNodes()))
+        parseConfig=cluster.localCluster if parseConfig is None else parseConfig
+        peerGraph=None
+        producerNodes=None
+        if parseConfig:
+            peerGraph=Cluster.parsePeerGraph(len(nodes))
+            producerNodes={}
+            for label in nodes:
+                for producer in Cluster.parseProducers(label) or []:
+                    producerNodes[producer]=label
+        return BlockPropagationProfiler(nodes, peerGraph, producerNodes, topo if topo is not None else cluster.topo, pollInterval)
+
+    @staticmethod
+    def __parseBlockTime(blockTime):
+        if "." not in blockTime:
+            blockTime+=".000"
+        return (datetime.datetime.strptime(blockTime, Utils.TimeFmt) - BlockPropagationProfiler.UnixEpoch).total_seconds()
+
+    def __poll(self, label, node):
+        lastBlockNum=None
+        while not self.__stopEvent.is_set():
+            info=node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=max(1, self.pollInterval))
+            seen=time.time()
+            if info is not None:
+                blockId=info["head_block_id"]
+                blockNum=info["head_block_num"]
+                with self.__lock:
+                    observations=self.firstSeen.setdefault(blockId, {})
+                    if label not in observations:
+                        observations[label]=seen
+                        if blockId not in self.blocks:
+                            self.blocks[blockId]=(blockNum, info["head_block_producer"], BlockPropagationProfiler.__parseBlockTime(info["head_block_time"]))
+                        if lastBlockNum is not None and blockNum > lastBlockNum + 1:
+                            self.skipped[label]+=blockNum - lastBlockNum - 1
+                        lastBlockNum=blockNum
+            self.__stopEvent.wait(self.pollInterval)
+
+    def start(self):
+        assert len(self.__threads) == 0, "BlockPropagationProfiler already started"
+        self.__stopEvent.clear()
+        for label, node in self.nodes.items():
+            thread=threading.Thread(target=self.__poll, args=(label, node), name="propagation-%s" % (label), daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        self.__stopEvent.set()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads=[]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.stop()
+
+    def __hopDistances(self, origin):
+        distances={origin: 0}
+        frontier=[origin]
+        while len(frontier) > 0:
+            nextFrontier=[]
+            for label in frontier:
+                for peer in self.peerGraph.get(label, ()):
+                    if peer not in distances:
+                        distances[peer]=distances[label] + 1
+                        nextFrontier.append(peer)
+            frontier=nextFrontier
+        return distances
+
+    def results(self):
+        """Latency percentiles (in seconds) of everything observed so far:
+        nodes[label]["fromTimestamp"] - first report by the node minus the block timestamp
+        nodes[label]["fromProducer"]  - first report by the node minus the first report by the producing node
+        all                           - fromProducer of all nodes together
+        hops[distance]                - fromProducer of the nodes that many hops away from the producing node
+        perHop                        - first report by a node minus the earliest report by a peer one hop closer to the
+                                        producing node"""
+        with self.__lock:
+            firstSeen={blockId: dict(observations) for blockId, observations in self.firstSeen.items()}
+            blocks=dict(self.blocks)
+            skipped=dict(self.skipped)
+
+        fromTimestamp={label: [] for label in self.nodes}
+        fromProducer={label: [] for label in self.nodes}
+        hops={}
+        perHop=[]
+        distancesByOrigin={}
+        for blockId, observations in firstSeen.items():
+            _, producer, blockTime=blocks[blockId]
+            origin=self.producerNodes.get(producer)
+            if origin is None:
+                origin=min(observations, key=observations.get)
+            elif origin not in observations:
+                # the producing node moved past the block before it was polled, nothing to measure against
+                continue
+            originTime=observations[origin]
+            distances=None
+            if self.peerGraph is not None:
+                if origin not in distancesByOrigin:
+                    distancesByOrigin[origin]=self.__hopDistances(origin)
+                distances=distancesByOrigin[origin]
+
+            for label, seen in observations.items():
+                fromTimestamp[label].append(seen - blockTime)
+                if label == origin:
+                    continue
+                fromProducer[label].append(seen - originTime)
+                if distances is None or label not in distances:
+                    continue
+                distance=distances[label]
+                hops.setdefault(distance, []).append(seen - originTime)
+                upstream=[observations[peer] for peer in self.peerGraph[label] if distances.get(peer) == distance - 1 and peer in observations]
+                if len(upstream) > 0:
+                    perHop.append(seen - min(upstream))
+
+        percents=BlockPropagationProfiler.Percents
+        return {
+            "topo": self.topo,
+            "blocks": len(firstSeen),
+            "skipped": skipped,
+            "nodes": {label: {"fromTimestamp": Utils.percentiles(fromTimestamp[label], percents), "fromProducer": Utils.percentiles(fromProducer[label], percents)} for label in self.nodes},
+            "all": Utils.percentiles([latency for latencies in fromProducer.values() for latency in latencies], percents),
+            "hops": {distance: Utils.percentiles(latencies, percents) for distance, latencies in sorted(hops.items())},
+            "perHop": Utils.percentiles(perHop, percents)
+        }
+
+    @staticmethod
+    def formatPercentiles(summary):
+        if summary is None:
+            return "no samples"
+        parts=["p%d=%.1fms" % (percent, summary[percent] * 1000) for percent in BlockPropagationProfiler.Percents]
+        return "%s max=%.1fms (n=%d)" % (" ".join(parts), summary["max"] * 1000, summary["count"])
+
+    def printReport(self, results=None):
+        results=self.results() if results is None else results
+        fmt=BlockPropagationProfiler.formatPercentiles
+        Utils.Print("Block propagation for topology %s, %d blocks observed" % (results["topo"], results["blocks"]))
+        for label, nodeResults in results["nodes"].items():
+            Utils.Print("  node %s: from producer %s, from block timestamp %s, skipped %d blocks" % (label, fmt(nodeResults["fromProducer"]), fmt(nodeResults["fromTimestamp"]), results["skipped"][label]))
+        for distance, summary in results["hops"].items():
+            Utils.Print("  %d hop(s) from producer: %s" % (distance, fmt(summary)))
+        Utils.Print("  per hop: %s" % (fmt(results["perHop"])))
+        Utils.Print("  all nodes: %s" % (fmt(results["all"])))
+
+    @staticmethod
+    def printComparison(resultsList):
+        """One line per run (e.g. per topology shape) of the results returned by results()."""
+        fmt=BlockPropagationProfiler.formatPercentiles
+        for results in resultsList:
+            Utils.Print("%-12s blocks=%-5d all: %s | per hop: %s" % (results["topo"], results["blocks"], fmt(results["all"]), fmt(results["perHop"])))
@@ -0,0 +1,127 @@
+import datetime
+import re
+import threading
+import time
+
+from testUtils import Utils
+from NodeLog import NodeLog
+
+###############################################################
+# CatchupTracker
+#  Records how a syncing node catches up with a producer.  A thread polls get_info of both every interval and keeps
+#  (seconds since start, head, LIB) of the syncing node and the head of the producer.  From those samples it derives
+#    - sync rate, blocks/s of the syncing node's head over the whole catch-up and per sample interval
+#    - time to catch up, the first sample the syncing node's head was within caughtUpBlocks of the producer's head
+#      at that time (the target keeps advancing while the node syncs)
+#    - stalls, windows of at least stallSeconds in which the head of the syncing node did not move while it was
+#      still behind (including the time before it answers at all)
+#  and, from the net_plugin "old state <s> becoming <s>" lines of the node's log, how often it (re)entered lib
+#  catchup, i.e. how often sync was restarted.
+###############################################################
+
+class CatchupTracker(object):
+    DefaultIntervalMs=250
+    DefaultStallSeconds=2.0
+    DefaultCaughtUpBlocks=2
+    SyncStatePattern=re.compile(r"^\S+\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}) .*old state (.+) becoming (.+)$")
+    LibCatchup="lib catchup"
+
+    def __init__(self, node, nodeId, producer, intervalMs=DefaultIntervalMs, stallSeconds=DefaultStallSeconds, caughtUpBlocks=DefaultCaughtUpBlocks):
+        self.node=node
+        self.nodeId=nodeId
+        self.producer=producer
+        self.interval=intervalMs / 1000
+        self.stallSeconds=stallSeconds
+        self.caughtUpBlocks=caughtUpBlocks
+        self.samples=[]
+        self.caughtUpSeconds=None
+        self.__thread=None
+        self.__stopEvent=threading.Event()
+        self.__start=None
+        self.__startUtc=None
+
+    def __headAndLib(self, node):
+        info=node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=1)
+        if info is None:
+            return None, None
+        return info["head_block_num"], info["last_irreversible_block_num"]
+
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            producerHead, _=self.__headAndLib(self.producer)
+            head, lib=self.__headAndLib(self.node)
+            elapsed=time.perf_counter() - self.__start
+            self.samples.append((elapsed, head, lib, producerHead))
+            if self.caughtUpSeconds is None and head is not None and producerHead is not None and head + self.caughtUpBlocks >= producerHead:
+                self.caughtUpSeconds=elapsed
+            self.__stopEvent.wait(self.interval)
+
+    def start(self):
+        """Start sampling, call right before the node is (re)launched."""
+        assert(self.__thread is None)
+        self.__start=time.perf_counter()
+        self.__startUtc=datetime.datetime.utcnow()
+        self.__thread=threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopEvent.set()
+        self.__thread.join()
+
+    def waitForCatchup(self, timeout):
+        """Wait until the node caught up with the producer, returns False on timeout."""
+        return Utils.waitForBool(lambda: self.caughtUpSeconds is not None, timeout, sleepTime=self.interval)
+
+    def __stalls(self, samples):
+        stalls=[]
+        # (seconds, head) of the first sample since the head last moved while behind
+        since=None
+        for elapsed, head, _, producerHead in samples:
+            caughtUp=head is not None and producerHead is not None and head + self.caughtUpBlocks >= producerHead
+            if since is not None and (caughtUp or head != since[1]):
+                if elapsed - since[0] >= self.stallSeconds:
+                    stalls.append({"startSeconds": since[0], "seconds": elapsed - since[0], "head": since[1]})
+                since=None
+            if since is None and not caughtUp:
+                since=(elapsed, head)
+        if since is not None and samples[-1][0] - since[0] >= self.stallSeconds:
+            stalls.append({"startSeconds": since[0], "seconds": samples[-1][0] - since[0], "head": since[1]})
+        return stalls
+
+    def syncStateChanges(self):
+        """(seconds since start, old state, new state) of the net_plugin sync state changes logged since start."""
+        if self.node.nodeLog is not None:
+            # parsed live, rotated log files included
+            changes=[((event.time - self.__startUtc).total_seconds(), event.fields["oldState"], event.fields["newState"])
+                     for event in self.node.nodeLog.events("syncState")]
+            return sorted(change for change in changes if change[0] >= 0)
+        changes=[]
+        for line in NodeLog.readLines(self.nodeId):
+            match=CatchupTracker.SyncStatePattern.search(line.rstrip())
+            if match is None:
+                continue
+            seconds=(datetime.datetime.strptime(match.group(1), Utils.TimeFmt) - self.__startUtc).total_seconds()
+            if seconds >= 0:
+                changes.append((seconds, match.group(2), match.group(3)))
+        return sorted(changes)
+
+    def results(self):
+        """Sync rate, time to catch up, stalls and sync restarts of the samples taken (up to catch up if it happened)."""
+        end=self.caughtUpSeconds
+        samples=[sample for sample in self.samples if end is None or sample[0] <= end]
+        heads=[(elapsed, head) for elapsed, head, _, _ in samples if head is not None]
+        rates=[(head1 - head0) / (t1 - t0) for (t0, head0), (t1, head1) in zip(heads, heads[1:]) if t1 > t0]
+        syncedBlocks=heads[-1][1] - heads[0][1] if heads else 0
+        syncSeconds=heads[-1][0] - heads[0][0] if heads else 0
+        libCatchups=[change for change in self.syncStateChanges() if change[2] == CatchupTracker.LibCatchup and (end is None or change[0] <= end)]
+        return {
+            "samples": len(samples),
+            "caughtUpSeconds": self.caughtUpSeconds,
+            "startHead": heads[0][1] if heads else None,
+            "syncedBlocks": syncedBlocks,
+            "blocksPerSecond": syncedBlocks / syncSeconds if syncSeconds > 0 else None,
+            "intervalBlocksPerSecond": Utils.percentiles(rates),
+            "stalls": self.__stalls(samples),
+            "syncRestarts": max(0, len(libCatchups) - 1),
+            "libCatchupSeconds": [change[0] for change in libCatchups]
+        }
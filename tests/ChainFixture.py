@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+from testUtils import Account
+from testUtils import Utils
+from BlockLog import BlockLog
+
+###############################################################
+# ChainFixture
+#  A prebuilt chain packaged for sync, replay and snapshot benchmarks, so that they do not have to start from genesis.
+#  A fixture is a directory of
+#    manifest.json  - format version, fixture name and version, chain id, block range, snapshot head, the workload
+#                     that built it and the size and sha256 of every file below
+#    blocks/        - the blocks directory of a node that synced the chain (blocks.log, blocks.index, reversible/)
+#    snapshot.bin   - a snapshot of the chain at snapshotHeadBlockNum
+#    genesis.json   - the genesis state, for nodes started with --delete-all-blocks
+#    wallet.json    - names and keys of the accounts of the chain, for importing into a wallet
+#
+#  A fixture is never written to after create().  Readers (BlockLog, eosio-blocklog, nodeos --snapshot) use its files
+#  in place, a node that runs on the blocks gets a copy-on-write clone (reflink or in kernel copy, see
+#  BlockLog.cloneBlocksDir) per run.  verify() checks the files against the manifest.
+###############################################################
+
+class ChainFixture(object):
+    FormatVersion=1
+    ManifestFileName="manifest.json"
+    BlocksDirName="blocks"
+    SnapshotFileName="snapshot.bin"
+    GenesisFileName="genesis.json"
+    WalletFileName="wallet.json"
+    ChecksumChunkSize=1 << 22
+    KeyFields=["ownerPublicKey", "ownerPrivateKey", "activePublicKey", "activePrivateKey"]
+
+    def __init__(self, path):
+        self.path=path
+        manifestFile=os.path.join(path, ChainFixture.ManifestFileName)
+        if not os.path.exists(manifestFile):
+            raise RuntimeError("%s is not a chain fixture, it has no %s" % (path, ChainFixture.ManifestFileName))
+        with open(manifestFile, "r") as f:
+            self.manifest=json.load(f)
+        if self.manifest.get("formatVersion") != ChainFixture.FormatVersion:
+            raise RuntimeError("Chain fixture %s has format version %s, expected %d" % (path, self.manifest.get("formatVersion"), ChainFixture.FormatVersion))
+
+    @property
+    def name(self):
+        return self.manifest["name"]
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def blocksDir(self):
+        return os.path.join(self.path, ChainFixture.BlocksDirName)
+
+    @property
+    def snapshotFile(self):
+        return os.path.join(self.path, ChainFixture.SnapshotFileName)
+
+    @property
+    def genesisFile(self):
+        return os.path.join(self.path, ChainFixture.GenesisFileName)
+
+    @staticmethod
+    def checksum(fileName):
+        digest=hashlib.sha256()
+        with open(fileName, "rb") as f:
+            while True:
+                data=f.read(ChainFixture.ChecksumChunkSize)
+                if not data:
+                    return digest.hexdigest()
+                digest.update(data)
+
+    @staticmethod
+    def __files(path):
+        """Paths relative to path of all files below it, except the manifest."""
+        files=[]
+        for root, _, fileNames in os.walk(path):
+            for fileName in fileNames:
+                relative=os.path.relpath(os.path.join(root, fileName), path)
+                if relative != ChainFixture.ManifestFileName:
+                    files.append(relative)
+        return sorted(files)
+
+    @staticmethod
+    def create(path, name, version, blocksDir, snapshotFile, snapshotHeadBlockNum, genesisFile, accounts, workload=None):
+        """Package blocksDir (of a stopped node), snapshotFile, genesisFile and the keys of accounts as fixture
+        name/version in the new directory path. The blocks are cloned, the snapshot is moved. workload: description of
+        how the chain was built, kept in the manifest. Returns the ChainFixture."""
+        if os.path.exists(path):
+            raise RuntimeError("Chain fixture directory %s already exists" % (path))
+        os.makedirs(path)
+        BlockLog.cloneBlocksDir(blocksDir, os.path.join(path, ChainFixture.BlocksDirName))
+        shutil.move(snapshotFile, os.path.join(path, ChainFixture.SnapshotFileName))
+        shutil.copy2(genesisFile, os.path.join(path, ChainFixture.GenesisFileName))
+        with open(os.path.join(path, ChainFixture.WalletFileName), "w") as f:
+            json.dump([dict(name=account.name, **{field: getattr(account, field) for field in ChainFixture.KeyFields}) for account in accounts], f, indent=1)
+
+        blockLog=BlockLog(os.path.join(path, ChainFixture.BlocksDirName))
+        manifest={
+            "formatVersion": ChainFixture.FormatVersion,
+            "name": name,
+            "version": version,
+            "created": datetime.datetime.utcnow().strftime(Utils.TimeFmt),
+            "chainId": blockLog.chainId.hex(),
+            "firstBlockNum": blockLog.firstBlockNum,
+            "lastBlockNum": blockLog.lastBlockNum,
+            "snapshotHeadBlockNum": snapshotHeadBlockNum,
+            "accounts": len(accounts),
+            "workload": workload,
+            "files": {}
+        }
+        start=datetime.datetime.now()
+        for relative in ChainFixture.__files(path):
+            fileName=os.path.join(path, relative)
+            manifest["files"][relative]={"size": os.path.getsize(fileName), "sha256": ChainFixture.checksum(fileName)}
+        if Utils.Debug: Utils.Print("Checksummed %d fixture files in %s" % (len(manifest["files"]), datetime.datetime.now() - start))
+        with open(os.path.join(path, ChainFixture.ManifestFileName), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return ChainFixture(path)
+
+    def verify(self, checksums=True):
+        """Check that the fixture holds exactly the files of the manifest, with their sizes and, with checksums, their
+        sha256. Returns the list of offending relative paths, empty when the fixture is intact."""
+        expected=self.manifest["files"]
+        present=ChainFixture.__files(self.path)
+        offenders=sorted(set(present).symmetric_difference(expected))
+        for relative in present:
+            if relative not in expected:
+                continue
+            fileName=os.path.join(self.path, relative)
+            if os.path.getsize(fileName) != expected[relative]["size"] or checksums and ChainFixture.checksum(fileName) != expected[relative]["sha256"]:
+                offenders.append(relative)
+        for relative in offenders:
+            Utils.Print("ERROR: Chain fixture %s file %s does not match its manifest" % (self.path, relative))
+        return offenders
+
+    def accounts(self):
+        """Accounts with the keys of wallet.json."""
+        with open(os.path.join(self.path, ChainFixture.WalletFileName), "r") as f:
+            entries=json.load(f)
+        accounts=[]
+        for entry in entries:
+            account=Account(entry["name"])
+            for field in ChainFixture.KeyFields:
+                setattr(account, field, entry[field])
+            accounts.append(account)
+        return accounts
+
+    def importKeys(self, walletMgr, walletName="ignition"):
+        """Import the keys of the fixture accounts into walletName, which is created if needed."""
+        walletMgr.importKeys(self.accounts(), walletMgr.create(walletName), ignoreDupKeyWarning=True)
+
+    def cloneBlocks(self, destinationDir):
+        """Copy-on-write clone of the fixture blocks to destinationDir, for a node to run on."""
+        BlockLog.cloneBlocksDir(self.blocksDir, destinationDir)
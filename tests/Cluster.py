@@ -1,7 +1,9 @@
+import collections
 import copy
 import subprocess
 import time
 import glob
+import hashlib
 import shutil
 import os
 import re
@@ -19,6 +21,21 @@ from testUtils import BlockLogAction
 from Node import BlockType
 from Node import Node
 from WalletMgr import WalletMgr
+from AccountFactory import AccountFactory
+from LedgerValidator import LedgerValidator
+from DbSizeSampler import DbSizeSampler
+from ResourceSampler import ResourceSampler
+from NodeLog import NodeLog
+from NodeLog import RotatingLog
+from LogTriage import LogTriage
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import packAction
+from TransactionCorpus import packAsset
+from TransactionCorpus import packName
+from TransactionCorpus import packString
+from TransactionCorpus import packTransaction
+from TransactionSigner import PrivateKey
+from TransactionSigner import signatureDigest
 
 # Protocol Feature Setup Policy
 class PFSetupPolicy:
@@ -98,7 +115,11 @@ class Cluster(object):
 
         self.useBiosBootFile=False
         self.filesToCleanup=[]
+        self.topo=None
         self.alternateVersionLabels=Cluster.__defaultAlternateVersionLabels()
+        self.dbSizeSamplers={}
+        self.resourceSampler=None
+        self.nodeLogs={}
 
 
     def setChainStrategy(self, chainSyncStrategy=Utils.SyncReplayTag):
@@ -169,6 +190,7 @@ class Cluster(object):
         loadSystemContract: indicate whether the eosio.system contract should be loaded (setting this to False causes useBiosBootFile to be treated as False)
         """
         assert(isinstance(topo, str))
+        self.topo=topo
         assert PFSetupPolicy.isValid(pfSetupPolicy)
         if alternateVersionLabelsFile is not None:
             assert(isinstance(alternateVersionLabelsFile, str))
@@ -702,7 +724,99 @@ class Cluster(object):
 
     # Spread funds across accounts with transactions spread through cluster nodes.
     #  Validate transactions are synchronized on root node
-    def spreadFunds(self, source, accounts, amount=1):
+    def spreadFunds(self, source, accounts, amount=1, strict=False):
+        """Trickle funds from source through accounts and back to source, one hop per node round-robin.
+        With strict, every hop waits for the previous transfer to be in a block on its node before it is sent.
+        Otherwise hops are pipelined: each is sent as soon as the previous transfer is available on its node
+        (retried until it has propagated there), and inclusion of all transfers and the resulting balances are
+        verified once at the end."""
+        if strict:
+            return self.__spreadFundsStrict(source, accounts, amount)
+        return self.__spreadFundsPipelined(source, accounts, amount)
+
+    def __nextActiveNodeIdx(self, nodeIdx, count):
+        for _ in range(0, count):
+            nodeIdx=(nodeIdx + 1)%count
+            if not self.nodes[nodeIdx].killed:
+                return nodeIdx
+        return None
+
+    @staticmethod
+    def __signTransfer(fromm, to, amount, tapos):
+        """push_transaction body and transaction id of an eosio.token transfer of amount (in the smallest unit of
+        CORE_SYMBOL) from fromm to to, signed in process with the active key of fromm."""
+        assert fromm.activePrivateKey is not None, "account %s has no active private key" % (fromm.name)
+        data=packName(fromm.name) + packName(to.name) + packAsset(amount) + packString("memo")
+        packedTrx=packTransaction(tapos["expiration"], tapos["refBlockNum"], tapos["refBlockPrefix"],
+                                  [packAction("eosio.token", "transfer", [(fromm.name, "active")], data)])
+        signature=PrivateKey.fromString(fromm.activePrivateKey).sign(signatureDigest(tapos["chainId"], packedTrx))
+        payload='{"signatures":["%s"],"compression":"none","packed_context_free_data":"","packed_trx":"%s"}' % (signature, packedTrx.hex())
+        return payload, hashlib.sha256(packedTrx).hexdigest()
+
+    def __spreadFundsPipelined(self, source, accounts, amount):
+        assert(source)
+        assert(isinstance(source, Account))
+        assert(accounts)
+        assert(isinstance(accounts, list))
+        assert(len(accounts) > 0)
+        Utils.Print("len(accounts): %d" % (len(accounts)))
+
+        count=len(accounts)
+        transferAmount=(count*amount)+amount
+        node=self.nodes[0]
+        validator=LedgerValidator(node)
+        names=[account.name for account in [source] + accounts]
+        initialBalances=validator.balances(names)
+        firstBlockNum=node.getHeadBlockNum()
+        tapos=TransactionCorpus.taposFromNode(node)
+        transIds=[]
+        fromm=source
+        to=accounts[0]
+        nextEosIdx=-1
+        for i in range(0, count+1):
+            transferAmountStr=Node.currencyIntToStr(transferAmount, CORE_SYMBOL)
+            Utils.Print("Transfer %s units from account %s to %s on eos server port %d." %
+                    (transferAmountStr, fromm.name, to.name, node.port))
+            # signed once, every retry pushes the same transaction, so it can never be applied twice
+            payload, transId=Cluster.__signTransfer(fromm, to, transferAmount, tapos)
+            # the funds of the previous hop may not have reached this node yet, retry until they have
+            error=[None]
+            def push():
+                trans, error[0]=node.pushTransaction(payload, timeout=10)
+                if error[0] is None:
+                    return True
+                if error[0] == "tx_duplicate":
+                    # an earlier push that got no answer was accepted after all
+                    return True
+                if error[0] in (Node.PushTimeout, Node.PushConnectionError):
+                    # no answer, check whether it was accepted before sending it again
+                    return node.processUrllibRequest("history", "get_transaction", {"id": transId}, silentErrors=True) is not None
+                return False
+            if not Utils.waitForBool(push, sleepTime=0.1):
+                Utils.Print("ERROR: Failed to transfer %s from %s to %s on server port %d. %s" % (transferAmountStr, fromm.name, to.name, node.port, error[0]))
+                return False
+            if Utils.Debug: Utils.Print("Funds transfered on transaction id %s." % (transId))
+            transIds.append(transId)
+
+            if i == count:
+                break
+            nextEosIdx=self.__nextActiveNodeIdx(nextEosIdx, count)
+            if nextEosIdx is None:
+                Utils.Print("ERROR: No active nodes found.")
+                return False
+            node=self.nodes[nextEosIdx]
+            transferAmount -= amount
+            fromm=accounts[i]
+            to=accounts[i+1] if i < (count-1) else source
+
+        node=self.nodes[0]
+        Utils.Print("Verify %d transfers got rolled into blocks on server port %d." % (len(transIds), node.port))
+        if not node.waitForTransactionsInBlocks(transIds, firstBlockNum):
+            return False
+
+        return len(validator.validate(names, initialBalances, [-count*amount] + [amount]*count)) == 0
+
+    def __spreadFundsStrict(self, source, accounts, amount):
         assert(source)
         assert(isinstance(source, Account))
         assert(accounts)
@@ -728,16 +842,8 @@ class Cluster(object):
         nextEosIdx=-1
         for i in range(0, count):
             account=accounts[i]
-            nextInstanceFound=False
-            for _ in range(0, count):
-                #Utils.Print("nextEosIdx: %d, n: %d" % (nextEosIdx, n))
-                nextEosIdx=(nextEosIdx + 1)%count
-                if not self.nodes[nextEosIdx].killed:
-                    #Utils.Print("nextEosIdx: %d" % (nextEosIdx))
-                    nextInstanceFound=True
-                    break
-
-            if nextInstanceFound is False:
+            nextEosIdx=self.__nextActiveNodeIdx(nextEosIdx, count)
+            if nextEosIdx is None:
                 Utils.Print("ERROR: No active nodes found.")
                 return False
 
@@ -783,6 +889,9 @@ class Cluster(object):
         assert(isinstance(initialBalances, dict))
         assert(isinstance(transferAmount, int))
 
+        names=[account.name for account in [source] + accounts]
+        initial=[initialBalances[account] for account in [source] + accounts]
+        deltas=[-transferAmount*len(accounts)] + [transferAmount]*len(accounts)
         for node in self.nodes:
             if node.killed:
                 continue
@@ -790,22 +899,24 @@ class Cluster(object):
             if Utils.Debug: Utils.Print("Validate funds on %s server port %d." %
                                         (Utils.EosServerName, node.port))
 
-            if node.validateFunds(initialBalances, transferAmount, source, accounts) is False:
+            validator=LedgerValidator(node)
+            if len(validator.validate(names, initial, deltas)) > 0 or not validator.checkSupply():
                 Utils.Print("ERROR: Failed to validate funds on eos node port: %d" % (node.port))
                 return False
 
         return True
 
-    def spreadFundsAndValidate(self, transferAmount=1):
+    def spreadFundsAndValidate(self, transferAmount=1, strict=False):
         """Sprays 'transferAmount' funds across configured accounts and validates action. The spray is done in a trickle down fashion with account 1
         receiving transferAmount*n SYS and forwarding x-transferAmount funds. Transfer actions are spread round-robin across the cluster to vaidate system cohesiveness."""
 
         if Utils.Debug: Utils.Print("Get initial system balances.")
-        initialBalances=self.nodes[0].getEosBalances([self.defproduceraAccount] + self.accounts)
+        initialBalances=dict(zip([self.defproduceraAccount] + self.accounts,
+                                 LedgerValidator(self.nodes[0]).balances([account.name for account in [self.defproduceraAccount] + self.accounts])))
         assert(initialBalances)
         assert(isinstance(initialBalances, dict))
 
-        if False == self.spreadFunds(self.defproduceraAccount, self.accounts, transferAmount):
+        if False == self.spreadFunds(self.defproduceraAccount, self.accounts, transferAmount, strict=strict):
             Utils.Print("ERROR: Failed to spread funds across nodes.")
             return False
 
@@ -917,6 +1028,38 @@ class Cluster(object):
 
         return producerMatches
 
+    @staticmethod
+    def parsePeerGraph(totalNodes):
+        """Parse the node config files for the p2p connections between nodes.  Returns a dictionary of node extension
+        ("bios", 0, 1, ...) to the set of extensions of the nodes it is connected to, connections are bidirectional."""
+
+        nodeExts=["bios"] + list(range(0, totalNodes))
+        listenPorts={}
+        peerPorts={}
+        for ext in nodeExts:
+            configFile=Utils.getNodeConfigDir(ext, "config.ini")
+            if Utils.Debug: Utils.Print("Parsing config file %s" % configFile)
+            with open(configFile, 'r') as f:
+                configStr=f.read()
+
+            listenMatch=re.search(r"^\s*p2p-listen-endpoint\s*=\s*\S+:(\d+)\s*$", configStr, re.MULTILINE)
+            if listenMatch is None:
+                Utils.Print("ERROR: Failed to find p2p-listen-endpoint in %s" % (configFile))
+                return None
+            listenPorts[int(listenMatch.group(1))]=ext
+            peerPorts[ext]=[int(port) for port in re.findall(r"^\s*p2p-peer-address\s*=\s*\S+:(\d+)\s*$", configStr, re.MULTILINE)]
+
+        peerGraph={ext: set() for ext in nodeExts}
+        for ext in nodeExts:
+            for port in peerPorts[ext]:
+                peer=listenPorts.get(port)
+                if peer is None:
+                    continue
+                peerGraph[ext].add(peer)
+                peerGraph[peer].add(ext)
+
+        return peerGraph
+
     @staticmethod
     def parseClusterKeys(totalNodes):
         """Parse cluster config file. Updates producer keys data members."""
@@ -1407,6 +1550,100 @@ class Cluster(object):
 
         return True
 
+    def mountFixture(self, fixture, nodeIds=None, fromSnapshot=False, timeout=Utils.systemWaitTimeout, cachePopen=False):
+        """Move nodes (default all) onto the chain of a ChainFixture. Each is stopped and relaunched either replaying a
+        copy-on-write clone of the fixture blocks or, with fromSnapshot, with empty blocks from the fixture snapshot.
+        The keys of the fixture accounts are imported into the wallet. Producers only produce on the fixture chain if
+        its head is recent or stale production is enabled."""
+        nodeIds=range(len(self.nodes)) if nodeIds is None else nodeIds
+        for nodeId in nodeIds:
+            node=self.nodes[nodeId]
+            if not node.killed and not node.kill(signal.SIGTERM):
+                return False
+            for subDir in ("blocks", "state"):
+                path=Utils.getNodeDataDir(nodeId, subDir)
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+            if fromSnapshot:
+                chainArg="--snapshot %s" % (os.path.abspath(fixture.snapshotFile))
+            else:
+                fixture.cloneBlocks(Utils.getNodeDataDir(nodeId, "blocks"))
+                chainArg="--replay-blockchain"
+            # keep the original command for later relaunches
+            cmd=node.cmd
+            if not node.relaunch(nodeId, chainArg, timeout=timeout, cachePopen=cachePopen):
+                Utils.Print("ERROR: Failed to relaunch node %d on chain fixture %s" % (nodeId, fixture.path))
+                return False
+            node.cmd=cmd
+        if self.walletMgr is not None:
+            fixture.importKeys(self.walletMgr)
+        return True
+
+    def startDbSizeSampling(self, nodeIds=None, intervalSeconds=DbSizeSampler.DefaultIntervalSeconds):
+        """Sample the chainbase usage of nodes (default all running) in the background, until stopDbSizeSampling or
+        TestHelper.shutdown, which prints the growth. The nodes need --plugin eosio::db_size_api_plugin. Returns the
+        DbSizeSamplers by node id."""
+        nodeIds=[nodeId for nodeId, node in enumerate(self.nodes) if not node.killed] if nodeIds is None else nodeIds
+        for nodeId in nodeIds:
+            if nodeId in self.dbSizeSamplers:
+                continue
+            sampler=DbSizeSampler(self.nodes[nodeId], nodeId, intervalSeconds)
+            sampler.start()
+            self.dbSizeSamplers[nodeId]=sampler
+        return self.dbSizeSamplers
+
+    def stopDbSizeSampling(self):
+        """Stop the DbSizeSamplers, their series stay available. Returns them by node id."""
+        for sampler in self.dbSizeSamplers.values():
+            sampler.stop()
+        return self.dbSizeSamplers
+
+    def startResourceSampling(self, intervalSeconds=ResourceSampler.DefaultIntervalSeconds, capacity=ResourceSampler.DefaultCapacity):
+        """Sample cpu, memory, io, file descriptors and disk use of the nodes and, if launched, keosd in the background,
+        until stopResourceSampling or TestHelper.shutdown, which prints the summary. Returns the ResourceSampler."""
+        if self.resourceSampler is not None:
+            return self.resourceSampler
+        sampler=ResourceSampler(intervalSeconds, capacity)
+        for nodeId, node in enumerate(self.nodes):
+            sampler.addProcess(Utils.nodeExtensionToName(nodeId), lambda node=node: node.pid, Utils.getNodeDataDir(nodeId))
+        if self.walletMgr is not None and self.walletMgr.isLaunched():
+            sampler.addProcess(Utils.EosWalletName, self.walletMgr.getPid)
+        sampler.start()
+        self.resourceSampler=sampler
+        return sampler
+
+    def stopResourceSampling(self):
+        """Stop the ResourceSampler, its ring buffers stay available. Returns it, None if sampling was not started."""
+        if self.resourceSampler is not None:
+            self.resourceSampler.stop()
+        return self.resourceSampler
+
+    def startLogPipelines(self, nodeIds=None, maxEvents=NodeLog.DefaultMaxEvents, rotateBytes=NodeLog.DefaultRotateBytes):
+        """Parse the stderr logs of nodes (default all, unstarted ones included, which get the ids launchUnstarted
+        gives them) live into NodeLogs, node.nodeLog. Running nodes started by the launcher are followed in their
+        current stderr file, nodes (re)launched from now on pipe their stderr through the NodeLog, which writes, rotates
+        and compresses the raw log. Returns the NodeLogs by node id."""
+        nodes=self.nodes + self.unstartedNodes
+        nodeIds=range(len(nodes)) if nodeIds is None else nodeIds
+        for nodeId in nodeIds:
+            node=nodes[nodeId]
+            if node.nodeLog is not None:
+                continue
+            node.nodeLog=NodeLog(nodeId, maxEvents, rotateBytes)
+            self.nodeLogs[nodeId]=node.nodeLog
+            dataDir=Utils.getNodeDataDir(nodeId)
+            fileNames=Cluster.__findFiles(dataDir) if os.path.isdir(dataDir) else []
+            if node.pid is not None and not node.killed and len(fileNames) > 0:
+                # the date in the name orders the files, the last is the one of the running process
+                node.nodeLog.follow(fileNames[-1])
+        return self.nodeLogs
+
+    def stopLogPipelines(self):
+        """Stop following log files and wait for the readers of exited nodes. Returns the NodeLogs by node id."""
+        for nodeLog in self.nodeLogs.values():
+            nodeLog.stop()
+        return self.nodeLogs
+
     @staticmethod
     def dumpErrorDetailImpl(fileName):
         Utils.Print(Utils.FileDivider)
@@ -1429,7 +1666,15 @@ class Cluster(object):
         files.sort()
         return files
 
-    def dumpErrorDetails(self):
+    def dumpErrorDetails(self, triage=None):
+        """Print the logs of the cluster, by default (triage None: unless Utils.FullErrorDetails) as a LogTriage with
+        the full logs and configs bundled in var/lib, else all of them in full."""
+        if triage is None:
+            triage=not Utils.FullErrorDetails
+        if triage:
+            self.triageErrorDetails()
+            return
+
         fileName=Utils.getNodeConfigDir("bios", "config.ini")
         Cluster.dumpErrorDetailImpl(fileName)
         path=Utils.getNodeDataDir("bios")
@@ -1451,6 +1696,22 @@ class Cluster(object):
         if self.useBiosBootFile:
             Cluster.dumpErrorDetailImpl(Cluster.__bootlog)
 
+    def triageErrorDetails(self, tailLines=LogTriage.DefaultTailLines, contextLines=LogTriage.DefaultContextLines, maxExcerpts=LogTriage.DefaultMaxExcerpts):
+        """Bundle the logs (rotated ones included) and configs of bios and all nodes and print a LogTriage of the logs.
+        Returns the distinct excerpts, see LogTriage.triage."""
+        logFiles=collections.OrderedDict()
+        extraFiles=[]
+        for nodeId in ["bios"] + list(range(0, len(self.nodes))):
+            configLocation=Utils.getNodeConfigDir(nodeId)
+            extraFiles+=[os.path.join(configLocation, "config.ini"), os.path.join(configLocation, "genesis.json")]
+            path=Utils.getNodeDataDir(nodeId)
+            logFiles[Utils.nodeExtensionToName(nodeId)]=Cluster.__findFiles(path) if os.path.isdir(path) else []
+            extraFiles+=sorted(glob.glob(os.path.join(path, RotatingLog.RotatedDirName, "*")))
+        if self.useBiosBootFile:
+            extraFiles.append(Cluster.__bootlog)
+        bundlePath=os.path.join(Utils.DataDir, "error_details.%s.tar.gz" % (Utils.getDateString(datetime.datetime.now())))
+        return LogTriage(tailLines, contextLines, maxExcerpts).triage(logFiles, bundlePath, extraFiles)
+
     def killall(self, silent=True, allInstances=False):
         """Kill cluster nodeos instances. allInstances will kill all nodeos instances running on the system."""
         cmd="%s -k 9" % (Utils.EosLauncherPath)
@@ -1535,10 +1796,19 @@ class Cluster(object):
 
 
     # Create accounts and validates that the last transaction is received on root node
-    def createAccounts(self, creator, waitForTransBlock=True, stakedDeposit=1000):
+    def createAccounts(self, creator, waitForTransBlock=True, stakedDeposit=1000, bulk=False):
+        """Create the accounts of populateWallet. With bulk, many accounts are created per transaction by an
+        AccountFactory pushing to all running nodes, and verified together at the end."""
         if self.accounts is None:
             return True
 
+        if bulk:
+            factory=AccountFactory([node for node in self.nodes if not node.killed], creator, systemContract=True, stakedDeposit=stakedDeposit)
+            if factory.create(self.accounts, waitForTransBlock=waitForTransBlock) is None:
+                Utils.Print("ERROR: Failed to create %d accounts." % (len(self.accounts)))
+                return False
+            return factory.verify(self.accounts) if waitForTransBlock else True
+
         transId=None
         for account in self.accounts:
             if Utils.Debug: Utils.Print("Create account %s." % (account.name))
@@ -1608,116 +1878,74 @@ class Cluster(object):
 
         self.printBlockLog()
 
-    def getBlockLog(self, nodeExtension, blockLogAction=BlockLogAction.return_blocks, outputFile=None, first=None, last=None, throwException=False, silentErrors=False, exitOnError=False):
+    def getBlockLog(self, nodeExtension, blockLogAction=BlockLogAction.return_blocks, outputFile=None, first=None, last=None, throwException=False, silentErrors=False, exitOnError=False, stream=False, fields=None):
         blockLogDir=Utils.getNodeDataDir(nodeExtension, "blocks")
-        return Utils.getBlockLog(blockLogDir, blockLogAction=blockLogAction, outputFile=outputFile, first=first, last=last,  throwException=throwException, silentErrors=silentErrors, exitOnError=exitOnError)
+        return Utils.getBlockLog(blockLogDir, blockLogAction=blockLogAction, outputFile=outputFile, first=first, last=last,  throwException=throwException, silentErrors=silentErrors, exitOnError=exitOnError, stream=stream, fields=fields)
 
     def printBlockLog(self):
-        blockLogBios=self.getBlockLog("bios")
-        Utils.Print(Utils.FileDivider)
-        Utils.Print("Block log from %s:\n%s" % ("bios", json.dumps(blockLogBios, indent=1)))
+        def printStream(nodeExtension, desc):
+            Utils.Print(Utils.FileDivider)
+            Utils.Print("Block log from %s:" % (desc))
+            for block in self.getBlockLog(nodeExtension, stream=True):
+                Utils.Print(json.dumps(block, indent=1))
+
+        printStream("bios", "bios")
 
         if not hasattr(self, "nodes"):
             return
 
         numNodes=len(self.nodes)
         for i in range(numNodes):
-            node=self.nodes[i]
-            blockLog=self.getBlockLog(i)
-            Utils.Print(Utils.FileDivider)
-            Utils.Print("Block log from node %s:\n%s" % (i, json.dumps(blockLog, indent=1)))
-
+            printStream(i, "node %s" % (i))
 
     def compareBlockLogs(self):
-        blockLogs=[]
-        blockNameExtensions=[]
-        lowestMaxes=[]
-
-        def back(arr):
-            return arr[len(arr)-1]
-
-        def sortLowest(maxes,max):
-            for i in range(len(maxes)):
-                if max < maxes[i]:
-                    maxes.insert(i, max)
-                    return
-
-            maxes.append(max)
-
-        i="bios"
-        blockLog=self.getBlockLog(i)
-        if blockLog is None:
-            Utils.errorExit("Node %s does not have a block log, all nodes must have a block log" % (i))
-        blockLogs.append(blockLog)
-        blockNameExtensions.append(i)
-        sortLowest(lowestMaxes,back(blockLog)["block_num"])
-
+        """Compare the block logs of the bios node and all cluster nodes. The block logs are streamed in lock step, so
+        only the current block of each node is held in memory. A node drops out of the comparison once its block log
+        ends and the comparison stops when fewer than two block logs remain."""
         if not hasattr(self, "nodes"):
             Utils.errorExit("There are not multiple nodes to compare, this method assumes that two nodes or more are expected")
 
-        numNodes=len(self.nodes)
-        for i in range(numNodes):
-            node=self.nodes[i]
-            blockLog=self.getBlockLog(i)
-            if blockLog is None:
-                Utils.errorExit("Node %s does not have a block log, all nodes must have a block log" % (i))
-            blockLogs.append(blockLog)
-            blockNameExtensions.append(i)
-            sortLowest(lowestMaxes,back(blockLog)["block_num"])
-
-        numNodes=len(blockLogs)
-
+        blockNameExtensions=["bios"] + list(range(len(self.nodes)))
+        numNodes=len(blockNameExtensions)
         if numNodes < 2:
             Utils.errorExit("There are not multiple nodes to compare, this method assumes that two nodes or more are expected")
 
-        if lowestMaxes[0] < 2:
-            Utils.errorExit("One or more nodes only has %d blocks, if that is a valid scenario, then compareBlockLogs shouldn't be called" % (lowestMaxes[0]))
-
-        # create a list of block logs and name extensions for the given common block number span
-        def identifyCommon(blockLogs, blockNameExtensions, first, last):
-            commonBlockLogs=[]
-            commonBlockNameExtensions=[]
-            for i in range(numNodes):
-                if (len(blockLogs[i]) >= last):
-                    commonBlockLogs.append(blockLogs[i][first:last])
-                    commonBlockNameExtensions.append(blockNameExtensions[i])
-            return (commonBlockLogs,commonBlockNameExtensions)
-
-        # compare the contents of the blockLogs for the given common block number span
-        def compareCommon(blockLogs, blockNameExtensions, first, last):
-            if Utils.Debug: Utils.Print("comparing block num %s through %s" % (first, last))
-            commonBlockLogs=None
-            commonBlockNameExtensions=None
-            (commonBlockLogs,commonBlockNameExtensions) = identifyCommon(blockLogs, blockNameExtensions, first, last)
-            numBlockLogs=len(commonBlockLogs)
-            if numBlockLogs < 2:
-                return False
-
-            ret=None
-            for i in range(1,numBlockLogs):
-                context="<comparing block logs for node[%s] and node[%s]>" % (commonBlockNameExtensions[0], commonBlockNameExtensions[i])
-                if Utils.Debug: Utils.Print("context=%s" % (context))
-                ret=Utils.compare(commonBlockLogs[0], commonBlockLogs[i], context)
-                if ret is not None:
-                    blockLogDir1=Utils.DataDir + Utils.nodeExtensionToName(commonBlockNameExtensions[0]) + "/blocks/"
-                    blockLogDir2=Utils.DataDir + Utils.nodeExtensionToName(commonBlockNameExtensions[i]) + "/blocks/"
-                    Utils.Print(Utils.FileDivider)
-                    Utils.Print("Block log from %s:\n%s" % (blockLogDir1, json.dumps(commonBlockLogs[0], indent=1)))
-                    Utils.Print(Utils.FileDivider)
-                    Utils.Print("Block log from %s:\n%s" % (blockLogDir2, json.dumps(commonBlockLogs[i], indent=1)))
-                    Utils.Print(Utils.FileDivider)
-                    Utils.errorExit("Block logs do not match, difference description -> %s" % (ret))
+        blockLogs=[self.getBlockLog(i, stream=True, exitOnError=True) for i in blockNameExtensions]
+        blockCounts=[0] * numNodes
+        active=list(range(numNodes))
+        try:
+            while len(active) >= 2:
+                current=[]
+                for idx in active:
+                    block=next(blockLogs[idx], None)
+                    if block is None:
+                        if blockCounts[idx] == 0:
+                            Utils.errorExit("Node %s does not have a block log, all nodes must have a block log" % (blockNameExtensions[idx]))
+                        if blockCounts[idx] < 2:
+                            Utils.errorExit("One or more nodes only has %d blocks, if that is a valid scenario, then compareBlockLogs shouldn't be called" % (blockCounts[idx]))
+                        if Utils.Debug: Utils.Print("block log for node %s ends at block %d" % (blockNameExtensions[idx], blockCounts[idx]))
+                        continue
+                    blockCounts[idx]+=1
+                    current.append((idx, block))
 
-            return True
+                if len(current) < 2:
+                    break
 
-        def stripValues(lowestMaxes,greaterThan):
-            newLowest=[]
-            for low in lowestMaxes:
-                if low > greaterThan:
-                    newLowest.append(low)
-            return newLowest
-
-        first=0
-        while len(lowestMaxes)>0 and compareCommon(blockLogs, blockNameExtensions, first, lowestMaxes[0]):
-            first=lowestMaxes[0]+1
-            lowestMaxes=stripValues(lowestMaxes,lowestMaxes[0])
+                baseIdx,baseBlock=current[0]
+                for idx,block in current[1:]:
+                    context="<comparing block logs for node[%s] and node[%s] at block %s>" % (blockNameExtensions[baseIdx], blockNameExtensions[idx], baseBlock.get("block_num"))
+                    ret=Utils.compare(baseBlock, block, context)
+                    if ret is not None:
+                        blockLogDir1=Utils.DataDir + Utils.nodeExtensionToName(blockNameExtensions[baseIdx]) + "/blocks/"
+                        blockLogDir2=Utils.DataDir + Utils.nodeExtensionToName(blockNameExtensions[idx]) + "/blocks/"
+                        Utils.Print(Utils.FileDivider)
+                        Utils.Print("Block from %s:\n%s" % (blockLogDir1, json.dumps(baseBlock, indent=1)))
+                        Utils.Print(Utils.FileDivider)
+                        Utils.Print("Block from %s:\n%s" % (blockLogDir2, json.dumps(block, indent=1)))
+                        Utils.Print(Utils.FileDivider)
+                        Utils.errorExit("Block logs do not match, difference description -> %s" % (ret))
+
+                active=[idx for idx,_ in current]
+        finally:
+            for blockLog in blockLogs:
+                blockLog.close()
@@ -0,0 +1,121 @@
+import array
+import collections
+import threading
+import time
+
+from testUtils import Utils
+
+###############################################################
+# DbSizeSampler
+#  Time series of the chainbase usage of a node, from db_size_api_plugin (/v1/db_size/get).  Every sample keeps the
+#  used and free bytes and the row count of every index (account_object, permission_object, key_value_object,
+#  generated_transaction_object, ...) in arrays, a thread samples every interval and mark() takes a sample right away,
+#  e.g. before and after a workload.  growth() turns two samples into state growth per second and per unit of
+#  workload (bytes and rows per 1000 transfers, actions, ...), to size --chain-state-db-size-mb and to catch state
+#  bloat.
+###############################################################
+
+class DbSizeSampler(object):
+    DefaultIntervalSeconds=1.0
+
+    def __init__(self, node, nodeId, intervalSeconds=DefaultIntervalSeconds):
+        self.node=node
+        self.nodeId=nodeId
+        self.interval=intervalSeconds
+        self.size=None
+        self.seconds=array.array("d")
+        self.usedBytes=array.array("Q")
+        self.freeBytes=array.array("Q")
+        # index name -> row counts, one per sample
+        self.rows=collections.OrderedDict()
+        self.__lock=threading.Lock()
+        self.__thread=None
+        self.__stopEvent=threading.Event()
+        self.__start=None
+
+    def mark(self):
+        """Sample now. Returns the number of the sample, for growth(), None if the node did not answer."""
+        dbSize=self.node.getDbSize(timeout=5)
+        if dbSize is None:
+            return None
+        with self.__lock:
+            if self.__start is None:
+                self.__start=time.perf_counter()
+            position=len(self.seconds)
+            self.seconds.append(time.perf_counter() - self.__start)
+            self.usedBytes.append(dbSize["used_bytes"])
+            self.freeBytes.append(dbSize["free_bytes"])
+            self.size=dbSize["size"]
+            for entry in dbSize["indices"]:
+                counts=self.rows.get(entry["index"])
+                if counts is None:
+                    counts=self.rows[entry["index"]]=array.array("Q", [0] * position)
+                counts.append(entry["row_count"])
+            # an index the node did not report this time keeps its count
+            for counts in self.rows.values():
+                if len(counts) == position:
+                    counts.append(counts[-1] if position > 0 else 0)
+            return position
+
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            self.mark()
+            self.__stopEvent.wait(self.interval)
+
+    def start(self):
+        assert(self.__thread is None)
+        self.__thread=threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stopEvent.set()
+            self.__thread.join()
+            self.__thread=None
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def growth(self, first=0, last=-1, units=None):
+        """Change of used bytes and row counts from sample first to sample last (default the whole series). With
+        units, the amount of workload in between (transactions, actions, ...), also per 1000 units."""
+        with self.__lock:
+            seconds=self.seconds[last] - self.seconds[first]
+            usedBytes=self.usedBytes[last] - self.usedBytes[first]
+            rows={index: counts[last] - counts[first] for index, counts in self.rows.items() if counts[last] != counts[first]}
+        result={
+            "seconds": seconds,
+            "usedBytes": usedBytes,
+            "usedBytesPerSecond": usedBytes / seconds if seconds > 0 else None,
+            "rows": rows
+        }
+        if units:
+            result["units"]=units
+            result["usedBytesPer1kUnits"]=usedBytes * 1000 / units
+            result["rowsPer1kUnits"]={index: count * 1000 / units for index, count in rows.items()}
+        return result
+
+    def toDict(self):
+        """The series as json, indices whose row count never changed only with their count."""
+        with self.__lock:
+            return {
+                "nodeId": self.nodeId,
+                "intervalSeconds": self.interval,
+                "size": self.size,
+                "seconds": [round(seconds, 3) for seconds in self.seconds],
+                "usedBytes": self.usedBytes.tolist(),
+                "freeBytes": self.freeBytes.tolist(),
+                "rows": {index: counts.tolist() for index, counts in self.rows.items() if min(counts) != max(counts)},
+                "constantRows": {index: counts[0] for index, counts in self.rows.items() if min(counts) == max(counts)}
+            }
+
+    def printSummary(self):
+        if len(self) < 2:
+            Utils.Print("db_size node %d: %d sample(s)" % (self.nodeId, len(self)))
+            return
+        growth=self.growth()
+        Utils.Print("db_size node %d: used %.2f MB -> %.2f MB of %.2f MB in %.1f sec, %.0f bytes/sec" %
+                    (self.nodeId, self.usedBytes[0] / (1024 * 1024), self.usedBytes[-1] / (1024 * 1024), self.size / (1024 * 1024), growth["seconds"],
+                     growth["usedBytesPerSecond"] or 0))
+        for index, count in sorted(growth["rows"].items(), key=lambda item: -abs(item[1])):
+            Utils.Print("  %-40s %+d rows" % (index, count))
@@ -0,0 +1,149 @@
+import collections
+import concurrent.futures
+
+from testUtils import Utils
+
+###############################################################
+# ForkAnalyzer
+#  Compares the chains of any number of nodes against the first (reference) node.  Block ids commit to all of the
+#  blocks before them, so two nodes that agree on the id of block N agree on every block up to N, and the first block
+#  where they disagree (the fork point) can be found by binary search on block id agreement, with O(log n) block
+#  fetches per node instead of fetching every block of the range from every node.  Requests to the different nodes
+#  are issued concurrently.
+###############################################################
+
+ForkBranch=collections.namedtuple("ForkBranch", "nodeIndex forkBlockNum lastBlockNum length producers")
+
+class ForkReport(object):
+    """Result of ForkAnalyzer.analyze.  forkBlockNum is the lowest fork point of any node from the reference node
+    (None if every node agrees on the whole range) and branches holds a ForkBranch for every node, the reference node's
+    branch covering the blocks after forkBlockNum.  currentLib is the lowest LIB of the nodes when the analysis ran,
+    libAtDivergence the lowest LIB the caller sampled when it saw the nodes diverge (None if not given)."""
+
+    def __init__(self, first, last, forkBlockNum, branches, currentLib, libAtDivergence=None):
+        self.first=first
+        self.last=last
+        self.forkBlockNum=forkBlockNum
+        self.branches=branches
+        self.currentLib=currentLib
+        self.libAtDivergence=libAtDivergence
+
+    def diverged(self):
+        return self.forkBlockNum is not None
+
+    def __str__(self):
+        if not self.diverged():
+            return "all nodes agree on blocks %d to %d" % (self.first, self.last)
+        lib="lowest LIB %d" % (self.currentLib)
+        if self.libAtDivergence is not None:
+            lib+=" (%d at divergence)" % (self.libAtDivergence)
+        lines=["blocks %d to %d diverged at block %d, %s" % (self.first, self.last, self.forkBlockNum, lib)]
+        for branch in self.branches:
+            fork="no fork" if branch.forkBlockNum is None else "fork at %d" % (branch.forkBlockNum)
+            producers=", ".join("%d->%s" % (blockNum, producer) for blockNum, producer in branch.producers)
+            lines.append("  node %d: %s, %d blocks on branch: %s" % (branch.nodeIndex, fork, branch.length, producers))
+        return "\n".join(lines)
+
+class ForkAnalyzer(object):
+    DefaultFetchThreads=8
+
+    def __init__(self, nodes, fetchThreads=DefaultFetchThreads):
+        assert(len(nodes) >= 2)
+        self.nodes=nodes
+        self.fetchThreads=fetchThreads
+
+    def __map(self, func, items):
+        items=list(items)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.fetchThreads, len(items)))) as executor:
+            return list(executor.map(func, items))
+
+    @staticmethod
+    def __getBlock(node, blockNum):
+        if node.enableMongo:
+            return node.getBlock(blockNum, silentErrors=True)
+        return node.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, silentErrors=True)
+
+    def getMinHeadAndLib(self):
+        """(lowest head block number, lowest LIB) of all the nodes, queried concurrently."""
+        infos=self.__map(lambda node: node.getInfo(exitOnError=True), self.nodes)
+        headBlockNum=min(int(info["head_block_num"]) for info in infos)
+        libNum=min(int(info["last_irreversible_block_num"]) for info in infos)
+        return (headBlockNum, libNum)
+
+    def __findForkPoint(self, nodeIndex, first, last, cache):
+        """Lowest block number in [first, last] whose id on nodes[nodeIndex] differs from the reference node's,
+        None if they agree on all of them."""
+        def blockId(index, blockNum):
+            key=(index, blockNum)
+            if key not in cache:
+                block=ForkAnalyzer.__getBlock(self.nodes[index], blockNum)
+                cache[key]=None if block is None else block["id"]
+            return cache[key]
+
+        def agree(blockNum):
+            ids=self.__map(lambda index: blockId(index, blockNum), [0, nodeIndex])
+            return ids[0] is not None and ids[0] == ids[1]
+
+        if agree(last):
+            return None
+        if not agree(first):
+            return first
+        # invariant: agree(low) and not agree(high)
+        low=first
+        high=last
+        while high - low > 1:
+            mid=(low + high) // 2
+            if agree(mid):
+                low=mid
+            else:
+                high=mid
+        return high
+
+    def __branchProducers(self, nodeIndex, first, last):
+        """(block number, producer) for every change of producer on nodes[nodeIndex] from first to last."""
+        node=self.nodes[nodeIndex]
+        blocks=self.__map(lambda blockNum: ForkAnalyzer.__getBlock(node, blockNum), range(first, last + 1))
+        producers=[]
+        for blockNum, block in zip(range(first, last + 1), blocks):
+            producer=None if block is None else block["producer"]
+            if len(producers) == 0 or producers[-1][1] != producer:
+                producers.append((blockNum, producer))
+        return producers
+
+    def analyze(self, first, last=None, expectDivergence=None, waitForBlocks=True, libAtDivergence=None):
+        """Locate the fork point of every node from the reference node within blocks first to last (default: the
+        lowest head block).  If expectDivergence is True (False) it is an error for the nodes to agree (disagree) on
+        the range.  libAtDivergence: lowest LIB (see getMinHeadAndLib) sampled by the caller when it saw the nodes
+        diverge, only reported, LIB has usually moved on by the time the range is analyzed."""
+        if last is None:
+            last=self.getMinHeadAndLib()[0]
+        elif waitForBlocks:
+            for node in self.nodes:
+                node.waitForBlock(last - 1)
+        assert first <= last, "first block %d is after last block %d" % (first, last)
+        currentLib=self.getMinHeadAndLib()[1]
+
+        cache={}
+        forkBlockNums=[None] + self.__map(lambda index: self.__findForkPoint(index, first, last, cache), range(1, len(self.nodes)))
+        forked=[blockNum for blockNum in forkBlockNums if blockNum is not None]
+        forkBlockNum=min(forked) if len(forked) > 0 else None
+        forkBlockNums[0]=forkBlockNum
+
+        branches=[]
+        for index, nodeFork in enumerate(forkBlockNums):
+            if nodeFork is None:
+                branches.append(ForkBranch(index, None, last, 0, []))
+            else:
+                branches.append(ForkBranch(index, nodeFork, last, last - nodeFork + 1, self.__branchProducers(index, nodeFork, last)))
+        report=ForkReport(first, last, forkBlockNum, branches, currentLib, libAtDivergence)
+        if Utils.Debug: Utils.Print("Fork analysis: %s" % (report))
+
+        if expectDivergence is not None and expectDivergence != report.diverged():
+            msg="Failed analyzing block producers - "
+            if expectDivergence:
+                msg+="nodes do not indicate different blocks for the same block numbers, but they are expected to diverge at some point."
+            else:
+                msg+="did not expect nodes to indicate different blocks for the same block numbers."
+            Utils.errorExit("%s\n%s" % (msg, report))
+
+        return report
@@ -0,0 +1,88 @@
+import array
+import concurrent.futures
+import time
+
+from core_symbol import CORE_SYMBOL
+from testUtils import Utils
+
+###############################################################
+# LedgerValidator
+#  Validates token balances of large account sets.  Balances are read over http with get_table_rows on the accounts
+#  table of each scope, fanned out over a thread pool, and parsed straight to integers in the smallest unit of the
+#  symbol (no Decimal).  They are kept in array("q") columns parallel to the list of account names, so expected
+#  deltas are checked in one pass over the columns and only the offending accounts are reported.
+#
+#  checkSupply lists every holder with paged get_table_by_scope and checks that their balances add up to the supply
+#  of get_currency_stats, i.e. that no transfer created or destroyed tokens.
+###############################################################
+
+class LedgerValidator(object):
+    DefaultWorkers=8
+    ScopesPerPage=1000
+    MaxReported=20
+
+    def __init__(self, node, contract="eosio.token", symbol=CORE_SYMBOL, workers=DefaultWorkers):
+        self.node=node
+        self.contract=contract
+        self.symbol=symbol
+        self.workers=workers
+
+    @staticmethod
+    def parseAmount(text):
+        """Integer amount in the smallest unit of an asset string, e.g. "12.3456 SYS" is 123456."""
+        amount=text.split(" ", 1)[0]
+        return int(amount.replace(".", "", 1))
+
+    def holders(self):
+        """Names of all accounts with a row in the accounts table of the contract, one query per page."""
+        names=[]
+        lowerBound=""
+        while True:
+            page=self.node.processUrllibRequest("chain", "get_table_by_scope", {"code": self.contract, "table": "accounts", "lower_bound": lowerBound,
+                                                 "limit": LedgerValidator.ScopesPerPage}, exitOnError=True)
+            names.extend(row["scope"] for row in page["rows"])
+            if not page["more"]:
+                return names
+            lowerBound=page["more"]
+
+    def __balance(self, name):
+        rows=self.node.processUrllibRequest("chain", "get_table_rows", {"code": self.contract, "scope": name, "table": "accounts", "json": True, "limit": 100},
+                                            exitOnError=True)["rows"]
+        suffix=" " + self.symbol
+        for row in rows:
+            if row["balance"].endswith(suffix):
+                return LedgerValidator.parseAmount(row["balance"])
+        return 0
+
+    def balances(self, names):
+        """Balances of names, in order, as an array("q"). Accounts without a row have 0."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return array.array("q", executor.map(self.__balance, names))
+
+    def supply(self):
+        stats=self.node.processUrllibRequest("chain", "get_currency_stats", {"code": self.contract, "symbol": self.symbol}, exitOnError=True)
+        return LedgerValidator.parseAmount(stats[self.symbol]["supply"])
+
+    def validate(self, names, initial, deltas):
+        """Check that every account of names holds its initial balance plus its delta (sequences parallel to names).
+        Returns the list of offending (name, expected, actual), empty when the ledger is as expected."""
+        assert(len(names) == len(initial) == len(deltas))
+        start=time.perf_counter()
+        current=self.balances(names)
+        offenders=[(name, base + delta, actual) for name, base, delta, actual in zip(names, initial, deltas, current) if base + delta != actual]
+        if Utils.Debug: Utils.Print("Validated %d balances on node port %d in %.3f sec" % (len(names), self.node.port, time.perf_counter() - start))
+        for name, expected, actual in offenders[:LedgerValidator.MaxReported]:
+            Utils.Print("ERROR: Expected balance %d, actual: %d for account %s on node port %d" % (expected, actual, name, self.node.port))
+        if len(offenders) > LedgerValidator.MaxReported:
+            Utils.Print("ERROR: ... and %d more accounts with unexpected balances" % (len(offenders) - LedgerValidator.MaxReported))
+        return offenders
+
+    def checkSupply(self):
+        """Check that the balances of all holders add up to the currency supply. Returns False if they do not."""
+        holders=self.holders()
+        total=sum(self.balances(holders))
+        supply=self.supply()
+        if total != supply:
+            Utils.Print("ERROR: Balances of %d holders add up to %d, but the %s supply is %d on node port %d" % (len(holders), total, self.symbol, supply, self.node.port))
+            return False
+        return True
@@ -0,0 +1,239 @@
+import collections
+import concurrent.futures
+import hashlib
+import http.client
+import json
+import socket
+import threading
+import time
+
+from testUtils import Utils
+
+###############################################################
+# LoadGenerator
+#  Open loop transaction load: every transaction has an intended send time derived from a RateSchedule, and is
+#  handed to a pool of sender threads at that time whether or not earlier pushes have completed.  Senders keep one
+#  persistent http connection per node and push to chain/push_transaction, spreading transactions over the nodes
+#  round robin.  Latencies are measured from the intended send time, so a saturated harness or node shows up as
+#  send lag and latency instead of silently lowering the offered rate (coordinated omission).
+#
+#  Transactions are signed before the run starts (see TransactionCorpus), so that neither signing nor wallet round
+#  trips are on the send path.
+###############################################################
+
+class RateSchedule(object):
+    """Target transactions per second as a function of the seconds elapsed since the start of a run."""
+    IdleTick=0.01
+
+    def __init__(self, description, duration, rateFunc):
+        assert(duration > 0)
+        self.description=description
+        self.duration=duration
+        self.rateFunc=rateFunc
+
+    def __str__(self):
+        return self.description
+
+    def rate(self, elapsed):
+        return self.rateFunc(elapsed)
+
+    def sendTimes(self):
+        """Yields the intended send time, in seconds from the start of the run, of each transaction."""
+        elapsed=0.0
+        while elapsed < self.duration:
+            rate=self.rate(elapsed)
+            if rate <= 0:
+                elapsed+=RateSchedule.IdleTick
+                continue
+            yield elapsed
+            elapsed+=1.0 / rate
+
+    def expectedCount(self):
+        return sum(1 for _ in self.sendTimes())
+
+    @staticmethod
+    def constant(tps, duration):
+        return RateSchedule("constant %s tps for %ss" % (tps, duration), duration, lambda elapsed: tps)
+
+    @staticmethod
+    def ramp(startTps, endTps, duration):
+        return RateSchedule("ramp %s to %s tps over %ss" % (startTps, endTps, duration), duration,
+                            lambda elapsed: startTps + (endTps - startTps) * elapsed / duration)
+
+    @staticmethod
+    def step(steps):
+        """steps: list of (tps, duration) pairs, run one after the other."""
+        assert(len(steps) > 0)
+        def rate(elapsed):
+            for tps, duration in steps:
+                if elapsed < duration:
+                    return tps
+                elapsed-=duration
+            return steps[-1][0]
+        description="steps %s" % (", ".join("%s tps for %ss" % (tps, duration) for tps, duration in steps))
+        return RateSchedule(description, sum(duration for _, duration in steps), rate)
+
+    @staticmethod
+    def burst(baseTps, burstTps, period, burstDuration, duration):
+        """baseTps, except for the first burstDuration seconds of every period, which run at burstTps."""
+        assert(burstDuration <= period)
+        return RateSchedule("%s tps with %ss bursts of %s tps every %ss for %ss" % (baseTps, burstDuration, burstTps, period, duration), duration,
+                            lambda elapsed: burstTps if elapsed % period < burstDuration else baseTps)
+
+SendRecord=collections.namedtuple("SendRecord", "intended sent completed nodeIndex outcome transactionId")
+
+class LoadGenerator(object):
+    DefaultWorkers=32
+    DefaultTimeout=10
+    Accepted="accepted"
+    TimedOut="timeout"
+    ConnectionError="connection_error"
+    Percents=(50, 90, 99)
+
+    def __init__(self, nodes, schedule, transactions, workers=DefaultWorkers, timeout=DefaultTimeout, tracker=None):
+        """nodes: Nodes to spread the transactions over.
+        schedule: RateSchedule of the run.
+        transactions: iterable of push_transaction payloads (packed transaction json, as str, bytes or dict).  The run
+                      ends early if it runs out.
+        tracker: optional TransactionLatencyTracker, transactions are registered with it by node index when they are
+                 sent and removed again unless the node accepted them."""
+        assert(len(nodes) > 0)
+        self.nodes=nodes
+        self.schedule=schedule
+        self.transactions=transactions
+        self.workers=workers
+        self.timeout=timeout
+        self.tracker=tracker
+        self.records=[]
+        self.exhausted=False
+        self.__local=threading.local()
+
+    def __connection(self, nodeIndex):
+        connections=getattr(self.__local, "connections", None)
+        if connections is None:
+            connections=self.__local.connections={}
+        conn=connections.get(nodeIndex)
+        if conn is None:
+            node=self.nodes[nodeIndex]
+            conn=connections[nodeIndex]=http.client.HTTPConnection(node.host, node.port, timeout=self.timeout)
+        return conn
+
+    def __dropConnection(self, nodeIndex):
+        conn=self.__local.connections.pop(nodeIndex, None)
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def __errorClass(status, body):
+        try:
+            return json.loads(body)["error"]["name"]
+        except (ValueError, KeyError, TypeError):
+            return "http_%d" % (status)
+
+    @staticmethod
+    def transactionId(payload):
+        """Id of the transaction of a push_transaction payload, the sha256 of its packed_trx."""
+        if not isinstance(payload, dict):
+            payload=json.loads(payload)
+        return hashlib.sha256(bytes.fromhex(payload["packed_trx"])).hexdigest()
+
+    def __push(self, nodeIndex, payload, intended):
+        # registered before the push, the tracker may see the transaction in a block before the response is read
+        trackedId=LoadGenerator.transactionId(payload) if self.tracker is not None else None
+        if isinstance(payload, dict):
+            payload=json.dumps(payload)
+        if isinstance(payload, str):
+            payload=payload.encode("utf-8")
+        transactionId=None
+        sent=time.perf_counter()
+        if trackedId is not None:
+            self.tracker.track(trackedId, nodeIndex, submitted=sent)
+        try:
+            conn=self.__connection(nodeIndex)
+            conn.request("POST", "/v1/chain/push_transaction", body=payload, headers={"Content-Type": "application/json"})
+            response=conn.getresponse()
+            body=response.read()
+            if response.status in (200, 202):
+                outcome=LoadGenerator.Accepted
+                transactionId=json.loads(body).get("transaction_id")
+            else:
+                outcome=LoadGenerator.__errorClass(response.status, body)
+        except socket.timeout:
+            outcome=LoadGenerator.TimedOut
+            self.__dropConnection(nodeIndex)
+        except (OSError, http.client.HTTPException):
+            outcome=LoadGenerator.ConnectionError
+            self.__dropConnection(nodeIndex)
+        if trackedId is not None and outcome != LoadGenerator.Accepted:
+            self.tracker.untrack(trackedId)
+        return SendRecord(intended, sent, time.perf_counter(), nodeIndex, outcome, transactionId)
+
+    def run(self):
+        """Push transactions according to the schedule and wait for all of them to complete. Returns results()."""
+        Utils.Print("Starting open loop load: %s over %d node(s)" % (self.schedule, len(self.nodes)))
+        transactions=iter(self.transactions)
+        futures=[]
+        self.exhausted=False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            self.startTime=time.perf_counter()
+            for index, offset in enumerate(self.schedule.sendTimes()):
+                payload=next(transactions, None)
+                if payload is None:
+                    self.exhausted=True
+                    Utils.Print("WARNING: ran out of transactions after %d of the scheduled sends" % (index))
+                    break
+                intended=self.startTime + offset
+                delay=intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.__push, index % len(self.nodes), payload, intended))
+        self.records=[future.result() for future in futures]
+        return self.results()
+
+    def acceptedTransactionIds(self):
+        return [record.transactionId for record in self.records if record.outcome == LoadGenerator.Accepted]
+
+    def results(self):
+        """Summary of the last run.  Times are in seconds, sendLag is the actual minus the intended send time and
+        latency is the completion minus the intended send time of every push."""
+        records=self.records
+        if len(records) == 0:
+            return {"schedule": str(self.schedule), "sent": 0, "outcomes": {}}
+        outcomes=collections.Counter(record.outcome for record in records)
+        accepted=outcomes[LoadGenerator.Accepted]
+        elapsed=max(record.completed for record in records) - self.startTime
+        perSecond={}
+        newCounts=lambda: {"intended": 0, "sent": 0, "accepted": 0}
+        for record in records:
+            perSecond.setdefault(int(record.intended - self.startTime), newCounts())["intended"]+=1
+            counts=perSecond.setdefault(int(record.sent - self.startTime), newCounts())
+            counts["sent"]+=1
+            if record.outcome == LoadGenerator.Accepted:
+                counts["accepted"]+=1
+        perSecond=collections.OrderedDict(sorted(perSecond.items()))
+        return {
+            "schedule": str(self.schedule),
+            "sent": len(records),
+            "exhausted": self.exhausted,
+            "outcomes": dict(outcomes),
+            "intendedTps": len(records) / self.schedule.duration,
+            "achievedTps": accepted / elapsed if elapsed > 0 else 0,
+            "sendLag": Utils.percentiles([record.sent - record.intended for record in records], LoadGenerator.Percents),
+            "latency": Utils.percentiles([record.completed - record.intended for record in records], LoadGenerator.Percents),
+            "perNode": dict(collections.Counter(record.nodeIndex for record in records)),
+            "perSecond": perSecond
+        }
+
+    @staticmethod
+    def formatPercentiles(summary):
+        if summary is None:
+            return "no samples"
+        return "%s max=%.1fms" % (" ".join("p%d=%.1fms" % (percent, summary[percent] * 1000) for percent in LoadGenerator.Percents), summary["max"] * 1000)
+
+    def printReport(self, results=None):
+        results=self.results() if results is None else results
+        Utils.Print("Load %s: sent %d, intended %.1f tps, achieved %.1f accepted tps" % (results["schedule"], results["sent"], results.get("intendedTps", 0), results.get("achievedTps", 0)))
+        Utils.Print("  outcomes: %s" % (", ".join("%s=%d" % (outcome, count) for outcome, count in sorted(results["outcomes"].items()))))
+        if results["sent"] > 0:
+            Utils.Print("  send lag: %s" % (LoadGenerator.formatPercentiles(results["sendLag"])))
+            Utils.Print("  latency from intended send: %s" % (LoadGenerator.formatPercentiles(results["latency"])))
@@ -0,0 +1,134 @@
+import collections
+import mmap
+import os
+import re
+import sys
+import tarfile
+import time
+
+from testUtils import Utils
+
+###############################################################
+# LogTriage
+#  Bounded failure report of the logs of a cluster, instead of copying every log to stdout.  The full logs (and any
+#  other files given, config.ini, genesis.json, rotated logs) go into a gzip compressed tar bundle on disk, stdout gets
+#    - per log file its size, the number of error, warn and assert lines and its last tailLines lines, read by seeking
+#      backwards from the end
+#    - excerpts of contextLines lines around error, warn and assert lines, errors first, at most maxExcerpts, each
+#      distinct line (same source location and message, ids and numbers aside) only once across all nodes, with
+#      how often and on which nodes it occurred
+#  Lines of interest are found by one regex pass over the mmapped file, which yields an index of their offsets, the
+#  excerpts are cut from the map around those offsets.
+###############################################################
+
+class LogTriage(object):
+    DefaultTailLines=40
+    DefaultContextLines=3
+    DefaultMaxExcerpts=20
+    TailBlockBytes=64 * 1024
+    Severities=["error", "assert", "warn"]
+    # fc log lines of level error and warn, failed C asserts and std::terminate
+    SeverityPattern=re.compile(rb"^(?:(error|warn)\s|[^\n]*?(?:Assertion [^\n]*failed|terminate called))[^\n]*", re.MULTILINE)
+    # "<level> <time> <thread> <file>:<line> <function> ] <message>"
+    PrefixPattern=re.compile(r"^\w+\s+\S+\s+\S+\s+(\S+:\d+)\s+\S+\s*\]\s?(.*)$")
+    VariablePattern=re.compile(r"\b[0-9a-f]{8,}\b|\d+")
+
+    def __init__(self, tailLines=DefaultTailLines, contextLines=DefaultContextLines, maxExcerpts=DefaultMaxExcerpts):
+        self.tailLines=tailLines
+        self.contextLines=contextLines
+        self.maxExcerpts=maxExcerpts
+
+    @staticmethod
+    def index(data):
+        """(offset, severity) of every line of interest in data (bytes or mmap)."""
+        return [(match.start(), match.group(1).decode("ascii") if match.group(1) else "assert") for match in LogTriage.SeverityPattern.finditer(data)]
+
+    def window(self, data, offset):
+        """The line at offset with contextLines lines before and after it."""
+        start=offset
+        for _ in range(self.contextLines):
+            if start == 0:
+                break
+            start=data.rfind(b"\n", 0, start - 1) + 1
+        end=offset
+        for _ in range(self.contextLines + 1):
+            position=data.find(b"\n", end)
+            if position < 0:
+                end=len(data)
+                break
+            end=position + 1
+        return data[start:end]
+
+    def tail(self, fileName):
+        """The last tailLines lines of fileName, read backwards in blocks."""
+        with open(fileName, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position=f.tell()
+            data=b""
+            while position > 0 and data.count(b"\n") <= self.tailLines:
+                step=min(LogTriage.TailBlockBytes, position)
+                position-=step
+                f.seek(position)
+                data=f.read(step) + data
+        return b"\n".join(data.split(b"\n")[-self.tailLines - 1:])
+
+    @staticmethod
+    def dedupeKey(severity, line):
+        """Severity, source location and message of a line, with ids and numbers replaced."""
+        text=line.decode("utf-8", errors="replace")
+        match=LogTriage.PrefixPattern.match(text)
+        location, message=match.groups() if match is not None else ("", text)
+        return (severity, location, LogTriage.VariablePattern.sub("#", message))
+
+    @staticmethod
+    def bundle(bundlePath, fileNames):
+        """Write fileNames to the tar.gz bundlePath, with fast compression. Returns the size of the bundle."""
+        with tarfile.open(bundlePath, "w:gz", compresslevel=1) as tar:
+            for fileName in fileNames:
+                if os.path.exists(fileName):
+                    tar.add(fileName, arcname=os.path.relpath(fileName))
+        return os.path.getsize(bundlePath)
+
+    def triage(self, logFiles, bundlePath, extraFiles=[]):
+        """logFiles: node name -> its log files, oldest first. Bundle them and extraFiles into bundlePath and print the
+        summary. Returns the distinct excerpts as (key, first node, first file, count, nodes)."""
+        start=time.perf_counter()
+        allFiles=[fileName for fileNames in logFiles.values() for fileName in fileNames]
+        bundleSize=LogTriage.bundle(bundlePath, allFiles + extraFiles)
+        Utils.Print(Utils.FileDivider)
+        Utils.Print("Log triage of %d log file(s), all logs and %d other file(s) in %s (%.1f MB)" %
+                    (len(allFiles), len(extraFiles), bundlePath, bundleSize / (1024 * 1024)))
+
+        # key -> [excerpt, node, file, count, nodes]
+        excerpts=collections.OrderedDict()
+        for node, fileNames in logFiles.items():
+            for fileName in fileNames:
+                size=os.path.getsize(fileName)
+                if size == 0:
+                    Utils.Print("%s %s: empty" % (node, fileName))
+                    continue
+                with open(fileName, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    found=LogTriage.index(data)
+                    counts=collections.Counter(severity for _, severity in found)
+                    for offset, severity in found:
+                        lineEnd=data.find(b"\n", offset)
+                        key=LogTriage.dedupeKey(severity, data[offset:lineEnd if lineEnd >= 0 else len(data)])
+                        entry=excerpts.get(key)
+                        if entry is None:
+                            excerpts[key]=[self.window(data, offset), node, fileName, 1, {node}]
+                        else:
+                            entry[3]+=1
+                            entry[4].add(node)
+                Utils.Print(Utils.FileDivider)
+                Utils.Print("%s %s: %.1f MB, %s, last %d lines:" % (node, fileName, size / (1024 * 1024),
+                                                                       ", ".join("%d %s" % (counts[severity], severity) for severity in LogTriage.Severities), self.tailLines))
+                sys.stdout.write(self.tail(fileName).decode("utf-8", errors="replace") + "\n")
+
+        ordered=sorted(excerpts.items(), key=lambda item: LogTriage.Severities.index(item[0][0]))
+        Utils.Print(Utils.FileDivider)
+        Utils.Print("%d distinct error/assert/warn line(s), showing %d:" % (len(ordered), min(len(ordered), self.maxExcerpts)))
+        for key, (excerpt, node, fileName, count, nodes) in ordered[:self.maxExcerpts]:
+            Utils.Print("[%s] %dx on %s, first in %s:" % (key[0], count, ",".join(sorted(nodes)), fileName))
+            sys.stdout.write(excerpt.decode("utf-8", errors="replace"))
+        Utils.Print("Log triage took %.1f sec" % (time.perf_counter() - start))
+        return [(key, node, fileName, count, sorted(nodes)) for key, (_, node, fileName, count, nodes) in ordered]
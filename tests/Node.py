@@ -7,6 +7,9 @@ import re
 import datetime
 import json
 import signal
+import socket
+import urllib.request
+import urllib.error
 
 from core_symbol import CORE_SYMBOL
 from testUtils import Utils
@@ -15,6 +18,7 @@ from testUtils import EnumType
 from testUtils import addEnum
 from testUtils import unhandledEnumType
 from testUtils import ReturnType
+from ProductionTimeline import ProductionTimeline
 
 class BlockType(EnumType):
     pass
@@ -49,6 +53,7 @@ class Node(object):
         self.walletMgr=walletMgr
         self.missingTransaction=False
         self.popenProc=None           # initial process is started by launcher, this will only be set on relaunch
+        self.nodeLog=None             # NodeLog parsing the stderr of the node, see Cluster.startLogPipelines
         if self.enableMongo:
             self.mongoEndpointArgs += "--host %s --port %d %s" % (mongoHost, mongoPort, mongoDb)
 
@@ -658,6 +663,28 @@ class Node(object):
         ret=Utils.waitForBool(lam, timeout)
         return ret
 
+    def waitForTransactionsInBlocks(self, transIds, firstBlockNum, timeout=None):
+        """Wait for all trans ids to be in blocks at or after firstBlockNum. Unlike waitForTransInBlock per id, every
+        block is fetched once, in a single forward scan. Returns False on timeout."""
+        missing=set(transIds)
+        nextBlockNum=[firstBlockNum]
+        def scan():
+            headBlockNum=self.getHeadBlockNum()
+            while nextBlockNum[0] <= headBlockNum and len(missing) > 0:
+                block=self.processUrllibRequest("chain", "get_block", {"block_num_or_id": nextBlockNum[0]}, silentErrors=True)
+                if block is None:
+                    break
+                for trx in block["transactions"]:
+                    missing.discard(trx["trx"]["id"] if isinstance(trx["trx"], dict) else trx["trx"])
+                nextBlockNum[0]+=1
+            return len(missing) == 0
+
+        ret=Utils.waitForBool(scan, timeout, sleepTime=0.5)
+        if not ret:
+            Utils.Print("ERROR: %d of %d transactions not found in blocks %d to %d on node port %d, e.g. %s" %
+                        (len(missing), len(transIds), firstBlockNum, nextBlockNum[0] - 1, self.port, ", ".join(sorted(missing)[:5])))
+        return ret
+
     def waitForTransFinalization(self, transId, timeout=None):
         """Wait for trans id to be finalized."""
         assert(isinstance(transId, str))
@@ -1132,6 +1159,77 @@ class Node(object):
 
         return rtn
 
+    def processUrllibRequest(self, resource, command, payload={}, silentErrors=False, exitOnError=False, exitMsg=None, returnType=ReturnType.json, timeout=None):
+        """Same as processCurlCmd, but issues the request from this process instead of spawning curl for it."""
+        cmd="%s/v1/%s/%s" % (self.endpointHttp, resource, command)
+        data=payload if isinstance(payload, str) else json.dumps(payload)
+        req=urllib.request.Request(cmd, data=data.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST")
+        if Utils.Debug: Utils.Print("cmd: %s %s" % (cmd, data))
+        rtn=None
+        start=time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=timeout if timeout is not None else Utils.systemWaitTimeout) as response:
+                rtn=response.read()
+            if returnType==ReturnType.json:
+                rtn=json.loads(rtn.decode("utf-8"))
+            elif returnType==ReturnType.raw:
+                rtn=rtn.decode("utf-8")
+            else:
+                unhandledEnumType(returnType)
+
+            if Utils.Debug:
+                end=time.perf_counter()
+                Utils.Print("cmd Duration: %.3f sec" % (end-start))
+                printReturn=json.dumps(rtn) if returnType==ReturnType.json else rtn
+                Utils.Print("cmd returned: %s" % (printReturn))
+        except (urllib.error.URLError, OSError, ValueError) as ex:
+            if not silentErrors:
+                end=time.perf_counter()
+                msg=ex.read().decode("utf-8") if isinstance(ex, urllib.error.HTTPError) else str(ex)
+                errorMsg="Exception during \"%s\". %s.  cmd Duration=%.3f sec." % (cmd, msg, end-start)
+                if exitOnError:
+                    Utils.cmdError(errorMsg)
+                    Utils.errorExit(errorMsg)
+                else:
+                    Utils.Print("ERROR: %s" % (errorMsg))
+            return None
+
+        if exitMsg is not None:
+            exitMsg=": " + exitMsg
+        else:
+            exitMsg=""
+        if exitOnError and rtn is None:
+            Utils.cmdError("could not \"%s\" - %s" % (cmd,exitMsg))
+            Utils.errorExit("Failed to \"%s\"" % (cmd))
+
+        return rtn
+
+    PushTimeout="timeout"
+    PushConnectionError="connection_error"
+
+    def pushTransaction(self, payload, timeout=None):
+        """Push a signed transaction (a push_transaction body) over http. Returns (response, None) if it was accepted,
+        else (None, error) with the nodeos error name (e.g. tx_duplicate), or Node.PushTimeout or
+        Node.PushConnectionError if no answer came, in which case the transaction may still have been accepted."""
+        cmd="%s/v1/chain/push_transaction" % (self.endpointHttp)
+        data=payload if isinstance(payload, bytes) else payload.encode("utf-8")
+        req=urllib.request.Request(cmd, data=data, headers={"Content-Type": "application/json"}, method="POST")
+        if Utils.Debug: Utils.Print("cmd: %s" % (cmd))
+        try:
+            with urllib.request.urlopen(req, timeout=timeout if timeout is not None else Utils.systemWaitTimeout) as response:
+                return json.loads(response.read().decode("utf-8")), None
+        except urllib.error.HTTPError as ex:
+            try:
+                return None, json.loads(ex.read().decode("utf-8"))["error"]["name"]
+            except (ValueError, KeyError, TypeError):
+                return None, "http_%d" % (ex.code)
+        except socket.timeout:
+            return None, Node.PushTimeout
+        except (urllib.error.URLError, OSError) as ex:
+            if isinstance(getattr(ex, "reason", None), socket.timeout):
+                return None, Node.PushTimeout
+            return None, Node.PushConnectionError
+
     def txnGenCreateTestAccounts(self, genAccount, genKey, silentErrors=True, exitOnError=False, exitMsg=None, returnType=ReturnType.json):
         assert(isinstance(genAccount, str))
         assert(isinstance(genKey, str))
@@ -1149,6 +1247,13 @@ class Node(object):
         payload="[ \"%s\", %d, %d ]" % (salt, period, batchSize)
         return self.processCurlCmd("txn_test_gen", "start_generation", payload, silentErrors=silentErrors, exitOnError=exitOnError, exitMsg=exitMsg, returnType=returnType)
 
+    def txnGenStop(self, silentErrors=True, exitOnError=False, exitMsg=None, returnType=ReturnType.json):
+        """Stop txn_test_gen_plugin generation. The plugin answers with an error if generation is not running,
+        which is also the case when it stopped itself after failing to push a transaction."""
+        assert(isinstance(returnType, ReturnType))
+
+        return self.processCurlCmd("txn_test_gen", "stop_generation", "{}", silentErrors=silentErrors, exitOnError=exitOnError, exitMsg=exitMsg, returnType=returnType)
+
     def waitForTransBlockIfNeeded(self, trans, waitForTransBlock, exitOnError=False):
         if not waitForTransBlock:
             return trans
@@ -1342,20 +1447,14 @@ class Node(object):
 
         blockNum=self.getHeadBlockNum()
         Utils.Print("Searching for clean production cycle blockNum=%s ibn=%s  transId=%s  promoted bn=%s  ibn for schedule active=%s" % (blockNum,irreversibleBlockNum,transId,promotedBlockNum,ibnSchedActive))
-        blockProducer=self.getBlockProducerByNum(blockNum)
-        blockNum+=1
         Utils.Print("Advance until the next block producer is retrieved")
-        while blockProducer == self.getBlockProducerByNum(blockNum):
-            blockNum+=1
-
-        blockProducer=self.getBlockProducerByNum(blockNum)
-        return blockNum
+        return ProductionTimeline(self, blockNum).nextProducerChange(blockNum)
 
 
     # TBD: make nodeId an internal property
     # pylint: disable=too-many-locals
     # If nodeosPath is equal to None, it will use the existing nodeos path
-    def relaunch(self, nodeId, chainArg=None, newChain=False, timeout=Utils.systemWaitTimeout, addSwapFlags=None, cachePopen=False, nodeosPath=None):
+    def relaunch(self, nodeId, chainArg=None, newChain=False, timeout=Utils.systemWaitTimeout, addSwapFlags=None, cachePopen=False, nodeosPath=None, pulseInterval=1):
 
         assert(self.pid is None)
         assert(self.killed)
@@ -1405,7 +1504,7 @@ class Node(object):
                 pass
             return False
 
-        isAlive=Utils.waitForBool(isNodeAlive, timeout, sleepTime=1)
+        isAlive=Utils.waitForBool(isNodeAlive, timeout, sleepTime=pulseInterval)
         if isAlive:
             Utils.Print("Node relaunch was successfull.")
         else:
@@ -1439,13 +1538,22 @@ class Node(object):
         dateStr=Utils.getDateString(dt)
         stdoutFile="%s/stdout.%s.txt" % (dataDir, dateStr)
         stderrFile="%s/stderr.%s.txt" % (dataDir, dateStr)
-        with open(stdoutFile, 'w') as sout, open(stderrFile, 'w') as serr:
-            Utils.Print("cmd: %s" % (cmd))
-            popen=subprocess.Popen(cmd.split(), stdout=sout, stderr=serr)
-            if cachePopen:
-                self.popenProc=popen
-            self.pid=popen.pid
-            if Utils.Debug: Utils.Print("start Node host=%s, port=%s, pid=%s, cmd=%s" % (self.host, self.port, self.pid, self.cmd))
+        if self.nodeLog is not None:
+            # stderr goes through the reader thread of the NodeLog, which writes stderrFile
+            with open(stdoutFile, 'w') as sout:
+                Utils.Print("cmd: %s" % (cmd))
+                popen=subprocess.Popen(cmd.split(), stdout=sout, stderr=subprocess.PIPE)
+            self.nodeLog.attachPipe(popen.stderr, stderrFile)
+            # the NodeLog owns the pipe, communicate() (interruptAndVerifyExitStatus) must not read from it
+            popen.stderr=None
+        else:
+            with open(stdoutFile, 'w') as sout, open(stderrFile, 'w') as serr:
+                Utils.Print("cmd: %s" % (cmd))
+                popen=subprocess.Popen(cmd.split(), stdout=sout, stderr=serr)
+        if cachePopen:
+            self.popenProc=popen
+        self.pid=popen.pid
+        if Utils.Debug: Utils.Print("start Node host=%s, port=%s, pid=%s, cmd=%s" % (self.host, self.port, self.pid, self.cmd))
 
     def trackCmdTransaction(self, trans, ignoreNonTrans=False):
         if trans is None:
@@ -1590,3 +1698,9 @@ class Node(object):
     def createSnapshot(self):
         param = { }
         return self.processCurlCmd("producer", "create_snapshot", json.dumps(param))
+
+    # Require db_size_api_plugin
+    def getDbSize(self, silentErrors=True, timeout=None):
+        """chainbase usage, dictionary of free_bytes, used_bytes, size and the row count of every index. None if the
+        node does not answer."""
+        return self.processUrllibRequest("db_size", "get", silentErrors=silentErrors, timeout=timeout)
@@ -0,0 +1,281 @@
+import collections
+import datetime
+import gzip
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from testUtils import Utils
+
+###############################################################
+# NodeLog
+#  Live view of the stderr log of a nodeos.  A reader thread takes the log line by line as it is written, either from
+#  the stderr pipe of a node the harness launched (Node.launchCmd, the thread also writes the raw log, rotating and
+#  compressing it, see RotatingLog) or by tailing the file of a node the launcher started.  Key lines are parsed into
+#  LogEvents, kept in a bounded per node stream that tests can wait on (waitFor) or aggregate (events, summary):
+#    produced     - "Produced block", with trx count and the log time minus the block time (offsetMs)
+#    received     - "Received block", with trx count and latency
+#    notApplied   - "Block not applied to head"
+#    forkSwitch   - controller "switching forks from ... to ..."
+#    syncState    - net_plugin "old state ... becoming ..."
+#    syncRequest  - net_plugin "Catching up with chain, our last req is ..., theirs is ..."
+#    trxRejected  - "[TRX_TRACE] ... is REJECTING tx" (needs the transaction trace loggers at debug)
+#    error        - any other error level line
+#
+#  The pipe reader only writes the raw log and queues the lines, parsing runs in a thread of its own and compression
+#  in another, so the node never waits for more than the write of the raw log.  nodeos quits on SIGPIPE, so a node
+#  with a piped stderr does not outlive the harness (no --leave-running).
+#
+#  readLines() reads the stderr logs of a node after the fact, rotated segments included, for tests that parse the
+#  logs themselves.
+###############################################################
+
+LogEvent=collections.namedtuple("LogEvent", "sequence kind time fields line")
+
+class RotatingLog(object):
+    """Text log file that is moved to <directory>/rotated/<name>.<n> and gzip compressed in the background whenever it
+    grew past rotateBytes (None: never)."""
+    RotatedDirName="rotated"
+
+    def __init__(self, fileName, rotateBytes=None):
+        self.fileName=fileName
+        self.rotateBytes=rotateBytes
+        self.rotations=0
+        self.__file=open(fileName, "w", buffering=1)
+        self.__written=0
+        self.__compressors=[]
+
+    def write(self, text):
+        self.__file.write(text)
+        self.__written+=len(text)
+        if self.rotateBytes is not None and self.__written >= self.rotateBytes:
+            self.rotate()
+
+    def rotate(self):
+        self.__file.close()
+        self.rotations+=1
+        rotatedDir=os.path.join(os.path.dirname(self.fileName), RotatingLog.RotatedDirName)
+        if not os.path.exists(rotatedDir):
+            os.makedirs(rotatedDir)
+        rotatedFile=os.path.join(rotatedDir, "%s.%d" % (os.path.basename(self.fileName), self.rotations))
+        os.rename(self.fileName, rotatedFile)
+        self.__file=open(self.fileName, "w", buffering=1)
+        self.__written=0
+        compressor=threading.Thread(target=RotatingLog.compress, args=(rotatedFile,), daemon=True)
+        compressor.start()
+        self.__compressors=[thread for thread in self.__compressors if thread.is_alive()] + [compressor]
+
+    @staticmethod
+    def compress(fileName):
+        with open(fileName, "rb") as source, gzip.open(fileName + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(fileName)
+
+    def close(self):
+        self.__file.close()
+        for compressor in self.__compressors:
+            compressor.join()
+
+class NodeLog(object):
+    DefaultMaxEvents=100000
+    DefaultRotateBytes=256 * 1024 * 1024
+    TailIntervalSeconds=0.2
+    LinePattern=re.compile(r"^(\w+)\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3})\s.*?\]\s(.*)$")
+    BlockPattern=r"([0-9a-f]+)\.\.\. #(\d+) @ (\S+) signed by (\S+)"
+    # kind, pattern of the message, names of its groups (blockNum, trxs, ... are converted to int)
+    Patterns=[
+        ("produced", re.compile(r"Produced block %s \[trxs: (\d+), lib: (\d+), confirmed: (\d+)\]" % (BlockPattern)),
+         ["blockId", "blockNum", "blockTime", "producer", "trxs", "lib", "confirmed"]),
+        ("received", re.compile(r"Received block %s \[trxs: (\d+), lib: (\d+), conf: (\d+), latency: (-?\d+) ms\]" % (BlockPattern)),
+         ["blockId", "blockNum", "blockTime", "producer", "trxs", "lib", "confirmed", "latencyMs"]),
+        ("notApplied", re.compile(r"Block not applied to head %s" % (BlockPattern)), ["blockId", "blockNum", "blockTime", "producer"]),
+        ("forkSwitch", re.compile(r"switching forks from ([0-9a-f]+) \(block number (\d+)\) to ([0-9a-f]+) \(block number (\d+)\)"),
+         ["fromBlockId", "fromBlockNum", "toBlockId", "toBlockNum"]),
+        ("syncState", re.compile(r"old state (.+) becoming (.+?)\s*$"), ["oldState", "newState"]),
+        ("syncRequest", re.compile(r"Catching up with chain, our last req is (\d+), theirs is (\d+) peer (.+?)\s*$"), ["lastRequested", "theirs", "peer"]),
+        ("trxRejected", re.compile(r"is REJECTING tx: ([0-9a-f]+) : (.*?)\s*$"), ["transactionId", "reason"])
+    ]
+    IntFields={"blockNum", "trxs", "lib", "confirmed", "latencyMs", "fromBlockNum", "toBlockNum", "lastRequested", "theirs"}
+    StderrPattern=re.compile(r"^stderr\..+\.txt$")
+    SegmentPattern=re.compile(r"^(stderr\..+\.txt)\.(\d+)(\.gz)?$")
+
+    def __init__(self, nodeId, maxEvents=DefaultMaxEvents, rotateBytes=DefaultRotateBytes):
+        self.nodeId=nodeId
+        self.rotateBytes=rotateBytes
+        self.counts=collections.Counter()
+        self.__events=collections.deque(maxlen=maxEvents)
+        self.__sequence=0
+        self.__condition=threading.Condition()
+        self.__threads=[]
+        self.__followStop=threading.Event()
+
+    @staticmethod
+    def parseLine(line):
+        """(kind, time, fields) of a log line, None if it is not one of the parsed kinds."""
+        match=NodeLog.LinePattern.match(line)
+        if match is None:
+            return None
+        level, logTime, message=match.groups()
+        for kind, pattern, names in NodeLog.Patterns:
+            found=pattern.search(message)
+            if found is None:
+                continue
+            fields={name: int(value) if name in NodeLog.IntFields else value for name, value in zip(names, found.groups())}
+            logTime=datetime.datetime.strptime(logTime, Utils.TimeFmt)
+            if kind == "produced":
+                fields["offsetMs"]=(logTime - datetime.datetime.strptime(fields["blockTime"], Utils.TimeFmt)).total_seconds() * 1000
+            return kind, logTime, fields
+        if level == "error":
+            return "error", datetime.datetime.strptime(logTime, Utils.TimeFmt), {"message": message}
+        return None
+
+    def addLine(self, line):
+        parsed=NodeLog.parseLine(line)
+        if parsed is None:
+            return
+        with self.__condition:
+            self.__sequence+=1
+            self.__events.append(LogEvent(self.__sequence, parsed[0], parsed[1], parsed[2], line.rstrip("\n")))
+            self.counts[parsed[0]]+=1
+            self.__condition.notify_all()
+
+    def __readPipe(self, pipe, fileName, lines):
+        rawLog=RotatingLog(fileName, self.rotateBytes)
+        try:
+            for data in iter(pipe.readline, b""):
+                line=data.decode("utf-8", errors="replace")
+                rawLog.write(line)
+                lines.put(line)
+        finally:
+            lines.put(None)
+            rawLog.close()
+            pipe.close()
+
+    def __parse(self, lines):
+        for line in iter(lines.get, None):
+            self.addLine(line)
+
+    def __follow(self, fileName, stopEvent):
+        with open(fileName, "r", errors="replace") as f:
+            partial=""
+            while True:
+                data=f.readline()
+                if not data:
+                    if stopEvent.wait(NodeLog.TailIntervalSeconds):
+                        return
+                    continue
+                partial+=data
+                if partial.endswith("\n"):
+                    self.addLine(partial)
+                    partial=""
+
+    def __startThread(self, target, args):
+        thread=threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.__threads=[running for running in self.__threads if running.is_alive()] + [thread]
+
+    def attachPipe(self, pipe, fileName):
+        """Read the stderr pipe of a newly launched node, writing it to fileName. Stops following a file."""
+        self.__followStop.set()
+        # unbounded, a burst of log lines waits here for the parser instead of in the pipe
+        lines=queue.Queue()
+        self.__startThread(self.__parse, (lines,))
+        self.__startThread(self.__readPipe, (pipe, fileName, lines))
+
+    def follow(self, fileName):
+        """Tail fileName, which another process writes, from its start."""
+        self.__followStop.set()
+        self.__followStop=threading.Event()
+        self.__startThread(self.__follow, (fileName, self.__followStop))
+
+    def stop(self, timeout=10):
+        """Stop following, wait for the pipe readers and parsers, which end when the node exited."""
+        self.__followStop.set()
+        for thread in self.__threads:
+            thread.join(timeout)
+
+    @staticmethod
+    def stderrFiles(dataDir):
+        """The stderr logs in dataDir, oldest first: per launch its rotated segments, then its current file."""
+        rotatedDir=os.path.join(dataDir, RotatingLog.RotatedDirName)
+        # current file name -> segment number -> segment file
+        segments=collections.defaultdict(dict)
+        if os.path.isdir(rotatedDir):
+            for entry in os.listdir(rotatedDir):
+                match=NodeLog.SegmentPattern.match(entry)
+                if match is None:
+                    continue
+                # a segment that is still being compressed is read from the uncompressed file
+                number=int(match.group(2))
+                if match.group(3) is None or number not in segments[match.group(1)]:
+                    segments[match.group(1)][number]=os.path.join(rotatedDir, entry)
+        current={entry for entry in os.listdir(dataDir) if NodeLog.StderrPattern.match(entry)}
+        fileNames=[]
+        # the date in the name orders the launches
+        for name in sorted(current | set(segments)):
+            fileNames+=[segments[name][number] for number in sorted(segments[name])]
+            if name in current:
+                fileNames.append(os.path.join(dataDir, name))
+        return fileNames
+
+    @staticmethod
+    def readLines(nodeId):
+        """Every line of the stderr logs of node nodeId, oldest first, rotated segments included."""
+        for fileName in NodeLog.stderrFiles(Utils.getNodeDataDir(nodeId)):
+            if not os.path.exists(fileName) and os.path.exists(fileName + ".gz"):
+                # compressed since it was listed
+                fileName+=".gz"
+            with (gzip.open if fileName.endswith(".gz") else open)(fileName, "rt", errors="replace") as f:
+                for line in f:
+                    yield line
+
+    def mark(self):
+        """Sequence number of the last event, for waitFor and events."""
+        with self.__condition:
+            return self.__sequence
+
+    def events(self, kind=None, after=0):
+        """The kept events, of kind if given, with a sequence number after after."""
+        with self.__condition:
+            return [event for event in self.__events if event.sequence > after and (kind is None or event.kind == kind)]
+
+    def waitFor(self, kind, predicate=None, timeout=Utils.systemWaitTimeout, after=None):
+        """First event of kind for which predicate (of the event) holds, after the sequence number after (default:
+        events from now on). Returns None on timeout."""
+        deadline=time.perf_counter() + timeout
+        with self.__condition:
+            last=self.__sequence if after is None else after
+            while True:
+                for event in self.__events:
+                    if event.sequence > last and event.kind == kind and (predicate is None or predicate(event)):
+                        return event
+                last=self.__sequence
+                remaining=deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self.__condition.wait(remaining)
+
+    def summary(self, after=0):
+        produced=self.events("produced", after)
+        received=self.events("received", after)
+        return {
+            "counts": dict(self.counts),
+            "producedBlocks": len(produced),
+            "producedTrxs": sum(event.fields["trxs"] for event in produced),
+            "produceOffsetMs": Utils.percentiles([event.fields["offsetMs"] for event in produced]),
+            "receivedBlocks": len(received),
+            "receivedLatencyMs": Utils.percentiles([event.fields["latencyMs"] for event in received]),
+            "forkSwitches": len(self.events("forkSwitch", after))
+        }
+
+    def printSummary(self):
+        summary=self.summary()
+        offsets=summary["produceOffsetMs"]
+        latency=summary["receivedLatencyMs"]
+        Utils.Print("Log of node %s: %d blocks produced (%d trxs, offset p50 %s ms), %d received (latency p50 %s ms), %d fork switches, events %s" %
+                    (self.nodeId, summary["producedBlocks"], summary["producedTrxs"], "%.0f" % (offsets[50]) if offsets is not None else "n/a",
+                     summary["receivedBlocks"], "%.0f" % (latency[50]) if latency is not None else "n/a", summary["forkSwitches"],
+                     ", ".join("%s=%d" % (kind, count) for kind, count in sorted(summary["counts"].items()))))
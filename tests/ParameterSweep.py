@@ -0,0 +1,228 @@
+import collections
+import csv
+import itertools
+import os
+import threading
+import time
+
+from testUtils import Utils
+from Cluster import Cluster
+from Node import Node
+from BlockPropagationProfiler import BlockPropagationProfiler
+from ResourceSampler import ResourceSampler
+from LoadGenerator import RateSchedule
+from TransactionCorpus import TransactionCorpus
+
+from core_symbol import CORE_SYMBOL
+
+###############################################################
+# ParameterSweep
+#  Runs a workload on a freshly launched local cluster for every point of a grid of Cluster.launch parameters
+#  (pnodes, totalNodes, prodCount, topo, delay, sharedProducers) and measures per point:
+#    tps                      - transactions included per second in the blocks of node 0 during the measurement
+#    blockLatencyP50/P90      - block propagation from the producing node to the other nodes (BlockPropagationProfiler)
+#    libLagP50/Max            - head minus last irreversible block of node 0, sampled every half second
+#    cpuPercent/rssMb         - cpu time and peak resident memory of all nodeos processes together (from /proc)
+#  The rows can be written as csv and printed as a table, or as a curve of one metric against one parameter with a
+#  series per value of another parameter (e.g. LIB lag against totalNodes for mesh and star).
+#
+#  Every local cluster uses the same http/p2p ports and the same var/lib and etc/eosio directories, so points run
+#  one at a time.
+###############################################################
+
+class IdleWorkload(object):
+    """No transactions, measures the cluster producing empty blocks."""
+    name="idle"
+
+    def prepare(self, cluster, seconds):
+        pass
+
+    def run(self, nodes, seconds):
+        time.sleep(seconds)
+        return {}
+
+class TransferWorkload(object):
+    """Pre-signed transfers between accountCount accounts at tps, spread over all nodes."""
+    name="transfers"
+
+    def __init__(self, tps, accountCount=10, corpusPath="sweep.trx"):
+        self.tps=tps
+        self.accountCount=accountCount
+        self.corpusPath=corpusPath
+
+    def prepare(self, cluster, seconds):
+        node=cluster.getNode(0)
+        accounts=Cluster.createAccountKeys(self.accountCount)
+        if accounts is None:
+            Utils.errorExit("Failed to create account keys")
+        for index, account in enumerate(accounts):
+            account.name="sweep%s" % ("".join(chr(ord("a") + (index // 26 ** i) % 26) for i in range(6, -1, -1)))
+            node.createAccount(account, cluster.eosioAccount, stakedDeposit=0, exitOnError=True)
+        trans=None
+        for account in accounts:
+            trans=node.transferFunds(cluster.eosioAccount, account, "100000.0000 {0}".format(CORE_SYMBOL), "fund", exitOnError=True)
+        node.waitForTransInBlock(Node.getTransId(trans))
+        TransactionCorpus.generate(self.corpusPath, TransactionCorpus.taposFromNode(node), accounts, int(self.tps * seconds))
+
+    def run(self, nodes, seconds):
+        with TransactionCorpus(self.corpusPath) as corpus:
+            results=corpus.replay(nodes, RateSchedule.constant(self.tps, seconds)).results()
+        os.remove(self.corpusPath)
+        os.remove(TransactionCorpus.indexPath(self.corpusPath))
+        return {"offeredTps": self.tps, "acceptedTps": results.get("achievedTps", 0)}
+
+class ParameterSweep(object):
+    Parameters=["pnodes", "totalNodes", "prodCount", "topo", "delay", "sharedProducers"]
+    Defaults={"pnodes": 1, "totalNodes": 1, "prodCount": 1, "topo": "mesh", "delay": 1, "sharedProducers": 0}
+    Metrics=["tps", "blockLatencyP50", "blockLatencyP90", "libLagP50", "libLagMax", "cpuPercent", "rssMb"]
+    LibSampleInterval=0.5
+
+    def __init__(self, grid, workload, walletMgr, measureSeconds=30, warmupSeconds=5, killAll=False, launchArgs=None):
+        """grid: dictionary of Cluster.launch parameter to the list of its values, missing parameters take Defaults.
+        workload: object with prepare(cluster, seconds), called once the cluster is up, and run(nodes, seconds),
+                  returning a dictionary of extra columns (see IdleWorkload, TransferWorkload).
+        launchArgs: extra keyword arguments for every Cluster.launch."""
+        for parameter in grid:
+            assert parameter in ParameterSweep.Parameters, "%s is not a sweep parameter" % (parameter)
+        self.grid=grid
+        self.workload=workload
+        self.walletMgr=walletMgr
+        self.measureSeconds=measureSeconds
+        self.warmupSeconds=warmupSeconds
+        self.killAll=killAll
+        self.launchArgs=launchArgs if launchArgs is not None else {}
+        self.cluster=None
+        self.rows=[]
+
+    def points(self):
+        """Every combination of the grid values that Cluster.launch accepts."""
+        values=[self.grid.get(parameter, [ParameterSweep.Defaults[parameter]]) for parameter in ParameterSweep.Parameters]
+        points=[]
+        for combination in itertools.product(*values):
+            point=collections.OrderedDict(zip(ParameterSweep.Parameters, combination))
+            if point["pnodes"] > point["totalNodes"]:
+                continue
+            points.append(point)
+        return points
+
+    def __usage(self, nodes):
+        """cpu seconds and resident KB of all nodes together."""
+        usage=[ResourceSampler.readProcess(node.pid) for node in nodes if node.pid is not None]
+        usage=[entry for entry in usage if entry is not None]
+        return sum(entry["cpuSeconds"] for entry in usage), sum(entry["rssKb"] for entry in usage)
+
+    def __sampleLibLag(self, node, samples, rssSamples, nodes, stopEvent):
+        while not stopEvent.is_set():
+            info=node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=1)
+            if info is not None:
+                samples.append(info["head_block_num"] - info["last_irreversible_block_num"])
+            rssSamples.append(self.__usage(nodes)[1])
+            stopEvent.wait(ParameterSweep.LibSampleInterval)
+
+    def __includedTps(self, node, first, last, seconds):
+        count=0
+        for blockNum in range(first, last + 1):
+            block=node.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, silentErrors=True)
+            if block is not None:
+                count+=len(block["transactions"])
+        return count / seconds
+
+    def __launch(self, point):
+        if self.cluster is not None:
+            self.cluster.killall(allInstances=self.killAll)
+            self.cluster.cleanup()
+        # a Cluster only launches once
+        self.cluster=Cluster(walletd=True)
+        self.cluster.setWalletMgr(self.walletMgr)
+        totalProducers=point["pnodes"] * point["prodCount"]
+        if self.cluster.launch(pnodes=point["pnodes"], totalNodes=point["totalNodes"], prodCount=point["prodCount"], topo=point["topo"], delay=point["delay"],
+                               sharedProducers=point["sharedProducers"], totalProducers=totalProducers, useBiosBootFile=False, loadSystemContract=False,
+                               **self.launchArgs) is False:
+            Utils.errorExit("Failed to stand up eos cluster for %s" % (ParameterSweep.describe(point)))
+
+    @staticmethod
+    def describe(point):
+        return " ".join("%s=%s" % (parameter, value) for parameter, value in point.items())
+
+    def runPoint(self, point):
+        Utils.Print("Sweep point %s, workload %s" % (ParameterSweep.describe(point), self.workload.name))
+        self.__launch(point)
+        self.workload.prepare(self.cluster, self.measureSeconds)
+        nodes=self.cluster.getNodes()
+        node0=nodes[0]
+        time.sleep(self.warmupSeconds)
+
+        libLag=[]
+        rss=[]
+        stopEvent=threading.Event()
+        sampler=threading.Thread(target=self.__sampleLibLag, args=(node0, libLag, rss, nodes, stopEvent), daemon=True)
+        profiler=BlockPropagationProfiler.fromCluster(self.cluster, topo=point["topo"])
+        cpuStart, _=self.__usage(nodes)
+        start=time.perf_counter()
+        first=node0.getHeadBlockNum() + 1
+        sampler.start()
+        with profiler:
+            extra=self.workload.run(nodes, self.measureSeconds)
+        stopEvent.set()
+        sampler.join()
+        last=node0.getHeadBlockNum()
+        elapsed=time.perf_counter() - start
+        cpuEnd, _=self.__usage(nodes)
+
+        propagation=profiler.results()["all"]
+        lag=Utils.percentiles(libLag)
+        row=collections.OrderedDict(point)
+        row["workload"]=self.workload.name
+        row["tps"]=self.__includedTps(node0, first, last, elapsed)
+        row["blockLatencyP50"]=propagation[50] * 1000 if propagation is not None else None
+        row["blockLatencyP90"]=propagation[90] * 1000 if propagation is not None else None
+        row["libLagP50"]=lag[50] if lag is not None else None
+        row["libLagMax"]=lag["max"] if lag is not None else None
+        row["cpuPercent"]=(cpuEnd - cpuStart) / elapsed * 100
+        row["rssMb"]=max(rss) / 1024 if len(rss) > 0 else None
+        row.update(extra)
+        self.rows.append(row)
+        Utils.Print("  %s" % (", ".join("%s=%s" % (key, ParameterSweep.__format(row[key])) for key in ParameterSweep.Metrics)))
+        return row
+
+    def run(self):
+        for point in self.points():
+            self.runPoint(point)
+        return self.rows
+
+    @staticmethod
+    def __format(value):
+        if value is None:
+            return "n/a"
+        return "%.2f" % (value) if isinstance(value, float) else str(value)
+
+    def writeCsv(self, path):
+        columns=[]
+        for row in self.rows:
+            columns.extend(column for column in row if column not in columns)
+        with open(path, "w", newline="") as f:
+            writer=csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def printTable(self):
+        columns=[]
+        for row in self.rows:
+            columns.extend(column for column in row if column not in columns)
+        widths={column: max([len(column)] + [len(ParameterSweep.__format(row.get(column))) for row in self.rows]) for column in columns}
+        Utils.Print("  ".join(column.rjust(widths[column]) for column in columns))
+        for row in self.rows:
+            Utils.Print("  ".join(ParameterSweep.__format(row.get(column)).rjust(widths[column]) for column in columns))
+
+    def printCurve(self, x, y, series):
+        """y against x, one column per value of series, e.g. printCurve("totalNodes", "libLagP50", "topo")."""
+        seriesValues=sorted(set(row[series] for row in self.rows))
+        xValues=sorted(set(row[x] for row in self.rows))
+        Utils.Print("%s by %s for each %s" % (y, x, series))
+        Utils.Print("%12s  %s" % (x, "  ".join("%12s" % (value) for value in seriesValues)))
+        for xValue in xValues:
+            cells=[]
+            for seriesValue in seriesValues:
+                values=[row[y] for row in self.rows if row[x] == xValue and row[series] == seriesValue and row[y] is not None]
+                cells.append("%12s" % (ParameterSweep.__format(sum(values) / len(values)) if len(values) > 0 else "-"))
+            Utils.Print("%12s  %s" % (xValue, "  ".join(cells)))
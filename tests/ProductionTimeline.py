@@ -0,0 +1,240 @@
+import array
+import concurrent.futures
+import datetime
+
+from testUtils import Utils
+
+###############################################################
+# ProductionTimeline
+#  Fetches the headers of a contiguous range of blocks once and keeps only what production analysis needs, in
+#  compact arrays indexed by (block number - first block number):
+#    slots             - uint32 block timestamp slot (500 ms intervals since 2000-01-01)
+#    producers         - uint64 encoded producer name
+#    scheduleVersions  - uint32 producer schedule version
+#  Headers are pulled from a node over http by a small pool of threads, or streamed out of a blocks.log, and are
+#  never fetched twice; the queries (clean round start, full rounds, missed slots, repeat producers) are scans over
+#  these arrays and over the producer runs (consecutive blocks by the same producer) derived from them.
+###############################################################
+
+class ProductionTimeline(object):
+    BlocksPerProducer=12
+    DefaultFetchThreads=8
+    BlockTimestampEpoch=datetime.datetime(2000, 1, 1)
+    BlockInterval=datetime.timedelta(milliseconds=500)
+    HeaderFields=["block_num", "timestamp", "producer", "schedule_version"]
+
+    def __init__(self, node, firstBlockNum, fetchThreads=DefaultFetchThreads):
+        assert(isinstance(firstBlockNum, int))
+        assert(firstBlockNum > 0)
+        self.node=node
+        self.firstBlockNum=firstBlockNum
+        self.fetchThreads=fetchThreads
+        self.slots=array.array('I')
+        self.producers=array.array('Q')
+        self.scheduleVersions=array.array('I')
+        self.__runStarts=None
+        self.__runLengths=None
+
+    @staticmethod
+    def fromBlockLog(blockLogLocation, first=None, last=None):
+        """Build the timeline from the blocks.log in blockLogLocation instead of from a running node."""
+        timeline=None
+        for block in Utils.getBlockLogStream(blockLogLocation, first=first, last=last, fields=ProductionTimeline.HeaderFields, exitOnError=True):
+            if timeline is None:
+                timeline=ProductionTimeline(None, block["block_num"])
+            timeline.__append(block)
+        return timeline
+
+    def __len__(self):
+        return len(self.producers)
+
+    @property
+    def lastBlockNum(self):
+        return self.firstBlockNum + len(self.producers) - 1
+
+    @staticmethod
+    def timestampToSlot(timestamp):
+        if "." not in timestamp:
+            timestamp+=".000"
+        return (datetime.datetime.strptime(timestamp, Utils.TimeFmt) - ProductionTimeline.BlockTimestampEpoch) // ProductionTimeline.BlockInterval
+
+    def __append(self, block):
+        blockNum=block["block_num"]
+        if blockNum != self.lastBlockNum + 1:
+            raise RuntimeError("ProductionTimeline expected block %d, but got block %d" % (self.lastBlockNum + 1, blockNum))
+        self.slots.append(ProductionTimeline.timestampToSlot(block["timestamp"]))
+        self.producers.append(Utils.nameToUint64(block["producer"]))
+        self.scheduleVersions.append(block["schedule_version"])
+        self.__runStarts=None
+        self.__runLengths=None
+
+    def __fetchHeader(self, blockNum):
+        if self.node.enableMongo:
+            return self.node.getBlock(blockNum, exitOnError=True)
+        return self.node.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, exitOnError=True)
+
+    def extendTo(self, lastBlockNum, timeout=None):
+        """Fetch all not yet fetched headers up to and including lastBlockNum, waiting for the node to produce it."""
+        if lastBlockNum <= self.lastBlockNum:
+            return
+        assert self.node is not None, "ProductionTimeline read from a block log cannot be extended"
+        if not self.node.waitForBlock(lastBlockNum - 1, timeout=timeout):
+            Utils.errorExit("Node did not reach block %d, needed for the production timeline" % (lastBlockNum))
+        blockNums=range(self.lastBlockNum + 1, lastBlockNum + 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.fetchThreads, len(blockNums))) as executor:
+            for block in executor.map(self.__fetchHeader, blockNums):
+                self.__append(block)
+
+    def __extendUntil(self, query, maxBlockNum, timeout=None):
+        """Grow the timeline a batch of available blocks at a time until query() returns something other than None,
+        or the timeline reaches maxBlockNum."""
+        while True:
+            ret=query()
+            if ret is not None or self.lastBlockNum >= maxBlockNum:
+                return ret
+            headBlockNum=self.node.getHeadBlockNum()
+            self.extendTo(min(max(headBlockNum, self.lastBlockNum + 1), maxBlockNum), timeout=timeout)
+
+    def __index(self, blockNum):
+        index=blockNum - self.firstBlockNum
+        assert 0 <= index < len(self.producers), "block %d is outside of the production timeline [%d, %d]" % (blockNum, self.firstBlockNum, self.lastBlockNum)
+        return index
+
+    def __bounds(self, first, last):
+        first=self.firstBlockNum if first is None else first
+        last=self.lastBlockNum if last is None else last
+        return (self.__index(first), self.__index(last) + 1)
+
+    def __runs(self):
+        if self.__runStarts is None:
+            starts=array.array('I')
+            lengths=array.array('I')
+            producers=self.producers
+            start=0
+            for i in range(1, len(producers) + 1):
+                if i == len(producers) or producers[i] != producers[start]:
+                    starts.append(start)
+                    lengths.append(i - start)
+                    start=i
+            self.__runStarts=starts
+            self.__runLengths=lengths
+        return (self.__runStarts, self.__runLengths)
+
+    def __runsIn(self, lo, hi):
+        """Runs overlapping the index range [lo, hi), clipped to it, as (start index, length, is run start) tuples.
+        The run start flag is False when the run began before lo, or lo is the first block of the timeline, since
+        then nothing is known about the blocks of that producer before lo."""
+        starts, lengths=self.__runs()
+        for start, length in zip(starts, lengths):
+            end=start + length
+            if end <= lo:
+                continue
+            if start >= hi:
+                break
+            yield (max(start, lo), min(end, hi) - max(start, lo), start >= lo and start > 0)
+
+    def producer(self, blockNum):
+        return Utils.uint64ToName(self.producers[self.__index(blockNum)])
+
+    def runs(self, first=None, last=None):
+        """List of (first block number, block count, producer) for each run of blocks by the same producer."""
+        lo, hi=self.__bounds(first, last)
+        return [(self.firstBlockNum + start, length, Utils.uint64ToName(self.producers[start])) for start, length, _ in self.__runsIn(lo, hi)]
+
+    def producersIn(self, first=None, last=None):
+        lo, hi=self.__bounds(first, last)
+        return set(Utils.uint64ToName(value) for value in set(self.producers[lo:hi]))
+
+    def unexpectedProducers(self, producers, first=None, last=None):
+        """List of (block number, producer) for the first block of each run by a producer that is not in producers."""
+        allowed=set(Utils.nameToUint64(producer) for producer in producers)
+        lo, hi=self.__bounds(first, last)
+        return [(self.firstBlockNum + start, Utils.uint64ToName(self.producers[start])) for start, _, _ in self.__runsIn(lo, hi) if self.producers[start] not in allowed]
+
+    def nextProducerChange(self, blockNum, timeout=None):
+        """Block number of the first block after blockNum that was not produced by the producer of blockNum,
+        fetching further blocks from the node as they are produced."""
+        self.extendTo(blockNum, timeout=timeout)
+        producer=self.producers[self.__index(blockNum)]
+        def query():
+            for start, _, _ in self.__runsIn(self.__index(blockNum), len(self.producers)):
+                if self.producers[start] != producer:
+                    return self.firstBlockNum + start
+            return None
+        # the producer can keep producing for at most a full turn, plus another if it is also next in a new schedule
+        return self.__extendUntil(query, blockNum + 2 * ProductionTimeline.BlocksPerProducer + 1, timeout=timeout)
+
+    def cleanRoundStart(self, producers=None, first=None, last=None, blocksPerProducer=BlocksPerProducer):
+        """Block number of the first run that starts cleanly (the producer before it is in the timeline) with a full
+        turn of blocksPerProducer blocks, by one of producers if given.  None if there is no such run."""
+        allowed=None if producers is None else set(Utils.nameToUint64(producer) for producer in producers)
+        lo, hi=self.__bounds(first, last)
+        for start, length, isRunStart in self.__runsIn(lo, hi):
+            if isRunStart and length >= blocksPerProducer and (allowed is None or self.producers[start] in allowed):
+                return self.firstBlockNum + start
+        return None
+
+    def waitForCleanRoundStart(self, producers=None, maxBlocks=None, blocksPerProducer=BlocksPerProducer, timeout=None):
+        """Same as cleanRoundStart, over the whole timeline, extending it by up to maxBlocks (default 2 rounds of
+        21 producers) until such a run is found."""
+        if maxBlocks is None:
+            maxBlocks=2 * 21 * blocksPerProducer
+        query=lambda: self.cleanRoundStart(producers, blocksPerProducer=blocksPerProducer)
+        return self.__extendUntil(query, self.firstBlockNum + maxBlocks, timeout=timeout)
+
+    def fullRounds(self, numProducers, first=None, last=None, blocksPerProducer=BlocksPerProducer):
+        """List of (first block number, producers) for every round of numProducers distinct producers, each producing
+        exactly blocksPerProducer blocks, that starts cleanly.  Rounds do not overlap."""
+        lo, hi=self.__bounds(first, last)
+        rounds=[]
+        roundStart=None
+        roundProducers=[]
+        for start, length, isRunStart in self.__runsIn(lo, hi):
+            producer=self.producers[start]
+            if not isRunStart or length != blocksPerProducer or producer in roundProducers:
+                roundProducers=[]
+                if not isRunStart or length != blocksPerProducer:
+                    continue
+            if not roundProducers:
+                roundStart=start
+            roundProducers.append(producer)
+            if len(roundProducers) == numProducers:
+                rounds.append((self.firstBlockNum + roundStart, [Utils.uint64ToName(value) for value in roundProducers]))
+                roundProducers=[]
+        return rounds
+
+    def missedSlots(self, first=None, last=None):
+        """List of (block number, missed slot count) for every block that was not produced in the slot right after
+        the one of the block before it."""
+        lo, hi=self.__bounds(first, last)
+        slots=self.slots
+        return [(self.firstBlockNum + i, slots[i] - slots[i - 1] - 1) for i in range(max(lo, 1), hi) if slots[i] - slots[i - 1] > 1]
+
+    def repeatProducerViolations(self, first=None, last=None, blocksPerProducer=BlocksPerProducer):
+        """List of (block number, producer, description) for every producer that produced more than
+        blocksPerProducer blocks in one turn, i.e. still held the slot where the next producer's set should start."""
+        lo, hi=self.__bounds(first, last)
+        violations=[]
+        for start, length, _ in self.__runsIn(lo, hi):
+            if length > blocksPerProducer:
+                violations.append((self.firstBlockNum + start + blocksPerProducer, Utils.uint64ToName(self.producers[start]),
+                                   "produced %d consecutive blocks, starting at block %d" % (length, self.firstBlockNum + start)))
+        return violations
+
+    def earlyTurnViolations(self, numProducers, first=None, last=None):
+        """List of (block number, producer, description) for every producer that got another turn before the other
+        numProducers-1 producers had one."""
+        lo, hi=self.__bounds(first, last)
+        violations=[]
+        lastTurn={}
+        for turn, (start, _, _) in enumerate(self.__runsIn(lo, hi)):
+            producer=self.producers[start]
+            if producer in lastTurn and turn - lastTurn[producer] < numProducers:
+                violations.append((self.firstBlockNum + start, Utils.uint64ToName(producer), "produced again after only %d other producers" % (turn - lastTurn[producer] - 1)))
+            lastTurn[producer]=turn
+        return violations
+
+    def describe(self, first=None, last=None):
+        """blockNum:producer listing of a range of the timeline, for error reports."""
+        lo, hi=self.__bounds(first, last)
+        return "  ".join("%d:%s" % (self.firstBlockNum + i, Utils.uint64ToName(self.producers[i])) for i in range(lo, hi))
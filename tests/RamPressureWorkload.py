@@ -0,0 +1,185 @@
+import concurrent.futures
+import struct
+import time
+
+from testUtils import Utils
+from TransactionSigner import PrivateKey
+from TransactionSigner import signatureDigest
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import nonceAction
+from TransactionCorpus import packAction
+from TransactionCorpus import packName
+from TransactionCorpus import packTransaction
+
+###############################################################
+# RamPressureWorkload
+#  Fills the chain state (chainbase) of nodes with integration_test::store actions at a controlled byte rate and
+#  stops at a threshold of used or free chainbase memory, as db_size_api_plugin reports it.
+#
+#  Every interval the db_size of every node is sampled, the bytes still allowed before the nearest node reaches the
+#  threshold are computed and about bytesPerSecond * interval of store actions are pushed, packed actionsPerTransaction
+#  to a transaction signed by one of the accounts (every store adds 5 rows of storeNum uint64 to the table scope of
+#  its account).  The bytes an action adds start as an estimate and are refined from the measured growth of the
+#  first node.  Close to the threshold the step is limited to half the remaining bytes and the pushed transactions
+#  are waited for in a block on every node before the next sample, so the threshold is approached without crossing
+#  it by more than one action.
+#
+#  The integration_test contract looks up the next free key of a scope row by row, many accounts and a large storeNum
+#  keep its cpu time low.
+###############################################################
+
+class RamPressureWorkload(object):
+    DefaultActionsPerTransaction=20
+    DefaultBytesPerSecond=1 << 20
+    DefaultIntervalSeconds=0.5
+    DefaultWorkers=8
+    RowsPerStore=5
+    # chainbase key_value_object and index overhead of a row, only for the first estimate
+    RowOverheadBytes=256
+    MaxConsecutiveFailedIntervals=3
+
+    # why run() stopped
+    Threshold="threshold"
+    NodeDown="node down"
+    Failures="failures"
+    Timeout="timeout"
+
+    def __init__(self, nodes, contract, accounts, storeNum=1000, actionsPerTransaction=DefaultActionsPerTransaction, bytesPerSecond=DefaultBytesPerSecond,
+                 intervalSeconds=DefaultIntervalSeconds, workers=DefaultWorkers):
+        """nodes: the nodes to sample, the transactions are pushed to them round-robin (all need db_size_api_plugin).
+        contract: account running integration_test.
+        accounts: Accounts pushing the store actions, need activePrivateKey."""
+        assert(len(nodes) > 0)
+        assert(len(accounts) > 0)
+        self.nodes=nodes
+        self.contract=contract
+        self.accountNames=[account.name for account in accounts]
+        self.keys=[PrivateKey.fromString(account.activePrivateKey) for account in accounts]
+        self.storeNum=storeNum
+        self.actionsPerTransaction=actionsPerTransaction
+        self.bytesPerSecond=bytesPerSecond
+        self.intervalSeconds=intervalSeconds
+        self.workers=workers
+        self.bytesPerAction=RamPressureWorkload.RowsPerStore * (8 * storeNum + RamPressureWorkload.RowOverheadBytes)
+        # (seconds since the start of run, node index, used bytes, free bytes)
+        self.samples=[]
+        self.pushedTransactions=0
+        self.acceptedTransactions=0
+        self.acceptedActions=0
+        self.__index=0
+        self.__start=None
+
+    def __transaction(self, tapos, actions):
+        """push_transaction payload of actions store actions of the next account, unique by a context free nonce."""
+        accountIndex=self.__index % len(self.accountNames)
+        name=self.accountNames[accountIndex]
+        action=packAction(self.contract, "store", [(name, "active")], packName(name) + packName(name) + struct.pack("<Q", self.storeNum))
+        packedTrx=packTransaction(tapos["expiration"], tapos["refBlockNum"], tapos["refBlockPrefix"], [action] * actions, [nonceAction(self.__index)])
+        self.__index+=1
+        signature=self.keys[accountIndex].sign(signatureDigest(tapos["chainId"], packedTrx))
+        return '{"signatures":["%s"],"compression":"none","packed_context_free_data":"","packed_trx":"%s"}' % (signature, packedTrx.hex())
+
+    def sample(self):
+        """db_size of every node, None for a node that does not answer, appended to samples."""
+        elapsed=time.perf_counter() - self.__start if self.__start is not None else 0
+        sizes=[node.getDbSize(timeout=5) for node in self.nodes]
+        for nodeIndex, size in enumerate(sizes):
+            if size is not None:
+                self.samples.append((elapsed, nodeIndex, size["used_bytes"], size["free_bytes"]))
+        return sizes
+
+    @staticmethod
+    def remainingBytes(sizes, stopUsedBytes, stopFreeBytes):
+        """Bytes that can still be added before the first node reaches a threshold, None without thresholds."""
+        remaining=[]
+        for size in sizes:
+            if stopUsedBytes is not None:
+                remaining.append(stopUsedBytes - size["used_bytes"])
+            if stopFreeBytes is not None:
+                remaining.append(size["free_bytes"] - stopFreeBytes)
+        return min(remaining) if len(remaining) > 0 else None
+
+    def __push(self, nodeIndex, payload):
+        return self.nodes[nodeIndex].processUrllibRequest("chain", "push_transaction", payload, silentErrors=True, timeout=10) is not None
+
+    def __waitForBlocks(self):
+        """Wait until every node has the head the first node has now, so the next sample includes the pushed actions."""
+        headBlockNum=self.nodes[0].getHeadBlockNum()
+        for node in self.nodes:
+            node.waitForBlock(headBlockNum, timeout=10)
+
+    def run(self, stopUsedBytes=None, stopFreeBytes=None, timeout=600):
+        """Push store actions until a node has stopUsedBytes used or only stopFreeBytes free chainbase memory, a node
+        stops answering, MaxConsecutiveFailedIntervals intervals in a row had no transaction accepted or timeout
+        seconds passed. Returns results()."""
+        self.__start=time.perf_counter()
+        startSizes=self.sample()
+        if any(size is None for size in startSizes):
+            Utils.Print("ERROR: db_size not available on all nodes, is db_size_api_plugin loaded?")
+            return self.results(RamPressureWorkload.NodeDown, startSizes, startSizes)
+        tapos=TransactionCorpus.taposFromNode(self.nodes[0])
+        startAccepted=self.acceptedActions
+        failedIntervals=0
+        sizes=startSizes
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                intervalStart=time.perf_counter()
+                if intervalStart - self.__start >= timeout:
+                    reason=RamPressureWorkload.Timeout
+                    break
+                accepted=self.acceptedActions - startAccepted
+                grown=sizes[0]["used_bytes"] - startSizes[0]["used_bytes"]
+                if accepted >= self.actionsPerTransaction and grown > 0:
+                    self.bytesPerAction=grown / accepted
+                remaining=RamPressureWorkload.remainingBytes(sizes, stopUsedBytes, stopFreeBytes)
+                if remaining is not None and remaining < self.bytesPerAction:
+                    reason=RamPressureWorkload.Threshold
+                    break
+                budget=self.bytesPerSecond * self.intervalSeconds
+                approaching=remaining is not None and remaining / 2 < budget
+                if approaching:
+                    budget=remaining / 2
+                actions=max(1, int(budget / self.bytesPerAction))
+
+                if TransactionCorpus.MaxTransactionLifetime - (tapos["expiration"] - time.time()) > 60:
+                    tapos=TransactionCorpus.taposFromNode(self.nodes[0])
+                counts=[min(self.actionsPerTransaction, actions - first) for first in range(0, actions, self.actionsPerTransaction)]
+                payloads=[(count, self.__transaction(tapos, count)) for count in counts]
+                futures=[executor.submit(self.__push, (self.pushedTransactions + i) % len(self.nodes), payload) for i, (_, payload) in enumerate(payloads)]
+                results=[future.result() for future in futures]
+                self.pushedTransactions+=len(results)
+                self.acceptedTransactions+=results.count(True)
+                self.acceptedActions+=sum(count for (count, _), result in zip(payloads, results) if result)
+                failedIntervals=failedIntervals + 1 if not any(results) else 0
+                if failedIntervals >= RamPressureWorkload.MaxConsecutiveFailedIntervals:
+                    reason=RamPressureWorkload.Failures
+                    break
+
+                if approaching:
+                    self.__waitForBlocks()
+                else:
+                    time.sleep(max(0, self.intervalSeconds - (time.perf_counter() - intervalStart)))
+                newSizes=self.sample()
+                if any(size is None for size in newSizes):
+                    reason=RamPressureWorkload.NodeDown
+                    break
+                sizes=newSizes
+                if Utils.Debug: Utils.Print("Pushed %d store actions, used %s, remaining %s bytes" %
+                                            (actions, [size["used_bytes"] for size in sizes], RamPressureWorkload.remainingBytes(sizes, stopUsedBytes, stopFreeBytes)))
+        return self.results(reason, startSizes, sizes)
+
+    def results(self, reason, startSizes, endSizes):
+        seconds=time.perf_counter() - self.__start
+        grown=endSizes[0]["used_bytes"] - startSizes[0]["used_bytes"] if startSizes[0] is not None and endSizes[0] is not None else None
+        return {
+            "reason": reason,
+            "seconds": seconds,
+            "pushedTransactions": self.pushedTransactions,
+            "acceptedTransactions": self.acceptedTransactions,
+            "acceptedActions": self.acceptedActions,
+            "bytesPerAction": self.bytesPerAction,
+            "bytesPerSecond": grown / seconds if grown is not None and seconds > 0 else None,
+            "startUsedBytes": [size["used_bytes"] if size is not None else None for size in startSizes],
+            "endUsedBytes": [size["used_bytes"] if size is not None else None for size in endSizes],
+            "endFreeBytes": [size["free_bytes"] if size is not None else None for size in endSizes]
+        }
@@ -0,0 +1,185 @@
+import collections
+import os
+import threading
+import time
+
+from testUtils import Utils
+
+###############################################################
+# ResourceSampler
+#  Operating system resource use of the processes of a test (nodeos instances, keosd), for soak runs that have to
+#  catch leaks and runaway disk use.  A thread reads every interval, per process,
+#    /proc/<pid>/stat    - cpu time (as percent of one core since the previous sample) and thread count
+#    /proc/<pid>/status  - resident memory
+#    /proc/<pid>/io      - bytes read from and written to storage
+#    /proc/<pid>/fd      - open file descriptors
+#  and the allocated size on disk of the blocks directory, state/shared_memory.bin, the state-history and the trace
+#  log directory of a process with a data directory.  The last capacity samples of every metric are kept in ring
+#  buffers, summary() reduces them to peak, mean, last value and the slope (least squares, per hour).
+#
+#  Processes are given by a function returning their current pid, so relaunched nodes keep being sampled and stopped
+#  ones are skipped.  readProcess() is the single reading of a process the thread takes, tests that only need a
+#  reading before and after a run (cpu seconds, peak memory, bytes written) call it directly.
+###############################################################
+
+class ResourceSampler(object):
+    DefaultIntervalSeconds=1.0
+    DefaultCapacity=3600
+    ProcessMetrics=["cpuPercent", "rssKb", "threads", "readBytes", "writeBytes", "fds"]
+    # metric -> path relative to the data directory
+    DiskPaths=collections.OrderedDict([("blocksBytes", "blocks"), ("sharedMemoryBytes", os.path.join("state", "shared_memory.bin")),
+                                       ("stateHistoryBytes", "state-history"), ("tracesBytes", "traces")])
+    ClockTicks=os.sysconf("SC_CLK_TCK")
+
+    def __init__(self, intervalSeconds=DefaultIntervalSeconds, capacity=DefaultCapacity):
+        self.interval=intervalSeconds
+        self.capacity=capacity
+        # name -> (pidFunc, dataDir)
+        self.processes=collections.OrderedDict()
+        # name -> metric -> deque of (seconds since start, value)
+        self.series=collections.OrderedDict()
+        self.__cpuSeconds={}
+        self.__lock=threading.Lock()
+        self.__thread=None
+        self.__stopEvent=threading.Event()
+        self.__start=None
+
+    def addProcess(self, name, pidFunc, dataDir=None):
+        """pidFunc: returns the pid of the process, None while it is not running. dataDir: data directory of a nodeos,
+        for the disk sizes."""
+        with self.__lock:
+            self.processes[name]=(pidFunc, dataDir)
+            metrics=ResourceSampler.ProcessMetrics + (list(ResourceSampler.DiskPaths) if dataDir is not None else [])
+            self.series[name]=collections.OrderedDict((metric, collections.deque(maxlen=self.capacity)) for metric in metrics)
+
+    @staticmethod
+    def allocatedBytes(path):
+        """Bytes allocated on disk for a file or a directory tree (sparse files count what is allocated), None if it
+        does not exist."""
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return os.stat(path).st_blocks * 512
+        total=0
+        for root, _, fileNames in os.walk(path):
+            for fileName in fileNames:
+                try:
+                    total+=os.lstat(os.path.join(root, fileName)).st_blocks * 512
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def readProcess(pid):
+        """One reading of process pid from /proc: cpuSeconds (user and system time so far), rssKb, threads, fds and,
+        if /proc/<pid>/io is readable, readBytes and writeBytes. None if the process is gone."""
+        try:
+            with open("/proc/%d/stat" % (pid)) as f:
+                # the fields after the command name, which may contain blanks
+                fields=f.read().rsplit(")", 1)[1].split()
+            with open("/proc/%d/status" % (pid)) as f:
+                rss=next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+            fds=len(os.listdir("/proc/%d/fd" % (pid)))
+        except (OSError, ValueError, IndexError):
+            return None
+        # utime and stime are the 14th and 15th fields, counted from the state field (3rd) after the command name
+        usage={"cpuSeconds": (int(fields[11]) + int(fields[12])) / ResourceSampler.ClockTicks, "rssKb": rss, "threads": int(fields[17]), "fds": fds}
+        try:
+            with open("/proc/%d/io" % (pid)) as f:
+                for line in f:
+                    key, _, value=line.partition(":")
+                    if key == "read_bytes":
+                        usage["readBytes"]=int(value)
+                    elif key == "write_bytes":
+                        usage["writeBytes"]=int(value)
+        except (OSError, ValueError):
+            # /proc/<pid>/io needs ptrace access
+            pass
+        return usage
+
+    def __readProcess(self, name, pid, elapsed):
+        """Metrics of process pid, None if it is gone."""
+        usage=ResourceSampler.readProcess(pid)
+        if usage is None:
+            return None
+        cpuSeconds=usage.pop("cpuSeconds")
+        previous=self.__cpuSeconds.get(name)
+        self.__cpuSeconds[name]=(pid, elapsed, cpuSeconds)
+        usage["cpuPercent"]=None
+        if previous is not None and previous[0] == pid and elapsed > previous[1]:
+            usage["cpuPercent"]=(cpuSeconds - previous[2]) / (elapsed - previous[1]) * 100
+        return usage
+
+    def sample(self):
+        with self.__lock:
+            if self.__start is None:
+                self.__start=time.perf_counter()
+            elapsed=time.perf_counter() - self.__start
+            for name, (pidFunc, dataDir) in self.processes.items():
+                series=self.series[name]
+                pid=pidFunc()
+                metrics=self.__readProcess(name, pid, elapsed) if pid is not None else None
+                if metrics is not None:
+                    for metric, value in metrics.items():
+                        if value is not None:
+                            series[metric].append((elapsed, value))
+                if dataDir is not None:
+                    for metric, relative in ResourceSampler.DiskPaths.items():
+                        size=ResourceSampler.allocatedBytes(os.path.join(dataDir, relative))
+                        if size is not None:
+                            series[metric].append((elapsed, size))
+
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            self.sample()
+            self.__stopEvent.wait(self.interval)
+
+    def start(self):
+        assert(self.__thread is None)
+        self.__thread=threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stopEvent.set()
+            self.__thread.join()
+            self.__thread=None
+
+    @staticmethod
+    def slope(points):
+        """Least squares slope of (seconds, value) points, per hour. None for fewer than 2 points or no time span."""
+        if len(points) < 2:
+            return None
+        meanTime=sum(t for t, _ in points) / len(points)
+        meanValue=sum(value for _, value in points) / len(points)
+        variance=sum((t - meanTime) ** 2 for t, _ in points)
+        if variance == 0:
+            return None
+        return sum((t - meanTime) * (value - meanValue) for t, value in points) / variance * 3600
+
+    def summary(self):
+        """name -> metric -> peak, mean, last and slopePerHour of the samples in the ring buffers."""
+        with self.__lock:
+            summary=collections.OrderedDict()
+            for name, series in self.series.items():
+                summary[name]=collections.OrderedDict()
+                for metric, points in series.items():
+                    if len(points) == 0:
+                        continue
+                    values=[value for _, value in points]
+                    summary[name][metric]={
+                        "samples": len(values),
+                        "peak": max(values),
+                        "mean": sum(values) / len(values),
+                        "last": values[-1],
+                        "slopePerHour": ResourceSampler.slope(points)
+                    }
+            return summary
+
+    def printSummary(self):
+        Utils.Print("Resource use (peak / mean / last / slope per hour) of the last %d samples every %g sec" % (self.capacity, self.interval))
+        for name, metrics in self.summary().items():
+            Utils.Print("  %s" % (name))
+            for metric, entry in metrics.items():
+                slope="%.1f" % (entry["slopePerHour"]) if entry["slopePerHour"] is not None else "n/a"
+                Utils.Print("    %-18s %16.1f %16.1f %16.1f %16s  (%d samples)" % (metric, entry["peak"], entry["mean"], entry["last"], slope, entry["samples"]))
@@ -90,7 +90,10 @@ class TestHelper(object):
             parser.add_argument("--mongodb", help="Configure a MongoDb instance", action='store_true')
         if "--dump-error-details" in includeArgs:
             parser.add_argument("--dump-error-details",
-                                     help="Upon error print etc/eosio/node_*/config.ini and var/lib/node_*/stderr.log to stdout",
+                                     help="Upon error print a triage of var/lib/node_*/stderr.log to stdout and bundle the logs and configs in var/lib",
+                                     action='store_true')
+            parser.add_argument("--full-error-details",
+                                     help="With --dump-error-details print etc/eosio/node_*/config.ini and var/lib/node_*/stderr.log to stdout in full",
                                      action='store_true')
         if "--dont-launch" in includeArgs:
             parser.add_argument("--dont-launch", help="Don't launch own node. Assume node is already running.",
@@ -115,6 +118,7 @@ class TestHelper(object):
             parser.add_argument(arg.flag, type=arg.type, help=arg.help, choices=arg.choices, default=arg.default)
 
         args = parser.parse_args()
+        Utils.FullErrorDetails=getattr(args, "full_error_details", False)
         return args
 
     @staticmethod
@@ -166,9 +170,23 @@ class TestHelper(object):
                     Utils.Print("cerr={%s}\n" % (err))
                 Utils.Print("== cmd/cout/cerr pairs done. ==")
 
+        if len(cluster.dbSizeSamplers) > 0:
+            Utils.Print(Utils.FileDivider)
+            for _, sampler in sorted(cluster.stopDbSizeSampling().items()):
+                sampler.printSummary()
+        if cluster.resourceSampler is not None:
+            Utils.Print(Utils.FileDivider)
+            cluster.stopResourceSampling().printSummary()
+        if len(cluster.nodeLogs) > 0:
+            Utils.Print(Utils.FileDivider)
+            for _, nodeLog in sorted(cluster.nodeLogs.items()):
+                nodeLog.printSummary()
+
         if killEosInstances:
             Utils.Print("Shut down the cluster.")
             cluster.killall(allInstances=cleanRun)
+            # the readers of piped logs end with their nodes
+            cluster.stopLogPipelines()
             if testSuccessful and not keepLogs:
                 Utils.Print("Cleanup cluster data.")
                 cluster.cleanup()
@@ -0,0 +1,234 @@
+import concurrent.futures
+import datetime
+import threading
+import time
+
+from testUtils import Utils
+from ProductionTimeline import ProductionTimeline
+
+###############################################################
+# TpsSaturationFinder
+#  Drives the txn_test_gen_plugin of a set of generator nodes through a ladder of transaction rates and then binary
+#  searches between the highest sustainable and the lowest unsustainable step.  Every probe starts generation at the
+#  rate, lets it settle for warmupBlocks, and measures measureBlocks blocks of the producing node:
+#    transactions per block and included transactions per second
+#    cpu_usage_us and net_usage_words of the transaction receipts per block
+#    missed slots (gaps between consecutive block timestamps) and how far the head block time lags the wall clock
+#    whether a generator stopped itself, which the plugin does when a push fails (e.g. an expired transaction)
+#  A rate is sustainable when no slot is missed, no generator stopped, the head lag stays under maxHeadLag and at
+#  least minInclusion of the offered transactions made it into blocks.  The probes of a run form the saturation curve.
+###############################################################
+
+class TpsSaturationFinder(object):
+    # txn_test_gen_plugin start_generation limits
+    MinPeriod=1
+    MaxPeriod=2500
+    MaxBatchSize=250
+    TargetPeriod=100
+    BlockInterval=0.5
+    DefaultFetchThreads=8
+    Percents=(50, 90, 99)
+    UnixEpoch=datetime.datetime(1970, 1, 1)
+
+    def __init__(self, producerNode, genNodes, label=None, warmupBlocks=10, measureBlocks=30, maxSettleBlocks=60,
+                 minInclusion=0.95, maxHeadLag=1.5, maxMissedSlots=0, fetchThreads=DefaultFetchThreads):
+        """producerNode: node whose blocks are measured.
+        genNodes: nodes running txn_test_gen_plugin, their test accounts already created (txnGenCreateTestAccounts).
+        label: description of the cluster configuration, reported with the curve."""
+        assert(len(genNodes) > 0)
+        self.producerNode=producerNode
+        self.genNodes=genNodes
+        self.label=label
+        self.warmupBlocks=warmupBlocks
+        self.measureBlocks=measureBlocks
+        self.maxSettleBlocks=maxSettleBlocks
+        self.minInclusion=minInclusion
+        self.maxHeadLag=maxHeadLag
+        self.maxMissedSlots=maxMissedSlots
+        self.fetchThreads=fetchThreads
+        self.probes=[]
+
+    @staticmethod
+    def generatorSettings(tps):
+        """(period in ms, batch size) making one txn_test_gen_plugin generate about tps transactions per second. The
+        plugin takes a period of 1 to 2500 ms and an even batch size of 2 to 250."""
+        assert(tps > 0)
+        batchSize=int(round(tps * TpsSaturationFinder.TargetPeriod / 1000.0 / 2)) * 2
+        batchSize=max(2, min(TpsSaturationFinder.MaxBatchSize, batchSize))
+        period=int(round(batchSize * 1000.0 / tps))
+        period=max(TpsSaturationFinder.MinPeriod, min(TpsSaturationFinder.MaxPeriod, period))
+        return period, batchSize
+
+    def offeredTps(self, tps):
+        """The rate the generator nodes actually produce when asked for tps in total."""
+        period, batchSize=TpsSaturationFinder.generatorSettings(tps / len(self.genNodes))
+        return batchSize * 1000.0 / period * len(self.genNodes)
+
+    @staticmethod
+    def __generatorStopped(result):
+        return result is None or (isinstance(result, dict) and "error" in result)
+
+    def __startGenerators(self, tps, probeIndex):
+        period, batchSize=TpsSaturationFinder.generatorSettings(tps / len(self.genNodes))
+        for genIndex, node in enumerate(self.genNodes):
+            salt="%d-%d" % (probeIndex, genIndex)
+            result=node.txnGenStart(salt, period, batchSize)
+            if result != "success":
+                Utils.errorExit("Failed to start transaction generation on %s with period %d and batch size %d: %s" % (node.endpointHttp, period, batchSize, result))
+
+    def __stopGenerators(self):
+        """Stops all generators, returns the number that had already stopped themselves."""
+        return sum(1 for node in self.genNodes if TpsSaturationFinder.__generatorStopped(node.txnGenStop()))
+
+    def __sampleHeadLag(self, samples, stopEvent):
+        while not stopEvent.is_set():
+            info=self.producerNode.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=1)
+            now=time.time()
+            if info is not None:
+                headTime=info["head_block_time"]
+                if "." not in headTime:
+                    headTime+=".000"
+                samples.append(now - (datetime.datetime.strptime(headTime, Utils.TimeFmt) - TpsSaturationFinder.UnixEpoch).total_seconds())
+            stopEvent.wait(TpsSaturationFinder.BlockInterval / 2)
+
+    def __fetchBlocks(self, first, last):
+        fetch=lambda blockNum: self.producerNode.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, exitOnError=True)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.fetchThreads) as executor:
+            return list(executor.map(fetch, range(first, last + 1)))
+
+    def __waitForBlock(self, blockNum):
+        if not self.producerNode.waitForBlock(blockNum, timeout=(blockNum - self.producerNode.getHeadBlockNum()) * TpsSaturationFinder.BlockInterval + 30):
+            Utils.errorExit("Producer node did not advance to block %d while measuring transaction throughput" % (blockNum))
+
+    def __settle(self):
+        """Wait for blocks to empty out again (queued transactions are included or expire), so probes do not overlap."""
+        blockNum=self.producerNode.getHeadBlockNum()
+        for _ in range(self.maxSettleBlocks):
+            self.__waitForBlock(blockNum)
+            blockNum+=1
+            block=self.producerNode.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, silentErrors=True)
+            if block is not None and len(block["transactions"]) == 0:
+                return True
+        Utils.Print("WARNING: blocks still contain transactions %d blocks after generation stopped" % (self.maxSettleBlocks))
+        return False
+
+    def probe(self, tps):
+        """Generate about tps transactions per second in total and measure the producer node, returns the probe results."""
+        probeIndex=len(self.probes)
+        offered=self.offeredTps(tps)
+        Utils.Print("Probing %.1f tps (%.1f requested) over %d generator node(s)" % (offered, tps, len(self.genNodes)))
+        self.__startGenerators(tps, probeIndex)
+        self.__waitForBlock(self.producerNode.getHeadBlockNum() + self.warmupBlocks)
+
+        lagSamples=[]
+        stopEvent=threading.Event()
+        sampler=threading.Thread(target=self.__sampleHeadLag, args=(lagSamples, stopEvent), daemon=True)
+        first=self.producerNode.getHeadBlockNum() + 1
+        last=first + self.measureBlocks - 1
+        sampler.start()
+        self.__waitForBlock(last)
+        stopEvent.set()
+        sampler.join()
+        stoppedGenerators=self.__stopGenerators()
+
+        blocks=self.__fetchBlocks(first, last)
+        slots=[ProductionTimeline.timestampToSlot(block["timestamp"]) for block in blocks]
+        missedSlots=sum(slots[i] - slots[i - 1] - 1 for i in range(1, len(slots)))
+        trxCounts=[len(block["transactions"]) for block in blocks]
+        cpuUsage=[sum(trx["cpu_usage_us"] for trx in block["transactions"]) for block in blocks]
+        netUsage=[sum(trx["net_usage_words"] for trx in block["transactions"]) for block in blocks]
+        # the first block's slot also covers the time before it, so the window spans slots first-1 .. last
+        window=(slots[-1] - slots[0] + 1) * TpsSaturationFinder.BlockInterval
+        includedTps=sum(trxCounts) / window
+        headLag=Utils.percentiles(lagSamples, TpsSaturationFinder.Percents)
+        self.__settle()
+
+        reasons=[]
+        if missedSlots > self.maxMissedSlots:
+            reasons.append("%d missed slot(s)" % (missedSlots))
+        if stoppedGenerators > 0:
+            reasons.append("%d generator(s) stopped on a failed push" % (stoppedGenerators))
+        if headLag is not None and headLag[90] > self.maxHeadLag:
+            reasons.append("p90 head lag %.2fs" % (headLag[90]))
+        if includedTps < offered * self.minInclusion:
+            reasons.append("only %.0f%% of offered transactions included" % (includedTps / offered * 100))
+
+        result={
+            "requestedTps": tps,
+            "offeredTps": offered,
+            "includedTps": includedTps,
+            "firstBlock": first,
+            "lastBlock": last,
+            "trxPerBlock": Utils.percentiles(trxCounts, TpsSaturationFinder.Percents),
+            "cpuUsPerBlock": Utils.percentiles(cpuUsage, TpsSaturationFinder.Percents),
+            "netWordsPerBlock": Utils.percentiles(netUsage, TpsSaturationFinder.Percents),
+            "missedSlots": missedSlots,
+            "headLag": headLag,
+            "stoppedGenerators": stoppedGenerators,
+            "sustainable": len(reasons) == 0,
+            "reasons": reasons
+        }
+        self.probes.append(result)
+        Utils.Print("  %s" % (TpsSaturationFinder.formatProbe(result)))
+        return result
+
+    def run(self, startTps=100, maxTps=20000, ladderFactor=2.0, resolution=0.05):
+        """Climb from startTps by ladderFactor until a rate is not sustainable (or maxTps is reached), then binary search
+        between the last sustainable and the first unsustainable rate until they are within resolution (a fraction) of
+        each other.  Returns curve()."""
+        assert(ladderFactor > 1)
+        good=None
+        bad=None
+        tps=startTps
+        while tps <= maxTps:
+            if self.probe(tps)["sustainable"]:
+                good=tps
+                tps*=ladderFactor
+            else:
+                bad=tps
+                break
+
+        if bad is not None and good is not None:
+            while (bad - good) / good > resolution:
+                mid=(good + bad) / 2.0
+                if self.offeredTps(mid) in (self.offeredTps(good), self.offeredTps(bad)):
+                    # the generator settings cannot express anything in between
+                    break
+                if self.probe(mid)["sustainable"]:
+                    good=mid
+                else:
+                    bad=mid
+
+        if good is None:
+            Utils.Print("WARNING: %s is not sustainable even at the starting rate of %s tps" % (self.label, startTps))
+        elif bad is None:
+            Utils.Print("WARNING: %s sustained the maximum probed rate of %s tps, saturation is higher" % (self.label, maxTps))
+        return self.curve()
+
+    def curve(self):
+        """The probes so far ordered by offered rate, with the highest sustainable rate."""
+        probes=sorted(self.probes, key=lambda probe: probe["offeredTps"])
+        sustainable=[probe for probe in probes if probe["sustainable"]]
+        best=max(sustainable, key=lambda probe: probe["offeredTps"]) if len(sustainable) > 0 else None
+        return {
+            "config": self.label,
+            "generatorNodes": len(self.genNodes),
+            "saturationTps": best["offeredTps"] if best is not None else None,
+            "saturationIncludedTps": best["includedTps"] if best is not None else None,
+            "probes": probes
+        }
+
+    @staticmethod
+    def formatProbe(probe):
+        lag=probe["headLag"]
+        return "offered %8.1f tps, included %8.1f tps, trx/block p50=%d max=%d, cpu us/block p50=%d max=%d, net words/block p50=%d, missed slots %d, head lag p90=%s: %s" % (
+            probe["offeredTps"], probe["includedTps"], probe["trxPerBlock"][50], probe["trxPerBlock"]["max"], probe["cpuUsPerBlock"][50],
+            probe["cpuUsPerBlock"]["max"], probe["netWordsPerBlock"][50], probe["missedSlots"], "%.2fs" % (lag[90]) if lag is not None else "n/a",
+            "sustainable" if probe["sustainable"] else ", ".join(probe["reasons"]))
+
+    @staticmethod
+    def printCurve(curve):
+        Utils.Print("Saturation curve for %s (%d generator node(s)), highest sustainable rate: %s" % (curve["config"], curve["generatorNodes"],
+                    "%.1f tps" % (curve["saturationTps"]) if curve["saturationTps"] is not None else "none"))
+        for probe in curve["probes"]:
+            Utils.Print("  %s" % (TpsSaturationFinder.formatProbe(probe)))
@@ -0,0 +1,274 @@
+import array
+import concurrent.futures
+import datetime
+import json
+import mmap
+import os
+import struct
+import time
+
+from core_symbol import CORE_SYMBOL
+from testUtils import Utils
+from TransactionSigner import PrivateKey
+from TransactionSigner import signatureDigest
+from LoadGenerator import LoadGenerator
+
+###############################################################
+# TransactionCorpus
+#  Pre-signed transactions for repeatable load runs.  generate() serializes and signs transactions for a chain id and
+#  a set of accounts across a process pool and writes them to <path>, a small json header followed by records of
+#  a uint32 length and the ready to post push_transaction body, and to <path>.idx, the uint64 offsets of the records.
+#  A TransactionCorpus mmaps the file and hands out the bodies as bytes, so a replay through LoadGenerator does no
+#  per transaction serialization or signing.
+#
+#  The transactions reference (TaPoS) the head block at generation time and expire at most
+#  MaxTransactionLifetime after it, the corpus has to be replayed on the same chain within that window.
+###############################################################
+
+def packVarUint32(value):
+    out=bytearray()
+    while True:
+        byte=value & 0x7f
+        value>>=7
+        if value > 0:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def packName(name):
+    return struct.pack("<Q", Utils.nameToUint64(name))
+
+def packString(text):
+    data=text.encode("utf-8")
+    return packVarUint32(len(data)) + data
+
+def packAsset(amount, symbol=CORE_SYMBOL, precision=4):
+    """amount in the smallest unit of the symbol, i.e. 1.0000 SYS is 10000."""
+    return struct.pack("<q", amount) + bytes([precision]) + symbol.encode("ascii").ljust(7, b"\0")
+
+def packAction(account, name, authorization, data):
+    """authorization: list of (actor, permission) pairs. data: the serialized action data."""
+    packed=packName(account) + packName(name) + packVarUint32(len(authorization))
+    for actor, permission in authorization:
+        packed+=packName(actor) + packName(permission)
+    return packed + packVarUint32(len(data)) + data
+
+def packTransaction(expiration, refBlockNum, refBlockPrefix, actions, contextFreeActions=[], delaySec=0):
+    """expiration: seconds since the epoch. actions, contextFreeActions: lists of packed actions. delaySec: delay of a
+    deferred (delayed) transaction."""
+    packed=struct.pack("<IHI", expiration, refBlockNum & 0xffff, refBlockPrefix)
+    # max_net_usage_words and max_cpu_usage_ms left at 0
+    packed+=packVarUint32(0) + b"\0" + packVarUint32(delaySec)
+    packed+=packVarUint32(len(contextFreeActions)) + b"".join(contextFreeActions)
+    packed+=packVarUint32(len(actions)) + b"".join(actions)
+    return packed + packVarUint32(0)
+
+class TransferFactory(object):
+    """eosio.token style transfers between consecutive accounts of the corpus, or from each of them to destination if
+    given, the memo makes every one unique."""
+    def __init__(self, amount=1, symbol=CORE_SYMBOL, precision=4, contract="eosio.token", memoPrefix="corpus", destination=None):
+        self.amount=amount
+        self.symbol=symbol
+        self.precision=precision
+        self.contract=contract
+        self.memoPrefix=memoPrefix
+        self.destination=destination
+
+    def __call__(self, index, accountNames):
+        sourceIndex=index % len(accountNames)
+        source=accountNames[sourceIndex]
+        destination=self.destination if self.destination is not None else accountNames[(sourceIndex + 1) % len(accountNames)]
+        data=packName(source) + packName(destination) + packAsset(self.amount, self.symbol, self.precision) + packString("%s %d" % (self.memoPrefix, index))
+        return sourceIndex, [packAction(self.contract, "transfer", [(source, "active")], data)], []
+
+def nonceAction(nonce):
+    """Context free eosio.null::nonce action, makes otherwise identical transactions unique (as txn_test_gen_plugin does)."""
+    return packAction("eosio.null", "nonce", [], packString(str(nonce)))
+
+class ActionFactory(object):
+    """A custom action, authorized by the active permission of one account of the corpus per transaction.
+    dataFunc(index, accountName) returns the serialized action data, it has to be picklable (a module level function)
+    for the process pool.  Unless the data is unique per index, keep nonce so that a nonceAction is added."""
+    def __init__(self, contract, action, dataFunc, nonce=True):
+        self.contract=contract
+        self.action=action
+        self.dataFunc=dataFunc
+        self.nonce=nonce
+
+    def __call__(self, index, accountNames):
+        accountIndex=index % len(accountNames)
+        actor=accountNames[accountIndex]
+        contextFreeActions=[nonceAction(index)] if self.nonce else []
+        return accountIndex, [packAction(self.contract, self.action, [(actor, "active")], self.dataFunc(index, actor))], contextFreeActions
+
+class DelayedFactory(object):
+    """The transactions of another factory as deferred transactions, executed delaySec after they are accepted.
+    Deferred transactions cannot carry context free actions, the factory must not add a nonce."""
+    def __init__(self, factory, delaySec=1):
+        self.factory=factory
+        self.delaySec=delaySec
+
+    def __call__(self, index, accountNames):
+        signerIndex, actions, contextFreeActions=self.factory(index, accountNames)[:3]
+        assert len(contextFreeActions) == 0, "deferred transactions cannot have context free actions"
+        return signerIndex, actions, contextFreeActions, self.delaySec
+
+class MixFactory(object):
+    """Interleaves the transactions of several factories by weight, e.g. [(TransferFactory(), 8), (storeFactory, 2)]
+    makes 8 transfers and 2 stores out of every 10 consecutive transactions.  Every factory is called with the
+    corpus wide index, so indexes stay unique."""
+    def __init__(self, components):
+        assert(len(components) > 0)
+        self.factories=[factory for factory, _ in components]
+        self.table=[position for position, (_, weight) in enumerate(components) for _ in range(weight)]
+        assert len(self.table) > 0, "all weights are 0"
+
+    def __call__(self, index, accountNames):
+        return self.factories[self.table[index % len(self.table)]](index, accountNames)
+
+def _generateChunk(chunkPath, first, last, chainId, expiration, refBlockNum, refBlockPrefix, accounts, factory):
+    """Process pool worker, writes the records of transactions [first, last) to chunkPath and returns their lengths."""
+    accountNames=[name for name, _ in accounts]
+    keys=[PrivateKey.fromString(privateKey) for _, privateKey in accounts]
+    lengths=array.array("I")
+    with open(chunkPath, "wb") as f:
+        for index in range(first, last):
+            transaction=factory(index, accountNames)
+            signerIndex, actions, contextFreeActions=transaction[:3]
+            delaySec=transaction[3] if len(transaction) > 3 else 0
+            packedTrx=packTransaction(expiration, refBlockNum, refBlockPrefix, actions, contextFreeActions, delaySec)
+            signature=keys[signerIndex].sign(signatureDigest(chainId, packedTrx))
+            body=('{"signatures":["%s"],"compression":"none","packed_context_free_data":"","packed_trx":"%s"}' % (signature, packedTrx.hex())).encode("ascii")
+            f.write(struct.pack("<I", len(body)))
+            f.write(body)
+            lengths.append(len(body))
+    return lengths.tobytes()
+
+class TransactionCorpus(object):
+    Magic=b"EOSTRXC1"
+    MaxTransactionLifetime=3600
+    DefaultChunkSize=10000
+
+    def __init__(self, path):
+        self.path=path
+        self.__file=open(path, "rb")
+        self.__map=mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic=self.__map[:len(TransactionCorpus.Magic)]
+        assert magic == TransactionCorpus.Magic, "%s is not a transaction corpus" % (path)
+        headerLength=struct.unpack_from("<I", self.__map, len(magic))[0]
+        headerStart=len(magic) + 4
+        self.header=json.loads(self.__map[headerStart:headerStart + headerLength].decode("utf-8"))
+        self.offsets=array.array("Q")
+        with open(TransactionCorpus.indexPath(path), "rb") as f:
+            self.offsets.frombytes(f.read())
+        assert len(self.offsets) == self.header["count"], "index %s does not match %s" % (TransactionCorpus.indexPath(path), path)
+
+    @staticmethod
+    def indexPath(path):
+        return path + ".idx"
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def payload(self, index):
+        offset=self.offsets[index]
+        length=struct.unpack_from("<I", self.__map, offset)[0]
+        return self.__map[offset + 4:offset + 4 + length]
+
+    def payloads(self, first=0, count=None):
+        """Yields the push_transaction bodies of transactions [first, first+count)."""
+        last=len(self.offsets) if count is None else min(len(self.offsets), first + count)
+        data=self.__map
+        unpack=struct.unpack_from
+        for offset in self.offsets[first:last]:
+            length=unpack("<I", data, offset)[0]
+            yield data[offset + 4:offset + 4 + length]
+
+    def secondsUntilExpiration(self):
+        return self.header["expiration"] - time.time()
+
+    def replay(self, nodes, schedule, first=0, workers=LoadGenerator.DefaultWorkers, timeout=LoadGenerator.DefaultTimeout, tracker=None):
+        """Push the corpus, starting at transaction first, to nodes at the rate of schedule (a RateSchedule). Returns
+        the LoadGenerator, run() has been called on it. tracker: optional TransactionLatencyTracker."""
+        remaining=self.secondsUntilExpiration()
+        if remaining < schedule.duration:
+            Utils.Print("WARNING: transaction corpus %s expires in %d sec, before the end of the %s sec replay" % (self.path, remaining, schedule.duration))
+        generator=LoadGenerator(nodes, schedule, self.payloads(first), workers=workers, timeout=timeout, tracker=tracker)
+        generator.run()
+        return generator
+
+    @staticmethod
+    def taposFromNode(node, lifetime=MaxTransactionLifetime):
+        """chainId, expiration, refBlockNum and refBlockPrefix for transactions referencing the head block of node,
+        as generate() takes them."""
+        info=node.getInfo(exitOnError=True)
+        headBlockId=bytes.fromhex(info["head_block_id"])
+        headTime=datetime.datetime.strptime(info["head_block_time"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
+        expiration=int((headTime - datetime.datetime(1970, 1, 1)).total_seconds()) + min(lifetime, TransactionCorpus.MaxTransactionLifetime)
+        return {"chainId": info["chain_id"], "expiration": expiration, "refBlockNum": info["head_block_num"], "refBlockPrefix": struct.unpack_from("<I", headBlockId, 8)[0]}
+
+    @staticmethod
+    def generate(path, tapos, accounts, count, factory=None, workers=None, chunkSize=DefaultChunkSize, firstIndex=0):
+        """Sign count transactions and write them to path and its index.
+        tapos: dictionary of chainId, expiration, refBlockNum and refBlockPrefix, see taposFromNode.
+        accounts: the Accounts authorizing the transactions, need activePrivateKey.
+        factory: picklable callable of (index, accountNames) returning the index of the signing account, and the lists
+                 of packed actions and context free actions of transaction index, optionally followed by the delay_sec
+                 of the transaction, defaults to a TransferFactory.
+        firstIndex: index the factory is called with for the first transaction, corpora generated one after the other
+                    for the same chain continue where the previous one ended to keep transactions unique.
+        Returns the path."""
+        assert(len(accounts) > 0)
+        factory=TransferFactory() if factory is None else factory
+        accountKeys=[(account.name, account.activePrivateKey) for account in accounts]
+        chunks=[(first, min(first + chunkSize, firstIndex + count)) for first in range(firstIndex, firstIndex + count, chunkSize)]
+        chunkPaths=["%s.chunk%d" % (path, i) for i in range(len(chunks))]
+        header={"count": count, "chainId": tapos["chainId"], "expiration": tapos["expiration"], "refBlockNum": tapos["refBlockNum"],
+                "refBlockPrefix": tapos["refBlockPrefix"], "accounts": len(accounts), "factory": type(factory).__name__, "firstIndex": firstIndex}
+
+        start=time.perf_counter()
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures=[executor.submit(_generateChunk, chunkPath, first, last, tapos["chainId"], tapos["expiration"], tapos["refBlockNum"],
+                                         tapos["refBlockPrefix"], accountKeys, factory) for chunkPath, (first, last) in zip(chunkPaths, chunks)]
+                chunkLengths=[future.result() for future in futures]
+
+            offsets=array.array("Q")
+            headerBytes=json.dumps(header).encode("utf-8")
+            with open(path, "wb") as f:
+                f.write(TransactionCorpus.Magic)
+                f.write(struct.pack("<I", len(headerBytes)))
+                f.write(headerBytes)
+                offset=f.tell()
+                for chunkPath, lengthBytes in zip(chunkPaths, chunkLengths):
+                    lengths=array.array("I")
+                    lengths.frombytes(lengthBytes)
+                    for length in lengths:
+                        offsets.append(offset)
+                        offset+=4 + length
+                    with open(chunkPath, "rb") as chunk:
+                        while True:
+                            data=chunk.read(1 << 20)
+                            if not data:
+                                break
+                            f.write(data)
+            with open(TransactionCorpus.indexPath(path), "wb") as f:
+                offsets.tofile(f)
+        finally:
+            for chunkPath in chunkPaths:
+                if os.path.exists(chunkPath):
+                    os.remove(chunkPath)
+
+        Utils.Print("Generated %d signed transactions into %s in %.3f sec" % (count, path, time.perf_counter() - start))
+        return path
@@ -0,0 +1,227 @@
+import collections
+import threading
+import time
+
+from testUtils import Utils
+
+###############################################################
+# TransactionLatencyTracker
+#  Measures how long transactions take from submission to inclusion in a block and to irreversibility.  Submitters
+#  register each transaction id with its submit time (time.perf_counter, like LoadGenerator), submitting node and
+#  optionally action type.  A follower thread scans every new block of one observer node (get_info / get_block over
+#  http) and timestamps the first time a registered transaction shows up in a block and the first time the last
+#  irreversible block passes that block.  Blocks that are forked out take the inclusion of their transactions with
+#  them.  Latencies are wall time as observed by the follower, so they include up to one poll interval.
+###############################################################
+
+class TransactionLatencyTracker(object):
+    DefaultPollInterval=0.05
+    Percents=(50, 90, 99)
+
+    class Entry(object):
+        __slots__=["submitted", "nodeLabel", "actionType", "blockNum", "included", "final"]
+
+        def __init__(self, submitted, nodeLabel, actionType):
+            self.submitted=submitted
+            self.nodeLabel=nodeLabel
+            self.actionType=actionType
+            self.blockNum=None
+            self.included=None
+            self.final=None
+
+    def __init__(self, node, pollInterval=DefaultPollInterval):
+        """node: the node whose blocks are followed."""
+        self.node=node
+        self.pollInterval=pollInterval
+        self.entries={}
+        self.__reversibleBlocks=collections.OrderedDict()  # block num -> (block id, [tracked trx ids])
+        self.__lastBlockNum=None
+        self.__lib=None
+        self.__lock=threading.Lock()
+        self.__stopEvent=threading.Event()
+        self.__thread=None
+
+    def track(self, transId, nodeLabel=None, actionType=None, submitted=None):
+        """Register a submitted transaction. actionType defaults to the account::name of its first action, as seen in
+        the block. submitted defaults to now (time.perf_counter)."""
+        submitted=time.perf_counter() if submitted is None else submitted
+        with self.__lock:
+            if transId not in self.entries:
+                self.entries[transId]=TransactionLatencyTracker.Entry(submitted, nodeLabel, actionType)
+
+    def untrack(self, transId):
+        """Forget a registered transaction, e.g. one the node rejected."""
+        with self.__lock:
+            self.entries.pop(transId, None)
+
+    def trackTransaction(self, trans, nodeLabel=None, actionType=None, submitted=None):
+        """Register a transaction as returned by a cleos push (e.g. Node.transferFunds)."""
+        self.track(trans["transaction_id"], nodeLabel, actionType, submitted)
+
+    def start(self):
+        assert self.__thread is None, "TransactionLatencyTracker already started"
+        info=self.node.processUrllibRequest("chain", "get_info", exitOnError=True)
+        self.__lastBlockNum=info["head_block_num"]
+        self.__lib=info["last_irreversible_block_num"]
+        self.__stopEvent.clear()
+        self.__thread=threading.Thread(target=self.__follow, name="latency-tracker", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopEvent.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread=None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.stop()
+
+    @staticmethod
+    def __actionType(trx):
+        if isinstance(trx["trx"], dict):
+            actions=trx["trx"]["transaction"]["actions"]
+            if len(actions) > 0:
+                return "%s::%s" % (actions[0]["account"], actions[0]["name"])
+        return "deferred"
+
+    def __getBlock(self, blockNum):
+        return self.node.processUrllibRequest("chain", "get_block", {"block_num_or_id": blockNum}, silentErrors=True)
+
+    def __unwind(self, blockNum):
+        """Forget the blocks from blockNum up, their transactions are no longer included."""
+        for num in [num for num in self.__reversibleBlocks if num >= blockNum]:
+            _, transIds=self.__reversibleBlocks.pop(num)
+            for transId in transIds:
+                entry=self.entries.get(transId)
+                if entry is not None:
+                    entry.blockNum=None
+                    entry.included=None
+        self.__lastBlockNum=blockNum - 1
+
+    def __addBlock(self, block, seen):
+        blockNum=block["block_num"]
+        parent=self.__reversibleBlocks.get(blockNum - 1)
+        if parent is not None and parent[0] != block["previous"]:
+            return False
+        transIds=[]
+        for trx in block["transactions"]:
+            transId=trx["trx"]["id"] if isinstance(trx["trx"], dict) else trx["trx"]
+            entry=self.entries.get(transId)
+            if entry is None or entry.included is not None:
+                continue
+            entry.blockNum=blockNum
+            entry.included=seen
+            if entry.actionType is None:
+                entry.actionType=TransactionLatencyTracker.__actionType(trx)
+            transIds.append(transId)
+        self.__reversibleBlocks[blockNum]=(block["id"], transIds)
+        self.__lastBlockNum=blockNum
+        return True
+
+    def __finalize(self, lib, seen):
+        while len(self.__reversibleBlocks) > 0:
+            blockNum=next(iter(self.__reversibleBlocks))
+            if blockNum > lib:
+                break
+            _, transIds=self.__reversibleBlocks.pop(blockNum)
+            for transId in transIds:
+                entry=self.entries.get(transId)
+                if entry is not None:
+                    entry.final=seen
+        self.__lib=lib
+
+    def __follow(self):
+        while not self.__stopEvent.is_set():
+            info=self.node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=max(1, self.pollInterval))
+            if info is not None:
+                headBlockNum=info["head_block_num"]
+                if headBlockNum <= self.__lastBlockNum:
+                    # head moved back or to a sibling, check our latest block is still on the chain
+                    latest=self.__reversibleBlocks.get(headBlockNum)
+                    if latest is not None and latest[0] != info["head_block_id"]:
+                        with self.__lock:
+                            self.__unwind(headBlockNum)
+                blockNum=self.__lastBlockNum + 1
+                while blockNum <= headBlockNum and not self.__stopEvent.is_set():
+                    block=self.__getBlock(blockNum)
+                    if block is None:
+                        break
+                    seen=time.perf_counter()
+                    with self.__lock:
+                        if not self.__addBlock(block, seen):
+                            # forked, step back one block and rescan from there
+                            self.__unwind(blockNum - 1)
+                            blockNum-=1
+                            continue
+                    blockNum+=1
+                with self.__lock:
+                    self.__finalize(info["last_irreversible_block_num"], time.perf_counter())
+            self.__stopEvent.wait(self.pollInterval)
+
+    def pending(self, final=True):
+        """Number of tracked transactions not yet included (or, with final, not yet irreversible)."""
+        with self.__lock:
+            return sum(1 for entry in self.entries.values() if (entry.final if final else entry.included) is None)
+
+    def waitForAll(self, timeout, final=True):
+        """Wait until every tracked transaction is included (or, with final, irreversible). Returns False on timeout."""
+        return Utils.waitForBool(lambda: self.pending(final) == 0, timeout, sleepTime=self.pollInterval)
+
+    @staticmethod
+    def __summarize(latencies):
+        percents=TransactionLatencyTracker.Percents
+        return {
+            "all": Utils.percentiles([latency for _, _, latency in latencies], percents),
+            "byNode": {label: Utils.percentiles(values, percents) for label, values in TransactionLatencyTracker.__groupBy(latencies, 0).items()},
+            "byAction": {actionType: Utils.percentiles(values, percents) for actionType, values in TransactionLatencyTracker.__groupBy(latencies, 1).items()}
+        }
+
+    @staticmethod
+    def __groupBy(latencies, keyIndex):
+        groups={}
+        for latency in latencies:
+            groups.setdefault(latency[keyIndex], []).append(latency[2])
+        return groups
+
+    def results(self):
+        """Latency percentiles in seconds, over all transactions, by submitting node and by action type, and the rate of
+        inclusion (included transactions over the time from the first submit to the last inclusion):
+        toBlock - submit to the first sighting of the transaction in a block (that did not get forked out)
+        toLib   - submit to the first sighting of the last irreversible block at or past that block"""
+        with self.__lock:
+            entries=list(self.entries.values())
+        toBlock=[(entry.nodeLabel, entry.actionType, entry.included - entry.submitted) for entry in entries if entry.included is not None]
+        toLib=[(entry.nodeLabel, entry.actionType, entry.final - entry.submitted) for entry in entries if entry.final is not None]
+        included=[entry for entry in entries if entry.included is not None]
+        span=max(entry.included for entry in included) - min(entry.submitted for entry in included) if len(included) > 0 else 0
+        return {
+            "tracked": len(entries),
+            "included": len(toBlock),
+            "includedPerSecond": len(included) / span if span > 0 else 0,
+            "final": len(toLib),
+            "toBlock": TransactionLatencyTracker.__summarize(toBlock),
+            "toLib": TransactionLatencyTracker.__summarize(toLib)
+        }
+
+    @staticmethod
+    def formatPercentiles(summary):
+        if summary is None:
+            return "no samples"
+        parts=["p%d=%.0fms" % (percent, summary[percent] * 1000) for percent in TransactionLatencyTracker.Percents]
+        return "%s max=%.0fms (n=%d)" % (" ".join(parts), summary["max"] * 1000, summary["count"])
+
+    def printReport(self, results=None):
+        results=self.results() if results is None else results
+        fmt=TransactionLatencyTracker.formatPercentiles
+        Utils.Print("Transaction latency: %d tracked, %d included, %d irreversible" % (results["tracked"], results["included"], results["final"]))
+        for key, desc in (("toBlock", "submit to block"), ("toLib", "submit to LIB")):
+            summary=results[key]
+            Utils.Print("  %s: %s" % (desc, fmt(summary["all"])))
+            for label, percentiles in sorted(summary["byNode"].items(), key=lambda item: str(item[0])):
+                Utils.Print("    node %s: %s" % (label, fmt(percentiles)))
+            for actionType, percentiles in sorted(summary["byAction"].items(), key=lambda item: str(item[0])):
+                Utils.Print("    action %s: %s" % (actionType, fmt(percentiles)))
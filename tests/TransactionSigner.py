@@ -0,0 +1,253 @@
+import hashlib
+import hmac
+import secrets
+import struct
+
+###############################################################
+# TransactionSigner
+#  Pure python secp256k1 signing of eosio transaction digests, so that the harness can produce signed transactions
+#  without a cleos/keosd round trip per transaction.  Only what signing needs is implemented: parsing private keys
+#  (legacy WIF and PVT_K1_), generating new ones, deriving and serializing the EOS public key, and producing canonical,
+#  recoverable SIG_K1_ signatures.
+#  Fixed base multiplication uses precomputed 4 bit windows of the generator, a signature costs a couple of milliseconds.
+#
+#  The digest to sign is sha256(chain_id | packed transaction | sha256(context free data) or 32 zero bytes), see
+#  transaction::sig_digest.
+###############################################################
+
+_P=2**256 - 2**32 - 977
+_N=0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G=(0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798, 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+Base58Alphabet="123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+def base58Encode(data):
+    value=int.from_bytes(data, "big")
+    chars=[]
+    while value > 0:
+        value, rem=divmod(value, 58)
+        chars.append(Base58Alphabet[rem])
+    leadingZeros=len(data) - len(data.lstrip(b"\0"))
+    return "1" * leadingZeros + "".join(reversed(chars))
+
+def base58Decode(text):
+    value=0
+    for c in text:
+        value=value * 58 + Base58Alphabet.index(c)
+    leadingZeros=len(text) - len(text.lstrip("1"))
+    body=value.to_bytes((value.bit_length() + 7) // 8, "big") if value > 0 else b""
+    return b"\0" * leadingZeros + body
+
+def _ripemd160Python(data):
+    # used when the hashlib openssl backend does not provide ripemd160 (OpenSSL 3 moves it to the legacy provider)
+    rl=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,7,4,13,1,10,6,15,3,12,0,9,5,2,14,11,8,3,10,14,4,9,15,8,1,2,7,0,6,13,11,5,12,
+        1,9,11,10,0,8,12,4,13,3,7,15,14,5,6,2,4,0,5,9,7,12,2,10,14,1,3,8,11,6,15,13]
+    rr=[5,14,7,0,9,2,11,4,13,6,15,8,1,10,3,12,6,11,3,7,0,13,5,10,14,15,8,12,4,9,1,2,15,5,1,3,7,14,6,9,11,8,12,2,10,0,4,13,
+        8,6,4,1,3,11,15,0,5,12,2,13,9,7,10,14,12,15,10,4,1,5,8,7,6,2,13,14,0,3,9,11]
+    sl=[11,14,15,12,5,8,7,9,11,13,14,15,6,7,9,8,7,6,8,13,11,9,7,15,7,12,15,9,11,7,13,12,11,13,6,7,14,9,13,15,14,8,13,6,5,12,
+        7,5,11,12,14,15,14,15,9,8,9,14,5,6,8,6,5,12,9,15,5,11,6,8,13,12,5,12,13,14,11,8,5,6]
+    sr=[8,9,9,11,13,15,15,5,7,7,8,11,14,14,12,6,9,13,15,7,12,8,9,11,7,7,12,7,6,15,13,11,9,7,15,11,8,6,6,14,12,13,5,14,13,13,
+        7,5,15,5,8,11,14,14,6,14,6,9,12,9,12,5,15,8,8,5,12,9,12,5,14,6,8,13,6,5,15,13,11,11]
+    kl=[0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+    kr=[0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+    mask=0xffffffff
+    rol=lambda x, n: ((x << n) | (x >> (32 - n))) & mask
+    def f(j, x, y, z):
+        if j < 16: return x ^ y ^ z
+        if j < 32: return (x & y) | (~x & z)
+        if j < 48: return (x | ~y) ^ z
+        if j < 64: return (x & z) | (y & ~z)
+        return x ^ (y | ~z)
+
+    h=[0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+    msg=data + b"\x80" + b"\0" * ((55 - len(data)) % 64) + struct.pack("<Q", 8 * len(data))
+    for offset in range(0, len(msg), 64):
+        x=struct.unpack("<16I", msg[offset:offset + 64])
+        al, bl, cl, dl, el=h
+        ar, br, cr, dr, er=h
+        for j in range(80):
+            t=(rol((al + (f(j, bl, cl, dl) & mask) + x[rl[j]] + kl[j // 16]) & mask, sl[j]) + el) & mask
+            al, el, dl, cl, bl=el, dl, rol(cl, 10), bl, t
+            t=(rol((ar + (f(79 - j, br, cr, dr) & mask) + x[rr[j]] + kr[j // 16]) & mask, sr[j]) + er) & mask
+            ar, er, dr, cr, br=er, dr, rol(cr, 10), br, t
+        h=[(h[1] + cl + dr) & mask, (h[2] + dl + er) & mask, (h[3] + el + ar) & mask, (h[4] + al + br) & mask, (h[0] + bl + cr) & mask]
+    return struct.pack("<5I", *h)
+
+def ripemd160(data):
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        return _ripemd160Python(data)
+
+def _affineAdd(p1, p2):
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    if p1[0] == p2[0]:
+        if (p1[1] + p2[1]) % _P == 0:
+            return None
+        slope=3 * p1[0] * p1[0] * pow(2 * p1[1], _P - 2, _P) % _P
+    else:
+        slope=(p2[1] - p1[1]) * pow(p2[0] - p1[0], _P - 2, _P) % _P
+    x=(slope * slope - p1[0] - p2[0]) % _P
+    return (x, (slope * (p1[0] - x) - p1[1]) % _P)
+
+def _buildWindows():
+    # windows[i][j] = j * 16**i * G, in affine coordinates (None for the point at infinity)
+    windows=[]
+    base=_G
+    for _ in range(64):
+        window=[None]
+        for _ in range(15):
+            window.append(_affineAdd(window[-1], base))
+        windows.append(window)
+        base=_affineAdd(window[-1], base)
+    return windows
+
+_Windows=_buildWindows()
+
+def _multiplyG(k):
+    """k * G in affine coordinates, via jacobian mixed additions of the precomputed windows."""
+    X, Y, Z=0, 1, 0
+    for i in range(64):
+        point=_Windows[i][(k >> (4 * i)) & 0xf]
+        if point is None:
+            continue
+        if Z == 0:
+            X, Y, Z=point[0], point[1], 1
+            continue
+        ZZ=Z * Z % _P
+        H=(point[0] * ZZ - X) % _P
+        R=(point[1] * ZZ * Z - Y) % _P
+        if H == 0:
+            if R != 0:
+                X, Y, Z=0, 1, 0
+                continue
+            # doubling
+            A=X * X % _P
+            B=Y * Y % _P
+            C=B * B % _P
+            D=2 * ((X + B) * (X + B) - A - C) % _P
+            E=3 * A % _P
+            X3=(E * E - 2 * D) % _P
+            X, Y, Z=X3, (E * (D - X3) - 8 * C) % _P, 2 * Y * Z % _P
+            continue
+        HH=H * H % _P
+        HHH=H * HH % _P
+        V=X * HH % _P
+        X3=(R * R - HHH - 2 * V) % _P
+        X, Y, Z=X3, (R * (V - X3) - Y * HHH) % _P, Z * H % _P
+    if Z == 0:
+        return None
+    zInv=pow(Z, _P - 2, _P)
+    zInv2=zInv * zInv % _P
+    return (X * zInv2 % _P, Y * zInv2 * zInv % _P)
+
+def _isCanonical(r, s):
+    return not (r[0] & 0x80) and not (r[0] == 0 and not (r[1] & 0x80)) and not (s[0] & 0x80) and not (s[0] == 0 and not (s[1] & 0x80))
+
+class PrivateKey(object):
+    def __init__(self, secret):
+        assert 0 < secret < _N, "private key out of range"
+        self.secret=secret
+        self.secretBytes=secret.to_bytes(32, "big")
+        self.__publicKey=None
+
+    @staticmethod
+    def fromString(text):
+        """Parse a legacy WIF (5...) or PVT_K1_ private key."""
+        if text.startswith("PVT_K1_"):
+            data=base58Decode(text[len("PVT_K1_"):])
+            key, checksum=data[:-4], data[-4:]
+            if ripemd160(key + b"K1")[:4] != checksum:
+                raise ValueError("Invalid checksum for private key %s" % (text))
+            return PrivateKey(int.from_bytes(key, "big"))
+        data=base58Decode(text)
+        payload, checksum=data[:-4], data[-4:]
+        if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum or payload[0] != 0x80 or len(payload) != 33:
+            raise ValueError("Invalid WIF private key %s" % (text))
+        return PrivateKey(int.from_bytes(payload[1:], "big"))
+
+    @staticmethod
+    def generate():
+        """A new random private key."""
+        return PrivateKey(secrets.randbelow(_N - 1) + 1)
+
+    def toWif(self):
+        """Private key in the legacy WIF (5...) format."""
+        payload=b"\x80" + self.secretBytes
+        return base58Encode(payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4])
+
+    def publicKey(self):
+        """Public key in the legacy EOS... format."""
+        if self.__publicKey is None:
+            x, y=_multiplyG(self.secret)
+            compressed=bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+            self.__publicKey="EOS" + base58Encode(compressed + ripemd160(compressed)[:4])
+        return self.__publicKey
+
+    def __nonce(self, digest, attempt):
+        # RFC 6979 deterministic nonce, with the attempt number as additional data to move on from non canonical signatures
+        extra=attempt.to_bytes(32, "big") if attempt > 0 else b""
+        V=b"\x01" * 32
+        K=b"\x00" * 32
+        K=hmac.new(K, V + b"\x00" + self.secretBytes + digest + extra, hashlib.sha256).digest()
+        V=hmac.new(K, V, hashlib.sha256).digest()
+        K=hmac.new(K, V + b"\x01" + self.secretBytes + digest + extra, hashlib.sha256).digest()
+        V=hmac.new(K, V, hashlib.sha256).digest()
+        while True:
+            V=hmac.new(K, V, hashlib.sha256).digest()
+            k=int.from_bytes(V, "big")
+            if 0 < k < _N:
+                return k
+            K=hmac.new(K, V + b"\x00", hashlib.sha256).digest()
+            V=hmac.new(K, V, hashlib.sha256).digest()
+
+    def sign(self, digest):
+        """Canonical compact signature of the 32 byte digest, as a SIG_K1_ string."""
+        assert(len(digest) == 32)
+        z=int.from_bytes(digest, "big")
+        attempt=0
+        while True:
+            k=self.__nonce(digest, attempt)
+            attempt+=1
+            R=_multiplyG(k)
+            r=R[0] % _N
+            if r == 0:
+                continue
+            s=pow(k, _N - 2, _N) * (z + r * self.secret) % _N
+            if s == 0:
+                continue
+            recId=(R[1] & 1) | (2 if R[0] >= _N else 0)
+            if s > _N // 2:
+                s=_N - s
+                recId^=1
+            rBytes=r.to_bytes(32, "big")
+            sBytes=s.to_bytes(32, "big")
+            if not _isCanonical(rBytes, sBytes):
+                continue
+            data=bytes([27 + 4 + recId]) + rBytes + sBytes
+            return "SIG_K1_" + base58Encode(data + ripemd160(data + b"K1")[:4])
+
+def packPublicKey(text):
+    """Serialized public_key (K1 variant and the compressed point) of a legacy EOS... or PUB_K1_ public key."""
+    if text.startswith("PUB_K1_"):
+        data=base58Decode(text[len("PUB_K1_"):])
+        key, checksum=data[:-4], data[-4:]
+        if ripemd160(key + b"K1")[:4] != checksum:
+            raise ValueError("Invalid checksum for public key %s" % (text))
+    else:
+        data=base58Decode(text[len("EOS"):] if text.startswith("EOS") else text)
+        key, checksum=data[:-4], data[-4:]
+        if ripemd160(key)[:4] != checksum:
+            raise ValueError("Invalid checksum for public key %s" % (text))
+    if len(key) != 33:
+        raise ValueError("Invalid public key %s" % (text))
+    return b"\0" + key
+
+def signatureDigest(chainId, packedTrx, contextFreeData=b""):
+    """transaction::sig_digest for a chain id (hex string or bytes), a packed transaction and its packed context free data."""
+    if isinstance(chainId, str):
+        chainId=bytes.fromhex(chainId)
+    cfdDigest=hashlib.sha256(contextFreeData).digest() if len(contextFreeData) > 0 else b"\0" * 32
+    return hashlib.sha256(chainId + packedTrx + cfdDigest).digest()
@@ -40,6 +40,9 @@ class WalletMgr(object):
     def isLaunched(self):
         return self.__walletPid is not None
 
+    def getPid(self):
+        return self.__walletPid
+
     def isLocal(self):
         return self.host=="localhost" or self.host=="127.0.0.1"
 
@@ -6,7 +6,9 @@ import time
 from Cluster import Cluster
 from WalletMgr import WalletMgr
 from Node import BlockType
+from BlockLog import BlockLog
 import os
+import shutil
 import signal
 import subprocess
 from TestHelper import AppArgs
@@ -14,7 +16,8 @@ from TestHelper import TestHelper
 
 ###############################################################
 # block_log_util_test
-#  Test verifies that the blockLogUtil is still compatible with nodeos
+#  Test verifies that the blockLogUtil is still compatible with nodeos and that the block logs BlockLog builds
+#  (extract, split, snapshot, trim, cloneBlocksDir) are valid and hold the expected block ranges
 ###############################################################
 
 Print=Utils.Print
@@ -106,8 +109,8 @@ try:
 
         return foundBlockNums
 
-    Print("Retrieve the whole blocklog for node 0")
-    blockLog=cluster.getBlockLog(0)
+    Print("Stream the whole blocklog for node 0")
+    blockLog=cluster.getBlockLog(0, stream=True, fields=["block_num"])
     foundBlockNums=checkBlockLog(blockLog, [headBlockNum, headBlockNumAfter])
     assert foundBlockNums[0], "Couldn't find \"%d\" in blocklog:\n\"%s\"\n" % (foundBlockNums[0], output)
     assert not foundBlockNums[1], "Should not find \"%d\" in blocklog:\n\"%s\"\n" % (foundBlockNums[1], blockLog)
@@ -127,6 +130,52 @@ try:
     blockIndexStr=blockIndexFile.read()
     duplicateIndexStr=duplicateIndexFile.read()
     assert blockIndexStr==duplicateIndexStr, "Generated file \%%s\" didn't match original \"%s\"" % (duplicateIndexFileName, blockIndexFileName)
+    os.remove(duplicateIndexFileName)
+
+    def verifyBlockLogRange(blockLog, first, last):
+        """Check the block range BlockLog reports and that eosio-blocklog accepts the log and returns exactly first through last."""
+        assert blockLog.firstBlockNum == first and blockLog.lastBlockNum == last, \
+            "Block log %s contains blocks %d through %d, expected %d through %d" % (blockLog.blocksDir, blockLog.firstBlockNum, blockLog.lastBlockNum, first, last)
+        output=Utils.getBlockLog(blockLog.blocksDir, blockLogAction=BlockLogAction.smoke_test)
+        assert output is not None and output.find("no problems found") != -1, "Smoke test of %s failed:\n\"%s\"\n" % (blockLog.blocksDir, output)
+        blockNums=[block["block_num"] for block in Utils.getBlockLog(blockLog.blocksDir, stream=True, fields=["block_num"])]
+        assert blockNums == list(range(first, last + 1)), "eosio-blocklog returned blocks %s of %s, expected %d through %d" % (blockNums[:1] + blockNums[-1:], blockLog.blocksDir, first, last)
+
+    Print("Verify BlockLog extract, split, snapshot, trim and cloneBlocksDir on node 0's block log")
+    blockLogOpsDir=Utils.getNodeDataDir(0, "blocklog-ops")
+    sourceBlockLog=BlockLog(blockLogDir)
+    sourceFirst=sourceBlockLog.firstBlockNum
+    sourceLast=sourceBlockLog.lastBlockNum
+    assert sourceFirst == 1 and sourceLast > 60, "Expected node 0's block log to start at 1 and hold more than 60 blocks, it holds %d through %d" % (sourceFirst, sourceLast)
+    verifyBlockLogRange(sourceBlockLog, sourceFirst, sourceLast)
+
+    # a range without block 1, the header carries the chain id instead of the genesis state
+    extracted=sourceBlockLog.extract(os.path.join(blockLogOpsDir, "extract"), 20, sourceLast - 10)
+    verifyBlockLogRange(extracted, 20, sourceLast - 10)
+    assert extracted.chainId == sourceBlockLog.chainId, "Extracted block log has a different chain id"
+
+    blocksPerArchive=25
+    archives=sourceBlockLog.split(os.path.join(blockLogOpsDir, "split"), blocksPerArchive)
+    assert len(archives) == (sourceLast - sourceFirst) // blocksPerArchive + 1, "Split into %d archives, expected %d" % (len(archives), (sourceLast - sourceFirst) // blocksPerArchive + 1)
+    for i, archive in enumerate(archives):
+        archiveFirst=sourceFirst + i * blocksPerArchive
+        verifyBlockLogRange(archive, archiveFirst, min(archiveFirst + blocksPerArchive - 1, sourceLast))
+
+    snapshot=sourceBlockLog.snapshot(os.path.join(blockLogOpsDir, "snapshot"), last=30)
+    verifyBlockLogRange(snapshot, 1, 30)
+
+    BlockLog.cloneBlocksDir(blockLogDir, os.path.join(blockLogOpsDir, "trim"))
+    trimmed=BlockLog(os.path.join(blockLogOpsDir, "trim"))
+    verifyBlockLogRange(trimmed, sourceFirst, sourceLast)
+    trimmed.trim(last=sourceLast - 5)
+    verifyBlockLogRange(trimmed, sourceFirst, sourceLast - 5)
+    trimmed.trim(first=10)
+    verifyBlockLogRange(trimmed, 10, sourceLast - 5)
+    verifyBlockLogRange(BlockLog(trimmed.blocksDir), 10, sourceLast - 5)
+
+    # none of the operations may touch the source
+    verifyBlockLogRange(BlockLog(blockLogDir), sourceFirst, sourceLast)
+    shutil.rmtree(blockLogOpsDir)
 
     try:
         Print("Head block num %d will not be in block log (it will be in reversible DB), so --trim will throw an exception" % (headBlockNum))
@@ -150,7 +199,7 @@ try:
     output=cluster.getBlockLog(2, blockLogAction=BlockLogAction.smoke_test)
 
     Print("Analyze block log.")
-    trimmedBlockLog=cluster.getBlockLog(2, blockLogAction=BlockLogAction.return_blocks)
+    trimmedBlockLog=cluster.getBlockLog(2, blockLogAction=BlockLogAction.return_blocks, stream=True, fields=["block_num"])
 
     verifyBlockLog(2, trimmedBlockLog)
 
@@ -179,7 +228,7 @@ try:
     output=cluster.getBlockLog(2, blockLogAction=BlockLogAction.smoke_test)
 
     Print("Analyze block log.")
-    trimmedBlockLog=cluster.getBlockLog(2, blockLogAction=BlockLogAction.return_blocks)
+    trimmedBlockLog=cluster.getBlockLog(2, blockLogAction=BlockLogAction.return_blocks, stream=True, fields=["block_num"])
 
     verifyBlockLog(firstBlock, trimmedBlockLog)
 
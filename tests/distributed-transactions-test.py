@@ -101,7 +101,7 @@ try:
     eosioAccount=cluster.eosioAccount
 
     Print("Create accounts.")
-    if not cluster.createAccounts(eosioAccount):
+    if not cluster.createAccounts(eosioAccount, bulk=True):
         errorExit("Accounts creation failed.")
 
     Print("Spread funds and validate")
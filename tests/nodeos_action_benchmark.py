@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from ActionBenchmark import ActionBenchmark
+from AccountFactory import AccountFactory
+
+import json
+import random
+import string
+
+###############################################################
+# nodeos_action_benchmark
+#
+#  Billed cpu microbenchmark of contract actions.  A single producer is launched, the contract of <--contract-dir>
+#  is deployed to <--contract-account> and every action of <--actions> is pushed <--count> times (after <--warmup>
+#  unmeasured pushes), authorized round-robin by <--accounts> test accounts.  The action data is the json template
+#  of <--data> for the action with $contract, $account (the authorizer), $index and $random (an integer between
+#  <--random-min> and <--random-max>, from <--seed>) substituted, e.g. the default
+#    --actions store --data '{"from":"$account","to":"$account","num":$random}'
+#  for unittests/test-contracts/integration_test.  Give several templates separated by ';' for several actions.
+#  The median, MAD, mean, min and max after outlier rejection of billed cpu, net and action elapsed time are
+#  printed and written to <--output> as json.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--contract-dir", type=str, help="Directory of the contract", default="unittests/test-contracts/integration_test")
+extraArgs = appArgs.add(flag="--wasm", type=str, help="wasm file in the contract directory", default="integration_test.wasm")
+extraArgs = appArgs.add(flag="--abi", type=str, help="abi file in the contract directory", default="integration_test.abi")
+extraArgs = appArgs.add(flag="--contract-account", type=str, help="Account to deploy the contract to", default="benchcontr")
+extraArgs = appArgs.add(flag="--actions", type=str, help="Comma separated actions to benchmark", default="store")
+extraArgs = appArgs.add(flag="--data", type=str, help="';' separated json data templates, one per action", default="{\"from\":\"$account\",\"to\":\"$account\",\"num\":$random}")
+extraArgs = appArgs.add(flag="--random-min", type=int, help="Smallest $random", default=50)
+extraArgs = appArgs.add(flag="--random-max", type=int, help="Largest $random", default=150)
+extraArgs = appArgs.add(flag="--seed", type=int, help="Seed of $random", default=1)
+extraArgs = appArgs.add(flag="--count", type=int, help="Measured invocations per action", default=200)
+extraArgs = appArgs.add(flag="--warmup", type=int, help="Unmeasured invocations per action", default=10)
+extraArgs = appArgs.add(flag="--accounts", type=int, help="Number of authorizing test accounts", default=4)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the statistics to", default="action_benchmark.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+actions=args.actions.split(",")
+templates=[string.Template(template) for template in args.data.split(";")]
+if len(templates) != len(actions):
+    errorExit("%d data templates given for %d actions" % (len(templates), len(actions)))
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+    Print("Stand up cluster")
+    if cluster.launch(pnodes=1, totalNodes=1, prodCount=1, useBiosBootFile=False, loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster.")
+    node=cluster.getNode(0)
+
+    keys=Cluster.createAccountKeys(args.accounts + 1)
+    if keys is None:
+        errorExit("Failed to create account keys")
+    contractAccount=keys[0]
+    contractAccount.name=args.contract_account
+    accounts=keys[1:]
+    for index, account in enumerate(accounts):
+        account.name=AccountFactory.accountName("benchauth", index)
+    walletMgr.create("bench", [cluster.eosioAccount, contractAccount] + accounts)
+    for account in accounts:
+        node.createAccount(account, cluster.eosioAccount, stakedDeposit=0, exitOnError=True)
+
+    Print("Deploy %s to %s" % (args.contract_dir, contractAccount.name))
+    bench=ActionBenchmark.deploy(node, cluster.eosioAccount, contractAccount, args.contract_dir, args.wasm, args.abi)
+
+    rng=random.Random(args.seed)
+    for action, template in zip(actions, templates):
+        Print("Benchmark %s::%s, %d invocations" % (contractAccount.name, action, args.count))
+        def data(index, template=template):
+            return template.substitute(contract=contractAccount.name, account=accounts[index % len(accounts)].name, index=index,
+                                       random=rng.randint(args.random_min, args.random_max))
+        bench.run(action, data, args.count, accounts, warmup=args.warmup)
+
+    Print(Utils.FileDivider)
+    results=bench.results()
+    bench.printReport(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    Print("Statistics written to %s" % (args.output))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
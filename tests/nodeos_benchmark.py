@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from Node import Node
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from Benchmark import BenchmarkResults
+import Benchmark
+from LoadGenerator import RateSchedule
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import TransferFactory
+from TransactionCorpus import ActionFactory
+from TransactionCorpus import packName
+from TransactionLatencyTracker import TransactionLatencyTracker
+from ActionBenchmark import ActionBenchmark
+
+import os
+import random
+import shutil
+import signal
+import struct
+import time
+
+from core_symbol import CORE_SYMBOL
+
+###############################################################
+# nodeos_benchmark
+#
+#  Performance benchmark suite.  Every benchmark launches its own local cluster and measures <--repeat> samples of
+#  its metrics:
+#    transfer_throughput - pre-signed transfers replayed into a single producer: included tps, latency to block,
+#                          chainbase growth per 1000 transfers
+#    mesh_throughput     - the same spread over a mesh of producing nodes
+#    action_cpu          - median billed cpu and elapsed time of integration_test::store actions (ActionBenchmark)
+#    ram_inserts         - integration_test::store table inserts replayed into a single producer: rows per second,
+#                          chainbase growth per 1000 rows
+#    snapshot            - create_snapshot time and size, and time to start a node from the snapshot
+#    replay              - blocks per second of --replay-blockchain
+#    catchup             - blocks per second of a new node syncing from a producer
+#  Restarts from a snapshot, with a replay or from an empty chain may take up to <--timeout> seconds to answer, which
+#  large --fill-rows chains need.
+#  Account names are fixed, action data and memos derive from <--seed>.  Results are written as json, with the environment they
+#  were measured in, to <--output-dir>/<label>.json, where the label selects the nodeos build from
+#  <--alternate-version-labels-file> ("current" is the build under test).
+#
+#  With --baseline and --candidate no cluster is launched, the two result files are compared and the test fails on
+#  a statistically significant regression, e.g.
+#    tests/nodeos_benchmark.py --alternate-version-labels-file labels.txt --label v2_0
+#    tests/nodeos_benchmark.py
+#    tests/nodeos_benchmark.py --baseline benchmarks/v2_0.json --candidate benchmarks/current.json
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+AllBenchmarks=["transfer_throughput", "mesh_throughput", "action_cpu", "ram_inserts", "snapshot", "replay", "catchup"]
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--benchmarks", type=str, help="Comma separated benchmarks to run, of %s" % (",".join(AllBenchmarks)), default=",".join(AllBenchmarks))
+extraArgs = appArgs.add(flag="--repeat", type=int, help="Samples per metric", default=5)
+extraArgs = appArgs.add(flag="--seed", type=int, help="Seed of action data and memos", default=1)
+extraArgs = appArgs.add(flag="--label", type=str, help="Version label of the nodeos build to benchmark", default="current")
+extraArgs = appArgs.add(flag="--tps", type=int, help="Offered rate of the throughput benchmarks", default=1000)
+extraArgs = appArgs.add(flag="--duration", type=int, help="Seconds of load per throughput sample", default=20)
+extraArgs = appArgs.add(flag="--accounts", type=int, help="Accounts sending the load", default=20)
+extraArgs = appArgs.add(flag="--fill-rows", type=int, help="Table rows inserted before the snapshot, replay and catchup benchmarks", default=20000)
+extraArgs = appArgs.add(flag="--timeout", type=int, help="Seconds a relaunch from a snapshot, with a replay or from an empty chain may take to answer", default=1800)
+extraArgs = appArgs.add(flag="--output-dir", type=str, help="Directory of the result files", default="benchmarks")
+extraArgs = appArgs.add(flag="--baseline", type=str, help="Result file of the baseline build, compare instead of running", default=None)
+extraArgs = appArgs.add(flag="--candidate", type=str, help="Result file of the candidate build, compare instead of running", default=None)
+extraArgs = appArgs.add(flag="--alpha", type=float, help="Significance level of the comparison", default=0.05)
+extraArgs = appArgs.add(flag="--min-change", type=float, help="Smallest relative change of a metric reported as a regression", default=0.05)
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port","--alternate-version-labels-file"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+
+if args.baseline is not None or args.candidate is not None:
+    if args.baseline is None or args.candidate is None:
+        errorExit("Both --baseline and --candidate are needed to compare benchmark results")
+    baseline=BenchmarkResults.load(args.baseline)
+    candidate=BenchmarkResults.load(args.candidate)
+    rows=Benchmark.compareResults(baseline, candidate, alpha=args.alpha, minChange=args.min_change)
+    regressions=Benchmark.printComparison(rows, baseline.environment.get("label"), candidate.environment.get("label"))
+    if regressions > 0:
+        errorExit("%d benchmark metric(s) regressed" % (regressions))
+    exit(0)
+
+benchmarks=args.benchmarks.split(",")
+for benchmark in benchmarks:
+    if benchmark not in AllBenchmarks:
+        errorExit("Unknown benchmark %s, expected one of %s" % (benchmark, ",".join(AllBenchmarks)))
+
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+alternateVersionLabelsFile=args.alternate_version_labels_file
+label=args.label
+cluster=Cluster(walletd=True)
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+producerApiArgs=" --http-max-response-time-ms 990000 --plugin eosio::producer_api_plugin --plugin eosio::db_size_api_plugin "
+results=None
+
+def launchCluster(pnodes=1, totalNodes=1, unstartedNodes=0, topo="mesh", extraNodeosArgs=producerApiArgs):
+    """Fresh cluster running the nodeos build of label on every node."""
+    global cluster
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+    cluster=Cluster(walletd=True)
+    cluster.setWalletMgr(walletMgr)
+    associatedNodeLabels=None
+    if label != "current":
+        associatedNodeLabels={nodeNum: label for nodeNum in range(totalNodes)}
+    if cluster.launch(pnodes=pnodes, totalNodes=totalNodes, unstartedNodes=unstartedNodes, prodCount=1, totalProducers=pnodes, topo=topo, useBiosBootFile=False,
+                      extraNodeosArgs=extraNodeosArgs, alternateVersionLabelsFile=alternateVersionLabelsFile, associatedNodeLabels=associatedNodeLabels,
+                      loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster.")
+    return cluster.getNodes()
+
+def accountName(prefix, index):
+    """12 character account name, prefix followed by index in base 26 letters."""
+    suffix=""
+    for _ in range(12 - len(prefix)):
+        index, rem=divmod(index, 26)
+        suffix=chr(ord("a") + rem) + suffix
+    return prefix + suffix
+
+def createAccounts(node, count, prefix="bench"):
+    """count funded accounts with fixed names (the keys come from cleos and are imported into the wallet)."""
+    accounts=Cluster.createAccountKeys(count)
+    if accounts is None:
+        errorExit("Failed to create account keys")
+    for index, account in enumerate(accounts):
+        account.name=accountName(prefix, index)
+    # the keys go to the ignition wallet, which the cluster bootstrap leaves open
+    walletMgr.importKeys(accounts, walletMgr.create("ignition"))
+    for account in accounts:
+        node.createAccount(account, cluster.eosioAccount, stakedDeposit=0, exitOnError=True)
+    lastTrans=None
+    for account in accounts:
+        lastTrans=node.transferFunds(cluster.eosioAccount, account, "100000.0000 {0}".format(CORE_SYMBOL), "fund", exitOnError=True)
+    node.waitForTransInBlock(Node.getTransId(lastTrans))
+    return accounts
+
+def publishIntegrationTest(node):
+    contractAccount=Cluster.createAccountKeys(1)[0]
+    contractAccount.name="benchstore"
+    walletMgr.importKey(contractAccount, walletMgr.create("ignition"))
+    node.createAccount(contractAccount, cluster.eosioAccount, stakedDeposit=0, waitForTransBlock=True, exitOnError=True)
+    trans=node.publishContract(contractAccount.name, "unittests/test-contracts/integration_test", "integration_test.wasm", "integration_test.abi", waitForTransBlock=True)
+    if trans is None:
+        errorExit("Failed to publish integration_test contract.")
+    return contractAccount.name
+
+StoreNum=100
+
+def storeData(index, accountName):
+    """integration_test::store(from, to, num) action data, every store adds 5 rows of num uint64 to the table of from.
+    The same for every index, ActionFactory adds a nonce to keep the transactions unique."""
+    return packName(accountName) + packName(accountName) + struct.pack("<Q", StoreNum)
+
+def replayCorpus(name, repetition, nodes, accounts, tps, duration, factory):
+    """Generate tps*duration pre-signed transactions, replay them at tps and return the LoadGenerator and the tracker
+    results."""
+    node=nodes[0]
+    path=os.path.join(args.output_dir, "%s.%s.trx" % (label, name))
+    TransactionCorpus.generate(path, TransactionCorpus.taposFromNode(node), accounts, tps * duration, factory=factory)
+    tracker=TransactionLatencyTracker(node)
+    with TransactionCorpus(path) as corpus, tracker:
+        generator=corpus.replay(nodes, RateSchedule.constant(tps, duration), tracker=tracker)
+        if not tracker.waitForAll(timeout=duration + 120, final=False):
+            Print("WARNING: %d transaction(s) of %s sample %d were not included" % (tracker.pending(final=False), name, repetition))
+    os.remove(path)
+    os.remove(TransactionCorpus.indexPath(path))
+    return generator, tracker.results()
+
+def benchmarkThroughput(name, nodes):
+    accounts=createAccounts(nodes[0], args.accounts)
+    dbSize=cluster.startDbSizeSampling([0])[0]
+    for repetition in range(args.repeat):
+        factory=TransferFactory(memoPrefix="%s %d %d" % (name, args.seed, repetition))
+        first=dbSize.mark()
+        generator, latency=replayCorpus(name, repetition, nodes, accounts, args.tps, args.duration, factory)
+        addStateGrowth(name, dbSize, first, latency["included"], "Trx")
+        results.addSample(name, "includedTps", latency["includedPerSecond"], "trx/s", True)
+        results.addSample(name, "acceptedTps", generator.results()["achievedTps"], "trx/s", True)
+        toBlock=latency["toBlock"]["all"]
+        if toBlock is not None:
+            results.addSample(name, "toBlockP50", toBlock[50] * 1000, "ms", False)
+            results.addSample(name, "toBlockP99", toBlock[99] * 1000, "ms", False)
+    cluster.stopDbSizeSampling()
+
+def addStateGrowth(name, dbSize, first, units, unitName):
+    """Chainbase growth per 1000 units since sample first of dbSize, the transactions are still in the dedup list."""
+    last=dbSize.mark()
+    if first is None or last is None or units == 0:
+        return
+    growth=dbSize.growth(first, last, units)
+    results.addSample(name, "stateBytesPer1k%s" % (unitName), growth["usedBytesPer1kUnits"], "bytes", False)
+    if Utils.Debug: Print("%s state growth per 1000 %s: %s" % (name, unitName, growth["rowsPer1kUnits"]))
+
+def fillChain(node, rows):
+    """Insert about rows table rows (5 per integration_test::store action) so that state and blocks are not trivial."""
+    accounts=createAccounts(node, args.accounts)
+    contract=publishIntegrationTest(node)
+    actions=rows // 5
+    tps=min(args.tps, 500)
+    replayCorpus("fill", 0, [node], accounts, tps, max(1, actions // tps), ActionFactory(contract, "store", storeData))
+    return accounts, contract
+
+def waitForHead(node, blockNum, timeout):
+    """Poll until node's head reaches blockNum, returns the seconds it took or None on timeout."""
+    start=time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        info=node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=1)
+        if info is not None and info["head_block_num"] >= blockNum:
+            return time.perf_counter() - start
+        time.sleep(0.1)
+    return None
+
+def timedRelaunch(node, nodeId, chainArg):
+    """Restart node with the extra chainArg, returns the seconds until it answers. The node keeps its original command
+    for later relaunches."""
+    cmd=node.cmd
+    if not node.kill(signal.SIGTERM):
+        errorExit("Failed to stop node %d" % (nodeId))
+    start=time.perf_counter()
+    if not node.relaunch(nodeId, chainArg=chainArg, timeout=args.timeout, pulseInterval=0.05, cachePopen=True):
+        errorExit("Failed to relaunch node %d with %s" % (nodeId, chainArg))
+    elapsed=time.perf_counter() - start
+    node.cmd=cmd
+    return elapsed
+
+def benchmarkActionCpu():
+    node=launchCluster()[0]
+    accounts=createAccounts(node, args.accounts)
+    contract=publishIntegrationTest(node)
+    rng=random.Random(args.seed)
+    def storeJson(index):
+        account=accounts[index % len(accounts)]
+        return "{\"from\":\"%s\",\"to\":\"%s\",\"num\":%d}" % (account.name, account.name, rng.randint(50, 150))
+    for repetition in range(args.repeat):
+        bench=ActionBenchmark(node, contract)
+        bench.run("store", storeJson, 50, accounts)
+        bench.addToResults(results, "action_cpu")
+
+def benchmarkRamInserts():
+    node=launchCluster()[0]
+    accounts=createAccounts(node, args.accounts)
+    contract=publishIntegrationTest(node)
+    tps=min(args.tps, 500)
+    dbSize=cluster.startDbSizeSampling([0])[0]
+    for repetition in range(args.repeat):
+        ramBefore=sum(node.getEosAccount(account.name, exitOnError=True)["ram_usage"] for account in accounts)
+        first=dbSize.mark()
+        _, latency=replayCorpus("ram_inserts", repetition, [node], accounts, tps, args.duration, ActionFactory(contract, "store", storeData))
+        ramAfter=sum(node.getEosAccount(account.name, exitOnError=True)["ram_usage"] for account in accounts)
+        rows=latency["included"] * 5
+        addStateGrowth("ram_inserts", dbSize, first, rows, "Rows")
+        results.addSample("ram_inserts", "rowsPerSecond", latency["includedPerSecond"] * 5, "rows/s", True)
+        if rows > 0:
+            results.addSample("ram_inserts", "ramBytesPerRow", (ramAfter - ramBefore) / rows, "bytes", False)
+    cluster.stopDbSizeSampling()
+
+def benchmarkSnapshot():
+    node=launchCluster()[0]
+    fillChain(node, args.fill_rows)
+    for repetition in range(args.repeat):
+        start=time.perf_counter()
+        snapshot=node.createSnapshot()
+        elapsed=time.perf_counter() - start
+        if snapshot is None or "snapshot_name" not in snapshot:
+            errorExit("Failed to create snapshot: %s" % (snapshot))
+        snapshotPath=snapshot["snapshot_name"]
+        results.addSample("snapshot", "createSeconds", elapsed, "s", False)
+        results.addSample("snapshot", "sizeBytes", os.path.getsize(snapshotPath), "bytes", False)
+        if not node.kill(signal.SIGTERM):
+            errorExit("Failed to stop node 0")
+        shutil.rmtree(Utils.getNodeDataDir(0, "state"))
+        shutil.rmtree(Utils.getNodeDataDir(0, "blocks"))
+        cmd=node.cmd
+        start=time.perf_counter()
+        if not node.relaunch(0, chainArg="--snapshot %s" % (snapshotPath), timeout=args.timeout, pulseInterval=0.05, cachePopen=True):
+            errorExit("Failed to start node 0 from snapshot %s" % (snapshotPath))
+        results.addSample("snapshot", "loadSeconds", time.perf_counter() - start, "s", False)
+        node.cmd=cmd
+        os.remove(snapshotPath)
+
+def benchmarkReplay():
+    node=launchCluster()[0]
+    fillChain(node, args.fill_rows)
+    for repetition in range(args.repeat):
+        headBlockNum=node.getHeadBlockNum()
+        elapsed=timedRelaunch(node, 0, "--replay-blockchain")
+        results.addSample("replay", "blocksPerSecond", headBlockNum / elapsed, "blocks/s", True)
+
+def benchmarkCatchup():
+    nodes=launchCluster(pnodes=1, totalNodes=2, unstartedNodes=1)
+    producer=nodes[0]
+    fillChain(producer, args.fill_rows)
+    catchupNode=None
+    for repetition in range(args.repeat):
+        target=producer.getHeadBlockNum()
+        start=time.perf_counter()
+        if catchupNode is None:
+            cluster.launchUnstarted(cachePopen=True)
+            catchupNode=cluster.getNodes()[-1]
+        else:
+            cmd=catchupNode.cmd
+            if not catchupNode.kill(signal.SIGTERM) or not catchupNode.relaunch(1, chainArg="--delete-all-blocks", timeout=args.timeout, pulseInterval=0.05, cachePopen=True):
+                errorExit("Failed to restart the catchup node from an empty chain")
+            catchupNode.cmd=cmd
+        if waitForHead(catchupNode, target, timeout=max(120, target / 50)) is None:
+            errorExit("Catchup node did not reach block %d" % (target))
+        results.addSample("catchup", "blocksPerSecond", target / (time.perf_counter() - start), "blocks/s", True)
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    results=BenchmarkResults(BenchmarkResults.collectEnvironment(label, args.seed))
+    if label != "current":
+        cluster.setAlternateVersionLabels(alternateVersionLabelsFile)
+        if label not in cluster.alternateVersionLabels:
+            errorExit("Version label %s is not in %s" % (label, alternateVersionLabelsFile))
+        results.environment["nodeosPath"]=cluster.alternateVersionLabels[label]
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    for benchmark in benchmarks:
+        Print("Run benchmark %s" % (benchmark))
+        if benchmark == "transfer_throughput":
+            benchmarkThroughput(benchmark, launchCluster())
+        elif benchmark == "mesh_throughput":
+            benchmarkThroughput(benchmark, launchCluster(pnodes=3, totalNodes=3, topo="mesh"))
+        elif benchmark == "action_cpu":
+            benchmarkActionCpu()
+        elif benchmark == "ram_inserts":
+            benchmarkRamInserts()
+        elif benchmark == "snapshot":
+            benchmarkSnapshot()
+        elif benchmark == "replay":
+            benchmarkReplay()
+        elif benchmark == "catchup":
+            benchmarkCatchup()
+
+    resultsFile=os.path.join(args.output_dir, "%s.json" % (label))
+    results.write(resultsFile)
+    results.printReport()
+    Print("Benchmark results written to %s" % (resultsFile))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from Node import BlockType
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from LoadGenerator import LoadGenerator
+from LoadGenerator import RateSchedule
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import TransferFactory
+from TransactionCorpus import ActionFactory
+from TransactionCorpus import DelayedFactory
+from TransactionCorpus import MixFactory
+from TransactionCorpus import packName
+from AccountFactory import AccountFactory
+from AccountFactory import NewAccountFactory
+from ChainFixture import ChainFixture
+from BlockLog import BlockLog
+
+import math
+import os
+import signal
+import struct
+
+###############################################################
+# nodeos_chain_fixture
+#
+#  Builds a large synthetic chain and packages it as a ChainFixture for the sync, replay and snapshot benchmarks.
+#  A single producer is filled with <--transactions> pre-signed transactions of the <--mix>, weights of
+#    transfer   - eosio.token transfers between the <--accounts> corpus accounts
+#    store      - integration_test::store of <--store-num> values, 5 new table rows each
+#    newaccount - a new account per transaction (named fixnew..., with the active key of the first corpus account)
+#    deferred   - transfers with a delay of 1 sec, executed as deferred transactions
+#  The transactions are pushed in rounds of at most <--round-seconds> (a corpus expires after an hour), each round
+#  generated against the current head.  The rate starts at <--tps> and follows what the producer sustains: after a
+#  round that accepted less than 95% of the offered rate it drops to the achieved rate, otherwise it grows by 10% up
+#  to <--max-tps>.  With <--relaxed-limits> the producer runs without transaction time limit and with a
+#  <--state-db-mb> chain state, for chains beyond the default limits.
+#
+#  At the end a snapshot is taken at the head, the producer is stopped and its blocks, the snapshot, the genesis
+#  state and the keys of all accounts are packaged in <--output-dir> with a checksummed manifest.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+MixComponents=["transfer", "store", "newaccount", "deferred"]
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--output-dir", type=str, help="Directory to create the fixture in", default="chain_fixture")
+extraArgs = appArgs.add(flag="--name", type=str, help="Name of the fixture", default="synthetic")
+extraArgs = appArgs.add(flag="--fixture-version", type=str, help="Version of the fixture", default="1")
+extraArgs = appArgs.add(flag="--transactions", type=int, help="Number of accepted transactions to put on the chain", default=100000)
+extraArgs = appArgs.add(flag="--tps", type=int, help="Initial transactions per second", default=500)
+extraArgs = appArgs.add(flag="--max-tps", type=int, help="Highest transactions per second to try", default=5000)
+extraArgs = appArgs.add(flag="--round-seconds", type=int, help="Longest round of pushing one corpus", default=600)
+extraArgs = appArgs.add(flag="--mix", type=str, help="Comma separated <kind>:<weight> of %s" % (",".join(MixComponents)), default="transfer:70,store:20,newaccount:5,deferred:5")
+extraArgs = appArgs.add(flag="--accounts", type=int, help="Number of corpus accounts", default=100)
+extraArgs = appArgs.add(flag="--store-num", type=int, help="Values per row of the store transactions", default=100)
+extraArgs = appArgs.add(flag="--relaxed-limits", type=int, help="1 to run without transaction time limit and with a --state-db-mb chain state", default=0)
+extraArgs = appArgs.add(flag="--state-db-mb", type=int, help="Chain state size with --relaxed-limits", default=16384)
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+mix=[]
+for entry in args.mix.split(","):
+    kind, _, weight=entry.partition(":")
+    if kind not in MixComponents or not weight.isdigit():
+        errorExit("Invalid mix entry %s, expected <kind>:<weight> with kind one of %s" % (entry, ",".join(MixComponents)))
+    mix.append((kind, int(weight)))
+if os.path.exists(args.output_dir):
+    errorExit("Fixture directory %s already exists" % (args.output_dir))
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+StoreAccountName="fixstore"
+NewAccountPrefix="fixnew"
+
+def storeData(index, accountName):
+    """integration_test::store(from, to, num) action data, every store adds 5 rows of num uint64 to the table of from."""
+    return packName(accountName) + packName(accountName) + struct.pack("<Q", args.store_num)
+
+def publishIntegrationTest(node):
+    storeAccount=AccountFactory.createAccountKeys(1)[0]
+    storeAccount.name=StoreAccountName
+    walletMgr.importKey(storeAccount, walletMgr.create("ignition"))
+    node.createAccount(storeAccount, cluster.eosioAccount, stakedDeposit=0, waitForTransBlock=True, exitOnError=True)
+    trans=node.publishContract(storeAccount.name, "unittests/test-contracts/integration_test", "integration_test.wasm", "integration_test.abi", waitForTransBlock=True)
+    if trans is None:
+        errorExit("Failed to publish integration_test contract.")
+    return storeAccount
+
+def mixFactory(accounts):
+    factories={
+        "transfer": TransferFactory(memoPrefix="fixture"),
+        "store": ActionFactory(StoreAccountName, "store", storeData),
+        "newaccount": NewAccountFactory(accounts[0].activePublicKey, prefix=NewAccountPrefix),
+        # deferred transactions cannot carry the nonce of ActionFactory, the memo keeps them unique
+        "deferred": DelayedFactory(TransferFactory(memoPrefix="deferred"))
+    }
+    return MixFactory([(factories[kind], weight) for kind, weight in mix])
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+
+    extraNodeosArgs=" --http-max-response-time-ms 990000 --plugin eosio::producer_api_plugin "
+    if args.relaxed_limits:
+        extraNodeosArgs+=" --max-transaction-time -1 --chain-state-db-size-mb %d " % (args.state_db_mb)
+    if cluster.launch(pnodes=1, totalNodes=1, prodCount=1, useBiosBootFile=False, extraNodeosArgs=extraNodeosArgs, loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster.")
+    node=cluster.getNode(0)
+    # building large fixtures takes hours, watch for leaks and disk use
+    cluster.startResourceSampling(intervalSeconds=10)
+
+    accounts=AccountFactory.createAccountKeys(args.accounts, prefix="fixacct")
+    walletMgr.importKeys(accounts, walletMgr.create("ignition"))
+    accountFactory=AccountFactory([node], cluster.eosioAccount, stakedDeposit=100000 * 10000)
+    if accountFactory.create(accounts) is None or not accountFactory.verify(accounts):
+        errorExit("Failed to create %d corpus accounts" % (args.accounts))
+    storeAccount=publishIntegrationTest(node)
+    factory=mixFactory(accounts)
+
+    tps=args.tps
+    accepted=0
+    generated=0
+    rounds=[]
+    corpusPath=Utils.getNodeDataDir(0, "fixture.trx")
+    while accepted < args.transactions:
+        seconds=min(args.round_seconds, max(1, math.ceil((args.transactions - accepted) / tps)))
+        count=tps * seconds
+        TransactionCorpus.generate(corpusPath, TransactionCorpus.taposFromNode(node), accounts, count, factory=factory, firstIndex=generated)
+        generated+=count
+        with TransactionCorpus(corpusPath) as corpus:
+            results=corpus.replay([node], RateSchedule.constant(tps, seconds)).results()
+        roundAccepted=results["outcomes"].get(LoadGenerator.Accepted, 0)
+        if roundAccepted == 0:
+            errorExit("No transaction of round %d accepted, outcomes %s" % (len(rounds) + 1, results["outcomes"]))
+        accepted+=roundAccepted
+        rounds.append({"tps": tps, "seconds": seconds, "accepted": roundAccepted, "achievedTps": results["achievedTps"]})
+        Print("Round %d: %d of %d transactions accepted at %.1f of %d tps, %d of %d in total" %
+              (len(rounds), roundAccepted, count, results["achievedTps"], tps, accepted, args.transactions))
+        if results["achievedTps"] < 0.95 * tps:
+            tps=max(1, int(results["achievedTps"]))
+        else:
+            tps=min(args.max_tps, int(math.ceil(tps * 1.1)))
+
+    # let the last deferred transactions execute and everything become irreversible
+    headBlockNum=node.getHeadBlockNum()
+    if not node.waitForBlock(headBlockNum, timeout=Utils.systemWaitTimeout, blockType=BlockType.lib):
+        errorExit("LIB did not advance past %d" % (headBlockNum))
+    snapshot=node.createSnapshot()
+    if snapshot is None:
+        errorExit("Failed to create a snapshot")
+    Print("Snapshot %s at block %d" % (snapshot["snapshot_name"], snapshot["head_block_num"]))
+    if not node.kill(signal.SIGTERM):
+        errorExit("Failed to stop the producer")
+
+    blocksDir=Utils.getNodeDataDir(0, "blocks")
+    genesisFile=BlockLog(blocksDir).extractGenesis(Utils.getNodeDataDir(0, "fixture-genesis.json"))
+    if genesisFile is None:
+        errorExit("Failed to extract the genesis state of %s" % (blocksDir))
+    workload={
+        "mix": dict(mix),
+        "transactions": accepted,
+        "corpusAccounts": args.accounts,
+        "storeNum": args.store_num,
+        "storeAccount": StoreAccountName,
+        "newAccountPrefix": NewAccountPrefix,
+        "newAccountKeyOf": accounts[0].name,
+        "relaxedLimits": args.relaxed_limits == 1,
+        "nodeosArgs": extraNodeosArgs.strip(),
+        "rounds": rounds
+    }
+    fixture=ChainFixture.create(args.output_dir, args.name, args.fixture_version, blocksDir, snapshot["snapshot_name"], snapshot["head_block_num"],
+                                genesisFile, accounts + [storeAccount, cluster.eosioAccount], workload=workload)
+    if len(fixture.verify()) > 0:
+        errorExit("Fixture %s does not match its manifest" % (args.output_dir))
+    Print("Fixture %s %s of blocks %d to %d written to %s" %
+          (fixture.name, fixture.version, fixture.manifest["firstBlockNum"], fixture.manifest["lastBlockNum"], args.output_dir))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
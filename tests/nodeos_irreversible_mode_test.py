@@ -7,6 +7,7 @@ from Node import Node
 from Node import ReturnType
 from TestHelper import TestHelper
 from testUtils import Account
+from BlockLog import BlockLog
 
 import re
 import os
@@ -48,7 +49,7 @@ def backupBlksDir(nodeId):
    dataDir = Utils.getNodeDataDir(nodeId)
    sourceDir = os.path.join(dataDir, "blocks")
    destinationDir = os.path.join(os.path.dirname(dataDir), os.path.basename(dataDir) + "-backup", "blocks")
-   shutil.copytree(sourceDir, destinationDir)
+   BlockLog.cloneBlocksDir(sourceDir, destinationDir)
 
 def recoverBackedupBlksDir(nodeId):
    dataDir = Utils.getNodeDataDir(nodeId)
@@ -56,7 +57,7 @@ def recoverBackedupBlksDir(nodeId):
    existingBlocksDir = os.path.join(dataDir, "blocks")
    backedupBlocksDir = os.path.join(os.path.dirname(dataDir), os.path.basename(dataDir) + "-backup", "blocks")
    shutil.rmtree(existingBlocksDir, ignore_errors=True)
-   shutil.copytree(backedupBlocksDir, existingBlocksDir)
+   BlockLog.cloneBlocksDir(backedupBlocksDir, existingBlocksDir)
 
 def getLatestSnapshot(nodeId):
    snapshotDir = os.path.join(Utils.getNodeDataDir(nodeId), "snapshots")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from ParameterSweep import ParameterSweep
+from ParameterSweep import IdleWorkload
+from ParameterSweep import TransferWorkload
+
+###############################################################
+# nodeos_parameter_sweep
+#
+#  Scaling curves of a local cluster.  A cluster is launched for every combination of the comma separated
+#  values of <--pnodes>, <--total-nodes>, <--prod-count>, <--topos>, <--delays> and <--shared-producers>,
+#  <--workload> (idle or transfers at <--tps>) runs on it for <--measure-seconds>, and throughput, block
+#  propagation latency, LIB lag and nodeos cpu and memory are measured.  All points are printed as a table,
+#  written to <--csv> and the metric of <--curve> is printed against one parameter per value of another.
+#  Points run one after the other, local clusters share their ports and data directories.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--pnodes", type=str, help="Comma separated numbers of producing nodes", default="1")
+extraArgs = appArgs.add(flag="--total-nodes", type=str, help="Comma separated total numbers of nodes", default="1,3,5")
+extraArgs = appArgs.add(flag="--prod-count", type=str, help="Comma separated numbers of producers per producing node", default="1")
+extraArgs = appArgs.add(flag="--topos", type=str, help="Comma separated launcher topologies", default="mesh,star")
+extraArgs = appArgs.add(flag="--delays", type=str, help="Comma separated launcher delays between node starts", default="1")
+extraArgs = appArgs.add(flag="--shared-producers", type=str, help="Comma separated numbers of shared producers", default="0")
+extraArgs = appArgs.add(flag="--workload", type=str, help="idle or transfers", choices=["idle", "transfers"], default="idle")
+extraArgs = appArgs.add(flag="--tps", type=int, help="Transfer rate of the transfers workload", default=100)
+extraArgs = appArgs.add(flag="--warmup-seconds", type=int, help="Seconds to wait after the workload is prepared", default=5)
+extraArgs = appArgs.add(flag="--measure-seconds", type=int, help="Seconds measured per point", default=30)
+extraArgs = appArgs.add(flag="--curve", type=str, help="Curve to print as x:y:series", default="totalNodes:libLagP50:topo")
+extraArgs = appArgs.add(flag="--csv", type=str, help="File to write all points to", default="parameter_sweep.csv")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+def parseList(value, convert=int):
+    try:
+        return [convert(entry) for entry in value.split(",")]
+    except ValueError:
+        errorExit("Invalid list \"%s\"" % (value))
+
+grid={
+    "pnodes": parseList(args.pnodes),
+    "totalNodes": parseList(args.total_nodes),
+    "prodCount": parseList(args.prod_count),
+    "topo": parseList(args.topos, str),
+    "delay": parseList(args.delays),
+    "sharedProducers": parseList(args.shared_producers)
+}
+curve=args.curve.split(":")
+if len(curve) != 3 or any(name not in ParameterSweep.Parameters + ParameterSweep.Metrics for name in curve):
+    errorExit("Invalid curve \"%s\", expected x:y:series of parameters and metrics" % (args.curve))
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+sweep=None
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+
+    workload=TransferWorkload(args.tps) if args.workload == "transfers" else IdleWorkload()
+    sweep=ParameterSweep(grid, workload, walletMgr, measureSeconds=args.measure_seconds, warmupSeconds=args.warmup_seconds, killAll=killAll)
+    Print("Sweeping %d points" % (len(sweep.points())))
+    sweep.run()
+
+    Print(Utils.FileDivider)
+    sweep.printTable()
+    Print(Utils.FileDivider)
+    sweep.printCurve(*curve)
+    sweep.writeCsv(args.csv)
+    Print("Sweep written to %s" % (args.csv))
+
+    testSuccessful=True
+
+finally:
+    if sweep is not None and sweep.cluster is not None:
+        cluster=sweep.cluster
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
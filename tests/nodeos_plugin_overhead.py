@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from ParameterSweep import TransferWorkload
+from ResourceSampler import ResourceSampler
+from NodeLog import NodeLog
+
+import collections
+import datetime
+import json
+import re
+import signal
+import threading
+import time
+
+###############################################################
+# nodeos_plugin_overhead
+#
+#  Plugin overhead matrix.  A producer (node 0) and a relay (node 1) run the same pre-signed transfer workload of
+#  <--tps> for <--duration> seconds, pushed to the relay, once without extra plugins and once for every plugin of
+#  <--plugins> on every role of <--roles>, each run on a fresh cluster.  Once the workload is set up both nodes are
+#  restarted for the measurement, so every run measures nodes with the same uptime.  Per run it measures
+#    acceptedTps        - transfers per second the relay accepted into its speculative state
+#    produceOffsetP50/90 - when the producer produced its blocks relative to their slot, the "Produced block" log time
+#                          minus the block timestamp in ms
+#    rssMb              - peak resident memory of the node carrying the plugin
+#    diskWriteMbPerSec  - bytes that node caused to be written to storage (/proc/<pid>/io write_bytes) per second
+#  and reports, per role and plugin, the marginal cost: the difference to the same node in the baseline run.
+#
+#  The launcher always loads history_api_plugin (and so history_plugin) on every node and Cluster.launch records every
+#  action with --filter-on *, which the setup of the workload relies on (cleos get transaction).  The restart before
+#  the measurement drops --filter-on, so the baseline and the other plugins run without history recording, and the
+#  "history" entry restarts the node of its role with --filter-on * again: it measures turning on the recording of
+#  the history_plugin.  mongo_db needs a mongod at <--mongodb-uri> and is not in the default matrix.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+PluginArgs={
+    "history": "--filter-on *",
+    "state_history": "--plugin eosio::state_history_plugin --trace-history --chain-state-history --disable-replay-opts",
+    "trace_api": "--plugin eosio::trace_api_plugin --trace-no-abis",
+    "mongo_db": "--plugin eosio::mongo_db_plugin --mongodb-wipe --mongodb-uri %s",
+    "txn_test_gen": "--plugin eosio::txn_test_gen_plugin --txn-test-gen-account-prefix txntestacct"
+}
+Roles={"producer": 0, "relay": 1}
+Metrics=["acceptedTps", "produceOffsetP50", "produceOffsetP90", "rssMb", "diskWriteMbPerSec"]
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--plugins", type=str, help="Comma separated plugins of %s" % (",".join(PluginArgs)), default="history,state_history,trace_api,txn_test_gen")
+extraArgs = appArgs.add(flag="--roles", type=str, help="Comma separated roles of %s" % (",".join(Roles)), default="producer,relay")
+extraArgs = appArgs.add(flag="--tps", type=int, help="Transfers per second pushed to the relay", default=500)
+extraArgs = appArgs.add(flag="--duration", type=int, help="Seconds of workload per run", default=30)
+extraArgs = appArgs.add(flag="--mongodb-uri", type=str, help="mongodb uri for the mongo_db plugin", default="mongodb://localhost:27017/EOStest")
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the matrix to", default="plugin_overhead.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+plugins=args.plugins.split(",")
+roles=args.roles.split(",")
+for plugin in plugins:
+    if plugin not in PluginArgs:
+        errorExit("Unknown plugin %s, expected one of %s" % (plugin, ",".join(PluginArgs)))
+for role in roles:
+    if role not in Roles:
+        errorExit("Unknown role %s, expected one of %s" % (role, ",".join(Roles)))
+
+def pluginArgs(plugin):
+    return PluginArgs[plugin] % (args.mongodb_uri) if plugin == "mongo_db" else PluginArgs[plugin]
+
+ProducedBlockPattern=re.compile(r"^\S+\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}) .*Produced block [0-9a-f]+\.\.\. #(\d+) @ (\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}) ")
+LogTimeFormat="%Y-%m-%dT%H:%M:%S.%f"
+
+def produceOffsets(nodeId, firstBlockNum, lastBlockNum):
+    """Log time minus block timestamp in ms of the blocks between firstBlockNum and lastBlockNum node nodeId produced."""
+    offsets=[]
+    for line in NodeLog.readLines(nodeId):
+        match=ProducedBlockPattern.search(line)
+        if match is None or not firstBlockNum <= int(match.group(2)) <= lastBlockNum:
+            continue
+        logged=datetime.datetime.strptime(match.group(1), LogTimeFormat)
+        blockTime=datetime.datetime.strptime(match.group(3), LogTimeFormat)
+        offsets.append((logged - blockTime).total_seconds() * 1000)
+    return offsets
+
+HistoryFilterPattern=re.compile(r"\s--filter-on\s+\S+")
+
+def restartNode(node, nodeId, historyFilter):
+    """Restart node without the --filter-on of Cluster.launch, with --filter-on * if historyFilter."""
+    if not node.kill(signal.SIGTERM):
+        errorExit("Failed to stop node %d" % (nodeId))
+    node.cmd=HistoryFilterPattern.sub("", node.cmd)
+    if not node.relaunch(nodeId, cachePopen=True, addSwapFlags={"--filter-on": "*"} if historyFilter else None):
+        errorExit("Failed to relaunch node %d" % (nodeId))
+
+def sampleRss(nodes, peaks, stopEvent):
+    while not stopEvent.is_set():
+        for role, node in nodes.items():
+            usage=ResourceSampler.readProcess(node.pid)
+            if usage is not None:
+                peaks[role]=max(peaks.get(role, 0), usage["rssKb"])
+        stopEvent.wait(0.5)
+
+def runConfiguration(name, role=None, plugin=None):
+    """Launch a fresh producer and relay, plugin on the node of role, run the workload and return the metrics of both
+    nodes by role. Without plugin it is the baseline."""
+    global cluster
+    Print("Run %s" % (name))
+    specificExtraNodeosArgs={Roles[role]: pluginArgs(plugin)} if plugin is not None and plugin != "history" else None
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+    # a Cluster only launches once
+    cluster=Cluster(walletd=True)
+    cluster.setWalletMgr(walletMgr)
+    if cluster.launch(pnodes=1, totalNodes=2, prodCount=1, topo="mesh", useBiosBootFile=False, specificExtraNodeosArgs=specificExtraNodeosArgs,
+                      loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster for %s." % (name))
+    nodes={role: cluster.getNode(nodeId) for role, nodeId in Roles.items()}
+    workload=TransferWorkload(args.tps, corpusPath="plugin_overhead.trx")
+    workload.prepare(cluster, args.duration)
+    for nodeRole, node in nodes.items():
+        restartNode(node, Roles[nodeRole], plugin == "history" and nodeRole == role)
+
+    ioStart={role: ResourceSampler.readProcess(node.pid) for role, node in nodes.items()}
+    peaks={}
+    stopEvent=threading.Event()
+    sampler=threading.Thread(target=sampleRss, args=(nodes, peaks, stopEvent), daemon=True)
+    firstBlockNum=nodes["producer"].getHeadBlockNum() + 1
+    start=time.perf_counter()
+    sampler.start()
+    extra=workload.run([nodes["relay"]], args.duration)
+    stopEvent.set()
+    sampler.join()
+    elapsed=time.perf_counter() - start
+    lastBlockNum=nodes["producer"].getHeadBlockNum()
+    ioEnd={role: ResourceSampler.readProcess(node.pid) for role, node in nodes.items()}
+
+    offsets=Utils.percentiles(produceOffsets(Roles["producer"], firstBlockNum, lastBlockNum))
+    metrics={}
+    for role in Roles:
+        written=ioEnd[role]["writeBytes"] - ioStart[role]["writeBytes"] if all(usage is not None and "writeBytes" in usage for usage in (ioStart[role], ioEnd[role])) else None
+        metrics[role]={
+            "acceptedTps": extra["acceptedTps"],
+            "produceOffsetP50": offsets[50] if offsets is not None else None,
+            "produceOffsetP90": offsets[90] if offsets is not None else None,
+            "rssMb": peaks[role] / 1024 if role in peaks else None,
+            "diskWriteMbPerSec": written / elapsed / (1024 * 1024) if written is not None else None
+        }
+    Print("  %s" % (", ".join("%s=%s" % (metric, formatValue(metrics[measuredRole("relay", metric)][metric]))
+                              for metric in Metrics)))
+    return metrics
+
+def measuredRole(role, metric):
+    """Production timing is always a property of the producer, the other metrics of the node carrying the plugin."""
+    return "producer" if metric.startswith("produce") else role
+
+def marginal(metrics, baseline, role, metric):
+    value=metrics[measuredRole(role, metric)][metric]
+    base=baseline[measuredRole(role, metric)][metric]
+    return value - base if value is not None and base is not None else None
+
+def formatValue(value):
+    return "%.2f" % (value) if value is not None else "n/a"
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+
+    baseline=runConfiguration("baseline")
+    matrix=collections.OrderedDict()
+    for role in roles:
+        for plugin in plugins:
+            metrics=runConfiguration("%s on %s" % (plugin, role), role, plugin)
+            matrix["%s/%s" % (role, plugin)]={
+                "role": role,
+                "plugin": plugin,
+                "nodeosArgs": pluginArgs(plugin),
+                "metrics": metrics,
+                "marginal": {metric: marginal(metrics, baseline, role, metric) for metric in Metrics}
+            }
+
+    Print(Utils.FileDivider)
+    Print("Marginal cost of each plugin, difference to the baseline (acceptedTps: lower is worse, others: higher is worse)")
+    Print("%-24s %s" % ("role/plugin", " ".join("%18s" % (metric) for metric in Metrics)))
+    Print("%-24s %s" % ("baseline producer", " ".join("%18s" % (formatValue(baseline["producer"][metric])) for metric in Metrics)))
+    Print("%-24s %s" % ("baseline relay", " ".join("%18s" % (formatValue(baseline["relay"][metric])) for metric in Metrics)))
+    for key, entry in matrix.items():
+        Print("%-24s %s" % (key, " ".join("%18s" % (formatValue(entry["marginal"][metric])) for metric in Metrics)))
+    with open(args.output, "w") as f:
+        json.dump({"baseline": baseline, "matrix": matrix}, f, indent=2)
+    Print("Matrix written to %s" % (args.output))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
@@ -6,6 +6,7 @@ from Cluster import Cluster
 from WalletMgr import WalletMgr
 from Node import Node
 from TestHelper import TestHelper
+from ProductionTimeline import ProductionTimeline
 
 import time
 import decimal
@@ -17,23 +18,6 @@ import re
 # --dump-error-details <Upon error print etc/eosio/node_*/config.ini and var/lib/node_*/stderr.log to stdout>
 # --keep-logs <Don't delete var/lib/node_* folders upon test completion>
 ###############################################################
-def isValidBlockProducer(prodsActive, blockNum, node):
-    blockProducer=node.getBlockProducerByNum(blockNum)
-    if blockProducer not in prodsActive:
-        return False
-    return prodsActive[blockProducer]
-
-def validBlockProducer(prodsActive, prodsSeen, blockNum, node):
-    blockProducer=node.getBlockProducerByNum(blockNum)
-    if blockProducer not in prodsActive:
-        Utils.cmdError("unexpected block producer %s at blockNum=%s" % (blockProducer,blockNum))
-        Utils.errorExit("Failed because of invalid block producer")
-    if not prodsActive[blockProducer]:
-        Utils.cmdError("block producer %s for blockNum=%s not elected, belongs to node %s" % (blockProducer, blockNum, ProducerToNode.map[blockProducer]))
-        Utils.errorExit("Failed because of incorrect block producer")
-    prodsSeen[blockProducer]=True
-    return blockProducer
-
 def setProds(sharedProdKey):
     setProdsStr='{"schedule": ['
     firstTime=True
@@ -62,88 +46,55 @@ def verifyProductionRounds(trans, node, prodsActive, rounds):
     temp=Utils.Debug
     Utils.Debug=False
     Utils.Print("FIND VALID BLOCK PRODUCER")
-    blockProducer=node.getBlockProducerByNum(blockNum)
-    lastBlockProducer=blockProducer
-    adjust=False
-    while not isValidBlockProducer(prodsActive, blockNum, node):
-        adjust=True
-        blockProducer=node.getBlockProducerByNum(blockNum)
-        if lastBlockProducer!=blockProducer:
-            Utils.Print("blockProducer=%s for blockNum=%s is for node=%s" % (blockProducer, blockNum, ProducerToNode.map[blockProducer]))
-        lastBlockProducer=blockProducer
-        blockNum+=1
+    activeProds=[prod for prod in prodsActive if prodsActive[prod]]
+    # start one block early, so the timeline knows that blockNum starts a new producer's turn
+    timeline=ProductionTimeline(node, blockNum-1)
+    startingFrom=timeline.waitForCleanRoundStart(activeProds)
+    if startingFrom is None:
+        Utils.cmdError("no elected producer produced a full set of 12 blocks from blockNum %s: %s" % (blockNum, timeline.describe(blockNum)))
+        Utils.errorExit("Failed to find a valid block producer")
+    for runBlockNum, blockProducer in timeline.unexpectedProducers(activeProds, blockNum, startingFrom-1):
+        Utils.Print("blockProducer=%s for blockNum=%s is not elected" % (blockProducer, runBlockNum))
 
     Utils.Print("VALID BLOCK PRODUCER")
-    saw=0
-    sawHigh=0
-    startingFrom=blockNum
-    doPrint=0
-    invalidCount=0
-    while adjust:
-        invalidCount+=1
-        if lastBlockProducer==blockProducer:
-            saw+=1
-        else:
-            if saw>=12:
-                startingFrom=blockNum
-                if saw>12:
-                    Utils.Print("ERROR!!!!!!!!!!!!!!      saw=%s, blockProducer=%s, blockNum=%s" % (saw,blockProducer,blockNum))
-                break
-            else:
-                if saw > sawHigh:
-                    sawHigh = saw
-                    Utils.Print("sawHigh=%s" % (sawHigh))
-                if doPrint < 5:
-                    doPrint+=1
-                    Utils.Print("saw=%s, blockProducer=%s, blockNum=%s" % (saw,blockProducer,blockNum))
-                lastBlockProducer=blockProducer
-                saw=1
-        blockProducer=node.getBlockProducerByNum(blockNum)
-        blockNum+=1
-
-    if adjust:
-        blockNum-=1
-
-    Utils.Print("ADJUSTED %s blocks" % (invalidCount-1))
-
-    prodsSeen=None
-    reportFirstMissedBlock=False
+    Utils.Print("ADJUSTED %s blocks" % (startingFrom-blockNum))
+
     Utils.Print("Verify %s complete rounds of all producers producing" % (rounds))
+    prodsSize=len(prodsActive)
+    roundBlocks=prodsSize*ProductionTimeline.BlocksPerProducer
+    lastBlockNum=startingFrom+rounds*roundBlocks-1
+    timeline.extendTo(lastBlockNum)
+
+    for runBlockNum, blockProducer in timeline.unexpectedProducers(activeProds, startingFrom, lastBlockNum):
+        if blockProducer not in prodsActive:
+            Utils.cmdError("unexpected block producer %s at blockNum=%s" % (blockProducer,runBlockNum))
+            Utils.errorExit("Failed because of invalid block producer")
+        Utils.cmdError("block producer %s for blockNum=%s not elected" % (blockProducer, runBlockNum))
+        Utils.errorExit("Failed because of incorrect block producer")
 
-    prodsSize = len(prodsActive)
-    for i in range(0, rounds):
-        prodsSeen={}
-        lastBlockProducer=None
-        for j in range(0, prodsSize):
-            # each new set of 12 blocks should have a different blockProducer 
-            if lastBlockProducer is not None and lastBlockProducer==node.getBlockProducerByNum(blockNum):
-                Utils.cmdError("expected blockNum %s to be produced by any of the valid producers except %s" % (blockNum, lastBlockProducer))
-                Utils.errorExit("Failed because of incorrect block producer order")
-
-            # make sure that the next set of 12 blocks all have the same blockProducer
-            lastBlockProducer=node.getBlockProducerByNum(blockNum)
-            for k in range(0, 12):
-                blockProducer = validBlockProducer(prodsActive, prodsSeen, blockNum, node1)
-                if lastBlockProducer!=blockProducer:
-                    if not reportFirstMissedBlock:
-                        printStr=""
-                        newBlockNum=blockNum-18
-                        for l in range(0,36):
-                            printStr+="%s" % (newBlockNum)
-                            printStr+=":"
-                            newBlockProducer=node.getBlockProducerByNum(newBlockNum)
-                            printStr+="%s" % (newBlockProducer)
-                            printStr+="  "
-                            newBlockNum+=1
-                        Utils.Print("NOTE: expected blockNum %s (started from %s) to be produced by %s, but produded by %s: round=%s, prod slot=%s, prod num=%s - %s" % (blockNum, startingFrom, lastBlockProducer, blockProducer, i, j, k, printStr))
-                    reportFirstMissedBlock=True
-                    break
-                blockNum+=1
-
-    # make sure that we have seen all 21 producers
-    prodsSeenKeys=prodsSeen.keys()
-    if len(prodsSeenKeys) != prodsSize:
-        Utils.cmdError("only saw %s producers of expected %d. At blockNum %s only the following producers were seen: %s" % (len(prodsSeenKeys), prodsSize, blockNum, ",".join(prodsSeenKeys)))
+    # each new set of 12 blocks should have a different blockProducer
+    for violationBlockNum, blockProducer, desc in timeline.repeatProducerViolations(startingFrom, lastBlockNum):
+        Utils.cmdError("expected blockNum %s to be produced by any of the valid producers except %s, which %s" % (violationBlockNum, blockProducer, desc))
+        Utils.errorExit("Failed because of incorrect block producer order")
+
+    # every producer gets one set per round (slot timing can make a producer come around early, so only note it)
+    for violationBlockNum, blockProducer, desc in timeline.earlyTurnViolations(prodsSize, startingFrom, lastBlockNum):
+        Utils.Print("NOTE: expected blockNum %s (started from %s) to be produced by any of the valid producers except %s, which %s" % (violationBlockNum, startingFrom, blockProducer, desc))
+
+    # a producer's set of 12 blocks should not be cut short (the final set can be truncated by the end of the range)
+    shortSets=[(runBlockNum, count, blockProducer) for runBlockNum, count, blockProducer in timeline.runs(startingFrom, lastBlockNum)
+               if count < ProductionTimeline.BlocksPerProducer and runBlockNum+count <= lastBlockNum]
+    if len(shortSets) > 0:
+        runBlockNum, count, blockProducer=shortSets[0]
+        missedBlockNum=runBlockNum+count
+        printStr=timeline.describe(max(missedBlockNum-18, timeline.firstBlockNum), min(missedBlockNum+17, lastBlockNum))
+        Utils.Print("NOTE: expected blockNum %s (started from %s) to be produced by %s, but produced by %s: missed slots=%s - %s" %
+                    (missedBlockNum, startingFrom, blockProducer, timeline.producer(missedBlockNum), timeline.missedSlots(startingFrom, lastBlockNum), printStr))
+
+    # make sure that we have seen all active producers
+    prodsSeen=timeline.producersIn(lastBlockNum-roundBlocks+1, lastBlockNum)
+    if len(prodsSeen)!=prodsSize:
+        Utils.cmdError("only saw %s producers of expected %d. At blockNum %s only the following producers were seen: %s" % (len(prodsSeen), prodsSize, lastBlockNum, ",".join(sorted(prodsSeen))))
         Utils.errorExit("Failed because of missing block producers")
 
     Utils.Debug=temp
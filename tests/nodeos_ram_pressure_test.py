@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from AccountFactory import AccountFactory
+from RamPressureWorkload import RamPressureWorkload
+
+import json
+
+###############################################################
+# nodeos_ram_pressure_test
+#
+#  Fast variant of nodeos_under_min_avail_ram.  A producer and <--nodes>-1 non-producing nodes run with
+#  --chain-state-db-size-mb <--state-db-mb> and --chain-state-db-guard-size-mb <--guard-mb>.  A RamPressureWorkload
+#  fills their chain state with batched integration_test::store actions at <--bytes-per-second> and stops when the
+#  first node has <--margin-mb> above the guard left, which is checked to be reached without any node going down.
+#  Then the workload pushes on until the nodes stop, all of them have to exit with a database guard_exception, and
+#  the nodes are relaunched with a larger chain state and have to produce and sync again.
+#
+#  The growth of the chain state of every node is written to <--output>.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+MB=1024 * 1024
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--nodes", type=int, help="Number of nodes, node 0 produces", default=2)
+extraArgs = appArgs.add(flag="--state-db-mb", type=int, help="--chain-state-db-size-mb of the nodes", default=1010)
+extraArgs = appArgs.add(flag="--guard-mb", type=int, help="--chain-state-db-guard-size-mb of the nodes", default=1002)
+extraArgs = appArgs.add(flag="--margin-mb", type=int, help="Free MB above the guard to stop filling at", default=2)
+extraArgs = appArgs.add(flag="--bytes-per-second", type=int, help="Chain state growth to aim for", default=RamPressureWorkload.DefaultBytesPerSecond)
+extraArgs = appArgs.add(flag="--accounts", type=int, help="Number of accounts storing", default=20)
+extraArgs = appArgs.add(flag="--store-num", type=int, help="uint64 values per stored row", default=1000)
+extraArgs = appArgs.add(flag="--actions-per-transaction", type=int, help="Store actions per transaction", default=RamPressureWorkload.DefaultActionsPerTransaction)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the chain state growth to", default="ram_pressure.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+def printResults(name, results):
+    Print("%s: stopped on %s after %.1f sec, %d of %d transactions accepted, %.0f bytes/action, %.0f bytes/sec, free MB %s" %
+          (name, results["reason"], results["seconds"], results["acceptedTransactions"], results["pushedTransactions"], results["bytesPerAction"],
+           results["bytesPerSecond"] or 0, ", ".join("%.2f" % (free / MB) if free is not None else "n/a" for free in results["endFreeBytes"])))
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+
+    extraNodeosArgs=" --plugin eosio::db_size_api_plugin --chain-state-db-guard-size-mb %d --chain-state-db-size-mb %d --http-max-response-time-ms 990000 " % \
+                    (args.guard_mb, args.state_db_mb)
+    if cluster.launch(pnodes=1, totalNodes=args.nodes, prodCount=1, topo="mesh", useBiosBootFile=False, extraNodeosArgs=extraNodeosArgs, loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster.")
+    nodes=cluster.getNodes()
+
+    # without eosio.system the accounts have unlimited ram
+    accounts=AccountFactory.createAccountKeys(args.accounts, prefix="ram")
+    walletMgr.importKeys(accounts, walletMgr.create("ignition"))
+    accountFactory=AccountFactory(nodes, cluster.eosioAccount)
+    if accountFactory.create(accounts) is None or not accountFactory.verify(accounts):
+        errorExit("Failed to create %d accounts" % (args.accounts))
+    contractAccount=AccountFactory.createAccountKeys(1, prefix="ramstore")[0]
+    walletMgr.importKey(contractAccount, walletMgr.create("ignition"))
+    nodes[0].createAccount(contractAccount, cluster.eosioAccount, stakedDeposit=0, waitForTransBlock=True, exitOnError=True)
+    if nodes[0].publishContract(contractAccount.name, "unittests/test-contracts/integration_test", "integration_test.wasm", "integration_test.abi",
+                                waitForTransBlock=True) is None:
+        errorExit("Failed to publish integration_test contract.")
+
+    workload=RamPressureWorkload(nodes, contractAccount.name, accounts, storeNum=args.store_num, actionsPerTransaction=args.actions_per_transaction,
+                                 bytesPerSecond=args.bytes_per_second)
+    stopFreeBytes=(args.guard_mb + args.margin_mb) * MB
+    Print("Fill chain state up to %d MB free" % (args.guard_mb + args.margin_mb))
+    fill=workload.run(stopFreeBytes=stopFreeBytes)
+    printResults("Fill", fill)
+    if fill["reason"] != RamPressureWorkload.Threshold:
+        errorExit("Filling stopped on %s before reaching %d MB free" % (fill["reason"], args.guard_mb + args.margin_mb))
+    for nodeId, free in enumerate(fill["endFreeBytes"]):
+        # stopped within one action of the threshold, still above the guard
+        if free < args.guard_mb * MB or free >= stopFreeBytes + 2 * workload.bytesPerAction:
+            errorExit("Node %d has %d bytes free, expected just above %d" % (nodeId, free, stopFreeBytes))
+
+    Print("Push past the guard")
+    exhaust=workload.run(stopFreeBytes=0, timeout=120)
+    printResults("Exhaust", exhaust)
+    if not Utils.waitForBool(lambda: not any(node.verifyAlive(silent=True) for node in nodes), timeout=60):
+        errorExit("Failure - All nodes should have exited at the guard")
+    for nodeId in range(len(nodes)):
+        with open(Utils.getNodeDataDir(nodeId) + "/stderr.txt", "r") as f:
+            if f.read().find("database chain::guard_exception") == -1:
+                errorExit("Node%d is expected to exit because of database guard_exception, but was not." % (nodeId))
+    Print("all nodes exited with expected reason database_guard_exception")
+
+    Print("relaunch nodes with new capacity")
+    for nodeId in reversed(range(len(nodes))):
+        addSwapFlags={"--chain-state-db-size-mb": str(args.state_db_mb + 30)}
+        if nodeId == 0:
+            addSwapFlags["--enable-stale-production"]=""
+        if not nodes[nodeId].relaunch(nodeId, "", newChain=False, addSwapFlags=addSwapFlags):
+            errorExit("Failure - Node %d should have restarted" % (nodeId))
+    headBlockNum=nodes[0].getHeadBlockNum()
+    for nodeId, node in enumerate(nodes):
+        if not node.waitForBlock(headBlockNum + 2, timeout=30):
+            errorExit("Failure - Node %d should have advanced past block %d" % (nodeId, headBlockNum + 2))
+
+    with open(args.output, "w") as f:
+        json.dump({"fill": fill, "exhaust": exhaust, "samples": workload.samples}, f, indent=1)
+    Print("Chain state growth written to %s" % (args.output))
+
+    testSuccessful=True
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
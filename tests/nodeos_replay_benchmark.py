@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from BlockLog import BlockLog
+from ParameterSweep import TransferWorkload
+from ResourceSampler import ResourceSampler
+
+import datetime
+import json
+import os
+import re
+import shutil
+import signal
+import threading
+import time
+
+###############################################################
+# nodeos_replay_benchmark
+#
+#  Replay throughput of the chain sync strategies.  Node 0 serves a fixed block log fixture and node 1 is brought
+#  from it to node 0's head once per strategy of <--strategies> and per nodeos version label of <--versions>:
+#    none       - restart over the state left by a completed replay
+#    replay     - --replay-blockchain, state rebuilt from the fixture block log
+#    hardReplay - --hard-replay-blockchain, block log recovered and state rebuilt
+#    resync     - --delete-all-blocks, every block fetched from node 0 over p2p (genesis from the fixture)
+#    snapshot   - empty node started from a snapshot node 0 creates at its head (--snapshot), rest over p2p
+#  The fixture is the blocks directory of <--fixture>, or when none is given a chain filled with <--tps> transfers
+#  for <--fill-seconds> seconds in the launched cluster.  A fixture of another chain is first hard replayed by node 0.
+#
+#  Per run it measures the wall time from launch until node 1's head reaches node 0's head at launch, blocks/s over
+#  time (the "<n> of <head>" replay progress lines of the log while http is not up yet, get_info afterwards), peak
+#  RSS and the bytes node 1 read from and wrote to storage, and prints a comparison table.  Version labels other
+#  than "current" come from <--alternate-version-labels-file>.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+Strategies=[Utils.SyncNoneTag, Utils.SyncReplayTag, Utils.SyncHardReplayTag, Utils.SyncResyncTag, "snapshot"]
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--fixture", type=str, help="blocks directory to replay, a chain is generated when not given", default=None)
+extraArgs = appArgs.add(flag="--strategies", type=str, help="Comma separated strategies of %s" % (",".join(Strategies)), default=",".join(Strategies))
+extraArgs = appArgs.add(flag="--versions", type=str, help="Comma separated nodeos version labels", default="current")
+extraArgs = appArgs.add(flag="--tps", type=int, help="Transfers per second filling a generated fixture", default=200)
+extraArgs = appArgs.add(flag="--fill-seconds", type=int, help="Seconds of transfers filling a generated fixture", default=60)
+extraArgs = appArgs.add(flag="--sample-interval", type=float, help="Seconds between get_info and /proc samples", default=0.5)
+extraArgs = appArgs.add(flag="--timeout", type=int, help="Seconds a run may take to reach head", default=1800)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the comparison to", default="replay_benchmark.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port","--alternate-version-labels-file"},
+                             applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+strategies=args.strategies.split(",")
+versions=args.versions.split(",")
+for strategy in strategies:
+    if strategy not in Strategies:
+        errorExit("Unknown strategy %s, expected one of %s" % (strategy, ",".join(Strategies)))
+
+ReplayProgressPattern=re.compile(r"^\S+\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}) .*\] (\d+) of (\d+)$")
+ReplayedPattern=re.compile(r"replayed \d+ blocks in \d+ seconds, ([\d.]+) ms/block")
+SnapshotLoadedPattern=re.compile(r"^\S+\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}) .*Finished initialization from snapshot")
+LogTimeFormat="%Y-%m-%dT%H:%M:%S.%f"
+
+def sampleRun(node, target, samples, start, stopEvent):
+    """Sample node 1 until it reaches target or stopEvent is set. node.pid is only known once launchCmd ran."""
+    while not stopEvent.is_set():
+        elapsed=time.perf_counter() - start
+        usage=ResourceSampler.readProcess(node.pid) if node.pid is not None else None
+        if usage is not None:
+            samples["readBytes"], samples["writeBytes"]=usage.get("readBytes", 0), usage.get("writeBytes", 0)
+            samples["peakRssKb"]=max(samples["peakRssKb"], usage["rssKb"])
+        info=node.processUrllibRequest("chain", "get_info", silentErrors=True, timeout=1) if node.pid is not None else None
+        if info is not None:
+            samples["heads"].append((elapsed, info["head_block_num"]))
+            if info["head_block_num"] >= target:
+                samples["reachedSeconds"]=elapsed
+                return
+        stopEvent.wait(args.sample_interval)
+
+def latestStderr(nodeId):
+    dataDir=Utils.getNodeDataDir(nodeId)
+    files=[os.path.join(dataDir, entry) for entry in os.listdir(dataDir) if re.match(r"stderr\..+\.txt", entry)]
+    return max(files, key=os.path.getmtime)
+
+def logProgress(stderrFile, launchUtc):
+    """Replay progress (seconds since launch, block num) from the log, the replay ms/block nodeos reported and the
+    seconds until a snapshot was loaded."""
+    progress=[]
+    msPerBlock=None
+    snapshotSeconds=None
+    with open(stderrFile, "r") as f:
+        for line in f:
+            match=ReplayProgressPattern.search(line.rstrip())
+            if match is not None:
+                logged=datetime.datetime.strptime(match.group(1), LogTimeFormat)
+                progress.append(((logged - launchUtc).total_seconds(), int(match.group(2))))
+                continue
+            match=ReplayedPattern.search(line)
+            if match is not None:
+                msPerBlock=float(match.group(1))
+                continue
+            match=SnapshotLoadedPattern.search(line)
+            if match is not None:
+                snapshotSeconds=(datetime.datetime.strptime(match.group(1), LogTimeFormat) - launchUtc).total_seconds()
+    return progress, msPerBlock, snapshotSeconds
+
+def timeline(points):
+    """Blocks/s between consecutive (seconds, block num) points."""
+    rates=[]
+    for (t0, b0), (t1, b1) in zip(points, points[1:]):
+        if t1 > t0 and b1 >= b0:
+            rates.append({"seconds": round(t1, 3), "blockNum": b1, "blocksPerSecond": (b1 - b0) / (t1 - t0)})
+    return rates
+
+def nodeosPath(version):
+    if version == "current":
+        return None
+    path=cluster.alternateVersionLabels.get(version)
+    if path is None:
+        errorExit("Version label %s is not in %s" % (version, args.alternate_version_labels_file))
+    return os.path.join(path, "programs/nodeos/nodeos")
+
+def stop(node, nodeId):
+    if node.pid is not None and not node.kill(signal.SIGTERM):
+        errorExit("Failed to stop node %d" % (nodeId))
+
+def resetChain(nodeId, fixtureDir=None):
+    """Remove the blocks and state of node nodeId, then give it a copy of the fixture blocks when fixtureDir is set."""
+    for subDir in ("blocks", "state"):
+        path=Utils.getNodeDataDir(nodeId, subDir)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    if fixtureDir is not None:
+        BlockLog.cloneBlocksDir(fixtureDir, Utils.getNodeDataDir(nodeId, "blocks"))
+
+def relaunch(node, nodeId, chainArg, version, addSwapFlags=None, timeout=None):
+    """Relaunch with chainArg, the node keeps its original command for later relaunches."""
+    cmd=node.cmd
+    if not node.relaunch(nodeId, chainArg=chainArg, timeout=args.timeout if timeout is None else timeout, addSwapFlags=addSwapFlags, cachePopen=True,
+                         nodeosPath=nodeosPath(version), pulseInterval=args.sample_interval):
+        errorExit("Failed to relaunch node %d with %s" % (nodeId, chainArg))
+    node.cmd=cmd
+
+def generateFixture(node0, node1):
+    """Fill the launched chain with transfers and keep node 1's blocks directory as the fixture."""
+    workload=TransferWorkload(args.tps, corpusPath="replay_fixture.trx")
+    workload.prepare(cluster, args.fill_seconds)
+    Print("Fill the fixture chain with %d transfers/s for %d seconds" % (args.tps, args.fill_seconds))
+    workload.run([node0], args.fill_seconds)
+    # waitForBlock waits for a head above blockNum
+    if not node1.waitForBlock(node0.getHeadBlockNum() - 1, timeout=args.timeout):
+        errorExit("Node 1 did not sync the fixture chain")
+    stop(node1, 1)
+    fixtureDir=Utils.getNodeDataDir(1, "fixture")
+    BlockLog.cloneBlocksDir(Utils.getNodeDataDir(1, "blocks"), fixtureDir)
+    return fixtureDir
+
+def serveFixture(node0, fixtureDir):
+    """Bring node 0 onto the chain of an external fixture."""
+    Print("Hard replay fixture %s on node 0" % (fixtureDir))
+    stop(node0, 0)
+    resetChain(0, fixtureDir)
+    relaunch(node0, 0, "--hard-replay-blockchain", "current")
+
+def runStrategy(node0, node1, strategy, version, fixtureDir, genesisFile):
+    Print("Run %s with nodeos %s" % (strategy, version))
+    stop(node1, 1)
+    chainArg=None
+    addSwapFlags=None
+    startBlockNum=0
+    if strategy == Utils.SyncNoneTag:
+        resetChain(1, fixtureDir)
+        relaunch(node1, 1, "--replay-blockchain", version)
+        if not node1.waitForBlock(node0.getHeadBlockNum() - 1, timeout=args.timeout):
+            errorExit("Node 1 did not complete the replay preceding the restart")
+        startBlockNum=node1.getHeadBlockNum()
+        stop(node1, 1)
+    elif strategy == "snapshot":
+        snapshot=node0.createSnapshot()
+        if snapshot is None or "snapshot_name" not in snapshot:
+            errorExit("Failed to create snapshot: %s" % (snapshot))
+        resetChain(1)
+        chainArg="--snapshot %s" % (snapshot["snapshot_name"])
+        startBlockNum=snapshot["head_block_num"]
+    elif strategy == Utils.SyncResyncTag:
+        resetChain(1)
+        chainArg=Utils.getChainStrategies()[strategy].arg
+        addSwapFlags={"--genesis-json": genesisFile}
+    else:
+        resetChain(1, fixtureDir)
+        chainArg=Utils.getChainStrategies()[strategy].arg
+
+    target=node0.getHeadBlockNum()
+    samples={"heads": [], "peakRssKb": 0, "readBytes": None, "writeBytes": None, "reachedSeconds": None}
+    stopEvent=threading.Event()
+    launchUtc=datetime.datetime.utcnow()
+    start=time.perf_counter()
+    sampler=threading.Thread(target=sampleRun, args=(node1, target, samples, start, stopEvent), daemon=True)
+    sampler.start()
+    relaunch(node1, 1, chainArg, version, addSwapFlags)
+    sampler.join(timeout=max(0, args.timeout - (time.perf_counter() - start)))
+    stopEvent.set()
+    sampler.join()
+    if samples["reachedSeconds"] is None:
+        errorExit("Node 1 did not reach block %d within %d seconds with %s" % (target, args.timeout, strategy))
+    if strategy == "snapshot":
+        os.remove(snapshot["snapshot_name"])
+
+    progress, msPerBlock, snapshotSeconds=logProgress(latestStderr(1), launchUtc)
+    wallSeconds=samples["reachedSeconds"]
+    return {
+        "strategy": strategy,
+        "version": version,
+        "targetBlockNum": target,
+        "startBlockNum": startBlockNum,
+        "wallSeconds": wallSeconds,
+        "blocksPerSecond": (target - startBlockNum) / wallSeconds,
+        "replayMsPerBlock": msPerBlock,
+        "snapshotLoadSeconds": snapshotSeconds,
+        "peakRssMb": samples["peakRssKb"] / 1024,
+        "readMb": samples["readBytes"] / (1024 * 1024) if samples["readBytes"] is not None else None,
+        "writtenMb": samples["writeBytes"] / (1024 * 1024) if samples["writeBytes"] is not None else None,
+        "timeline": timeline(sorted(progress + samples["heads"]))
+    }
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.setAlternateVersionLabels(args.alternate_version_labels_file)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+    Print("Stand up cluster")
+    if cluster.launch(pnodes=1, totalNodes=2, prodCount=1, topo="mesh", useBiosBootFile=False, loadSystemContract=False,
+                      specificExtraNodeosArgs={0: "--plugin eosio::producer_api_plugin"}) is False:
+        errorExit("Failed to stand up eos cluster.")
+    node0=cluster.getNode(0)
+    node1=cluster.getNode(1)
+
+    if args.fixture is None:
+        fixtureDir=generateFixture(node0, node1)
+    else:
+        fixtureDir=args.fixture
+        serveFixture(node0, fixtureDir)
+    fixture=BlockLog(fixtureDir)
+    Print("Fixture %s holds blocks %d through %d" % (fixtureDir, fixture.firstBlockNum, fixture.lastBlockNum))
+    genesisFile=None
+    if Utils.SyncResyncTag in strategies:
+        # --delete-all-blocks removes the block log the genesis state would otherwise come from
+        genesisFile=fixture.extractGenesis(Utils.getNodeDataDir(1, "fixture-genesis.json"))
+        if genesisFile is None:
+            errorExit("Failed to extract the genesis state of fixture %s" % (fixtureDir))
+
+    rows=[runStrategy(node0, node1, strategy, version, fixtureDir, genesisFile) for version in versions for strategy in strategies]
+
+    Print(Utils.FileDivider)
+    def cell(value, fmt="%12.1f"):
+        return fmt % (value) if value is not None else "%12s" % ("n/a")
+    Print("%-12s %-12s %12s %12s %12s %12s %12s %12s %12s" % ("version", "strategy", "blocks", "wall s", "blocks/s", "ms/block", "peak rss MB", "read MB", "written MB"))
+    for row in rows:
+        Print("%-12s %-12s %12d %s %s %s %s %s %s" % (row["version"], row["strategy"], row["targetBlockNum"] - row["startBlockNum"], cell(row["wallSeconds"]),
+              cell(row["blocksPerSecond"]), cell(row["replayMsPerBlock"], "%12.3f"), cell(row["peakRssMb"]), cell(row["readMb"]), cell(row["writtenMb"])))
+    with open(args.output, "w") as f:
+        json.dump({"fixture": {"path": fixtureDir, "firstBlockNum": fixture.firstBlockNum, "lastBlockNum": fixture.lastBlockNum}, "runs": rows}, f, indent=2)
+    Print("Comparison written to %s" % (args.output))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
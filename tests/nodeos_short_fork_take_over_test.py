@@ -8,6 +8,7 @@ from WalletMgr import WalletMgr
 from Node import BlockType
 from Node import Node
 from TestHelper import TestHelper
+from ForkAnalyzer import ForkAnalyzer
 
 import decimal
 import math
@@ -26,96 +27,6 @@ Print=Utils.Print
 
 from core_symbol import CORE_SYMBOL
 
-def analyzeBPs(bps0, bps1, expectDivergence):
-    start=0
-    index=None
-    length=len(bps0)
-    firstDivergence=None
-    errorInDivergence=False
-    analysysPass=0
-    bpsStr=None
-    bpsStr0=None
-    bpsStr1=None
-    while start < length:
-        analysysPass+=1
-        bpsStr=None
-        for i in range(start,length):
-            bp0=bps0[i]
-            bp1=bps1[i]
-            if bpsStr is None:
-                bpsStr=""
-            else:
-                bpsStr+=", "
-            blockNum0=bp0["blockNum"]
-            prod0=bp0["prod"]
-            blockNum1=bp1["blockNum"]
-            prod1=bp1["prod"]
-            numDiff=True if blockNum0!=blockNum1 else False
-            prodDiff=True if prod0!=prod1 else False
-            if numDiff or prodDiff:
-                index=i
-                if firstDivergence is None:
-                    firstDivergence=min(blockNum0, blockNum1)
-                if not expectDivergence:
-                    errorInDivergence=True
-                break
-            bpsStr+=str(blockNum0)+"->"+prod0
-
-        if index is None:
-            if expectDivergence:
-                errorInDivergence=True
-                break
-            return None
-
-        bpsStr0=None
-        bpsStr2=None
-        start=length
-        for i in range(index,length):
-            if bpsStr0 is None:
-                bpsStr0=""
-                bpsStr1=""
-            else:
-                bpsStr0+=", "
-                bpsStr1+=", "
-            bp0=bps0[i]
-            bp1=bps1[i]
-            blockNum0=bp0["blockNum"]
-            prod0=bp0["prod"]
-            blockNum1=bp1["blockNum"]
-            prod1=bp1["prod"]
-            numDiff="*" if blockNum0!=blockNum1 else ""
-            prodDiff="*" if prod0!=prod1 else ""
-            if not numDiff and not prodDiff:
-                start=i
-                index=None
-                if expectDivergence:
-                    errorInDivergence=True
-                break
-            bpsStr0+=str(blockNum0)+numDiff+"->"+prod0+prodDiff
-            bpsStr1+=str(blockNum1)+numDiff+"->"+prod1+prodDiff
-        if errorInDivergence:
-            break
-
-    if errorInDivergence:
-        msg="Failed analyzing block producers - "
-        if expectDivergence:
-            msg+="nodes do not indicate different block producers for the same blocks, but they are expected to diverge at some point."
-        else:
-            msg+="did not expect nodes to indicate different block producers for the same blocks."
-        msg+="\n  Matching Blocks= %s \n  Diverging branch node0= %s \n  Diverging branch node1= %s" % (bpsStr,bpsStr0,bpsStr1)
-        Utils.errorExit(msg)
-
-    return firstDivergence
-
-def getMinHeadAndLib(prodNodes):
-    info0=prodNodes[0].getInfo(exitOnError=True)
-    info1=prodNodes[1].getInfo(exitOnError=True)
-    headBlockNum=min(int(info0["head_block_num"]),int(info1["head_block_num"]))
-    libNum=min(int(info0["last_irreversible_block_num"]), int(info1["last_irreversible_block_num"]))
-    return (headBlockNum, libNum)
-
-
-
 args = TestHelper.parse_args({"--prod-count","--dump-error-details","--keep-logs","-v","--leave-running","--clean-run",
                               "--wallet-port"})
 Utils.Debug=args.v
@@ -183,6 +94,7 @@ try:
             prodNodes.append(node)
             producers.extend(node.producers)
 
+    forkAnalyzer=ForkAnalyzer(prodNodes)
 
     node=prodNodes[0]
     node1=prodNodes[1]
@@ -237,8 +149,6 @@ try:
     # will search full cycle after the current block, since we don't know how many blocks were produced since retrieving
     # block number and issuing kill command
     postKillBlockNum=prodNodes[1].getBlockNum()
-    blockProducers0=[]
-    blockProducers1=[]
     libs0=[]
     libs1=[]
     lastBlockNum=max([preKillBlockNum,postKillBlockNum])+2*maxActiveProducers*inRowCountPerProducer
@@ -246,20 +156,18 @@ try:
     prodChanged=False
     nextProdChange=False
     #identify the earliest LIB to start identify the earliest block to check if divergent branches eventually reach concensus
-    (headBlockNum, libNumAroundDivergence)=getMinHeadAndLib(prodNodes)
+    (headBlockNum, libNumAroundDivergence)=forkAnalyzer.getMinHeadAndLib()
     Print("Tracking block producers from %d till divergence or %d. Head block is %d and lowest LIB is %d" % (preKillBlockNum, lastBlockNum, headBlockNum, libNumAroundDivergence))
     transitionCount=0
     missedTransitionBlock=None
     for blockNum in range(preKillBlockNum,lastBlockNum):
         #avoiding getting LIB until my current block passes the head from the last time I checked
         if blockNum>headBlockNum:
-            (headBlockNum, libNumAroundDivergence)=getMinHeadAndLib(prodNodes)
+            (headBlockNum, libNumAroundDivergence)=forkAnalyzer.getMinHeadAndLib()
 
         # track the block number and producer from each producing node
         blockProducer0=prodNodes[0].getBlockProducerByNum(blockNum)
         blockProducer1=prodNodes[1].getBlockProducerByNum(blockNum)
-        blockProducers0.append({"blockNum":blockNum, "prod":blockProducer0})
-        blockProducers1.append({"blockNum":blockNum, "prod":blockProducer1})
 
         #in the case that the preKillBlockNum was also produced by killAtProducer, ensure that we have
         #at least one producer transition before checking for killAtProducer
@@ -297,12 +205,10 @@ try:
 
     Print("Analyzing the producers leading up to the block after killing the non-producing node, expecting divergence at %d" % (blockNum))
 
-    firstDivergence=analyzeBPs(blockProducers0, blockProducers1, expectDivergence=True)
+    firstDivergence=forkAnalyzer.analyze(preKillBlockNum, blockNum, expectDivergence=True, libAtDivergence=libNumAroundDivergence).forkBlockNum
     # Nodes should not have diverged till the last block
     if firstDivergence!=blockNum:
         Utils.errorExit("Expected to diverge at %s, but diverged at %s." % (firstDivergence, blockNum))
-    blockProducers0=[]
-    blockProducers1=[]
 
     for prodNode in prodNodes:
         info=prodNode.getInfo()
@@ -313,20 +219,13 @@ try:
 
     Print("Tracking the blocks from the divergence till there are 10*12 blocks on one chain and 10*12+1 on the other, from block %d to %d" % (killBlockNum, lastBlockNum))
 
-    for blockNum in range(killBlockNum,lastBlockNum):
-        blockProducer0=prodNodes[0].getBlockProducerByNum(blockNum)
-        blockProducer1=prodNodes[1].getBlockProducerByNum(blockNum)
-        blockProducers0.append({"blockNum":blockNum, "prod":blockProducer0})
-        blockProducers1.append({"blockNum":blockNum, "prod":blockProducer1})
-
-
     Print("Analyzing the producers from the divergence to the lastBlockNum and verify they stay diverged, expecting divergence at block %d" % (killBlockNum))
 
-    firstDivergence=analyzeBPs(blockProducers0, blockProducers1, expectDivergence=True)
+    report=forkAnalyzer.analyze(killBlockNum, lastBlockNum-1, expectDivergence=True, libAtDivergence=libNumAroundDivergence)
+    Print(report)
+    firstDivergence=report.forkBlockNum
     if firstDivergence!=killBlockNum:
         Utils.errorExit("Expected to diverge at %s, but diverged at %s." % (firstDivergence, killBlockNum))
-    blockProducers0=[]
-    blockProducers1=[]
 
     for prodNode in prodNodes:
         info=prodNode.getInfo()
@@ -383,28 +282,15 @@ try:
 
     Print("Identifying the producers from the saved LIB to the current highest head, from block %d to %d" % (libNumAroundDivergence, endBlockNum))
 
-    for blockNum in range(libNumAroundDivergence,endBlockNum):
-        blockProducer0=prodNodes[0].getBlockProducerByNum(blockNum)
-        blockProducer1=prodNodes[1].getBlockProducerByNum(blockNum)
-        blockProducers0.append({"blockNum":blockNum, "prod":blockProducer0})
-        blockProducers1.append({"blockNum":blockNum, "prod":blockProducer1})
-
-
     Print("Analyzing the producers from the saved LIB to the current highest head and verify they match now")
 
-    analyzeBPs(blockProducers0, blockProducers1, expectDivergence=False)
+    forkAnalyzer.analyze(libNumAroundDivergence, endBlockNum-1, expectDivergence=False)
 
-    resolvedKillBlockProducer=None
-    for prod in blockProducers0:
-        if prod["blockNum"]==killBlockNum:
-            resolvedKillBlockProducer = prod["prod"]
-    if resolvedKillBlockProducer is None:
-        Utils.errorExit("Did not find find block %s (the original divergent block) in blockProducers0, test setup is wrong.  blockProducers0: %s" % (killBlockNum, ", ".join(blockProducers)))
+    if not libNumAroundDivergence <= killBlockNum < endBlockNum:
+        Utils.errorExit("Block %s (the original divergent block) is not between the saved LIB %s and the current highest head %s, test setup is wrong." % (killBlockNum, libNumAroundDivergence, endBlockNum))
+    resolvedKillBlockProducer=prodNodes[0].getBlockProducerByNum(killBlockNum)
     Print("Fork resolved and determined producer %s for block %s" % (resolvedKillBlockProducer, killBlockNum))
 
-    blockProducers0=[]
-    blockProducers1=[]
-
     testSuccessful=True
 finally:
     TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
@@ -10,8 +10,10 @@ from Node import Node
 import signal
 from TestHelper import AppArgs
 from TestHelper import TestHelper
+from CatchupTracker import CatchupTracker
 
 import decimal
+import json
 import math
 import re
 
@@ -28,6 +30,15 @@ import re
 #  5) the node is allowed to catch up to the producing node
 #  3) Repeat steps 2-5, <--catchup-count - 1> more times
 #
+#  Every start and restart of a catchup node is instrumented with a CatchupTracker sampling its head and LIB every
+#  <--sample-interval-ms>: sync blocks/s, time to catch up with the producer's advancing head, zero progress windows
+#  of at least <--stall-seconds> and sync restarts.  Unless --leave-running, the logs of all nodes are parsed live
+#  (Cluster.startLogPipelines), the catchup nodes pipe their stderr through the NodeLog, which the sync restarts are
+#  taken from.  The scenario is run on a fresh cluster for every combination of <--sync-fetch-spans>
+#  (--sync-fetch-span of the catchup nodes) and <--peer-counts>, the number of running nodes a catchup node can sync
+#  from (producers, txn generators and plain relays making up the rest).  The default runs once, with a span of 100
+#  and no relays.  Medians per combination are printed and everything is written to <--output>.
+#
 ###############################################################
 
 Print=Utils.Print
@@ -38,6 +49,11 @@ from core_symbol import CORE_SYMBOL
 appArgs=AppArgs()
 extraArgs = appArgs.add(flag="--catchup-count", type=int, help="How many catchup-nodes to launch", default=10)
 extraArgs = appArgs.add(flag="--txn-gen-nodes", type=int, help="How many transaction generator nodes", default=2)
+extraArgs = appArgs.add(flag="--sync-fetch-spans", type=str, help="Comma separated --sync-fetch-span values of the catchup nodes", default="100")
+extraArgs = appArgs.add(flag="--peer-counts", type=str, help="Comma separated numbers of running peers of a catchup node, default producers plus txn generators", default="")
+extraArgs = appArgs.add(flag="--sample-interval-ms", type=int, help="Catchup node head/LIB sample interval", default=CatchupTracker.DefaultIntervalMs)
+extraArgs = appArgs.add(flag="--stall-seconds", type=float, help="Shortest zero progress window reported as a stall", default=CatchupTracker.DefaultStallSeconds)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the sync rates to", default="startup_catchup.json")
 args = TestHelper.parse_args({"--prod-count","--dump-error-details","--keep-logs","-v","--leave-running","--clean-run",
                               "-p","--wallet-port"}, applicationSpecificArgs=appArgs)
 Utils.Debug=args.v
@@ -51,7 +67,11 @@ prodCount=args.prod_count if args.prod_count > 1 else 2
 killAll=args.clean_run
 walletPort=args.wallet_port
 catchupCount=args.catchup_count if args.catchup_count > 0 else 1
-totalNodes=startedNonProdNodes+pnodes+catchupCount
+syncFetchSpans=[int(span) for span in args.sync_fetch_spans.split(",")]
+peerCounts=[int(count) for count in args.peer_counts.split(",")] if args.peer_counts else [pnodes+startedNonProdNodes]
+for peerCount in peerCounts:
+    if peerCount < pnodes+startedNonProdNodes:
+        errorExit("A peer count of %d is less than the %d producer and txn generator nodes" % (peerCount, pnodes+startedNonProdNodes))
 
 walletMgr=WalletMgr(True, port=walletPort)
 testSuccessful=False
@@ -61,20 +81,59 @@ killWallet=not dontKill
 WalletdName=Utils.EosWalletName
 ClientName="cleos"
 
-try:
-    TestHelper.printSystemInfo("BEGIN")
-    cluster.setWalletMgr(walletMgr)
+def lib(node):
+    return node.getBlockNum(BlockType.lib)
+
+def head(node):
+    return node.getBlockNum(BlockType.head)
 
+def waitForBlock(node, blockNum, blockType=BlockType.head, timeout=None, reportInterval=20):
+    if not node.waitForBlock(blockNum, timeout=timeout, blockType=blockType, reportInterval=reportInterval):
+        info=node.getInfo()
+        headBlockNum=info["head_block_num"]
+        libBlockNum=info["last_irreversible_block_num"]
+        Utils.errorExit("Failed to get to %s block number %d. Last had head block number %d and lib %d" % (blockType, blockNum, headBlockNum, libBlockNum))
+
+def waitForNodeStarted(node):
+    sleepTime=0
+    while sleepTime < 10 and node.getInfo(silentErrors=True) is None:
+        time.sleep(1)
+        sleepTime+=1
+
+def trackerResults(tracker, timeout):
+    if not tracker.waitForCatchup(timeout):
+        Print("WARNING: catchup node did not reach the producer's head within %d seconds" % (timeout))
+    tracker.stop()
+    results=tracker.results()
+    Print("  %s blocks/s, caught up after %s seconds, %d stalls, %d sync restarts" % ("%.1f" % (results["blocksPerSecond"]) if results["blocksPerSecond"] is not None else "n/a",
+          "%.1f" % (results["caughtUpSeconds"]) if results["caughtUpSeconds"] is not None else "n/a", len(results["stalls"]), results["syncRestarts"]))
+    return results
+
+def runScenario(syncFetchSpan, peerCount):
+    """Run the catchup cycles on a fresh cluster, returns the CatchupTracker results of every start and restart."""
+    global cluster
+    Print("Scenario sync-fetch-span %d, %d peers" % (syncFetchSpan, peerCount))
     cluster.killall(allInstances=killAll)
+    cluster.stopLogPipelines()
     cluster.cleanup()
+    # a Cluster only launches once
+    cluster=Cluster(walletd=True)
+    cluster.setWalletMgr(walletMgr)
+    relayNodes=peerCount-pnodes-startedNonProdNodes
+    totalNodes=startedNonProdNodes+pnodes+relayNodes+catchupCount
     specificExtraNodeosArgs={}
     txnGenNodeNum=pnodes  # next node after producer nodes
     for nodeNum in range(txnGenNodeNum, txnGenNodeNum+startedNonProdNodes):
         specificExtraNodeosArgs[nodeNum]="--plugin eosio::txn_test_gen_plugin --txn-test-gen-account-prefix txntestacct"
+    for nodeNum in range(totalNodes-catchupCount, totalNodes):
+        specificExtraNodeosArgs[nodeNum]="--sync-fetch-span %d" % (syncFetchSpan)
     Print("Stand up cluster")
     if cluster.launch(prodCount=prodCount, onlyBios=False, pnodes=pnodes, totalNodes=totalNodes, totalProducers=pnodes*prodCount,
                       useBiosBootFile=False, specificExtraNodeosArgs=specificExtraNodeosArgs, unstartedNodes=catchupCount, loadSystemContract=False) is False:
         Utils.errorExit("Failed to stand up eos cluster.")
+    if not dontKill:
+        # a node with a piped stderr would not outlive the test
+        cluster.startLogPipelines()
 
     Print("Validating system accounts after bootstrap")
     cluster.validateAccounts(None)
@@ -87,25 +146,6 @@ try:
     Print("Create accounts for generated txns")
     txnGenNodes[0].txnGenCreateTestAccounts(cluster.eosioAccount.name, cluster.eosioAccount.activePrivateKey)
 
-    def lib(node):
-        return node.getBlockNum(BlockType.lib)
-
-    def head(node):
-        return node.getBlockNum(BlockType.head)
-
-    def waitForBlock(node, blockNum, blockType=BlockType.head, timeout=None, reportInterval=20):
-        if not node.waitForBlock(blockNum, timeout=timeout, blockType=blockType, reportInterval=reportInterval):
-            info=node.getInfo()
-            headBlockNum=info["head_block_num"]
-            libBlockNum=info["last_irreversible_block_num"]
-            Utils.errorExit("Failed to get to %s block number %d. Last had head block number %d and lib %d" % (blockType, blockNum, headBlockNum, libBlockNum))
-
-    def waitForNodeStarted(node):
-        sleepTime=0
-        while sleepTime < 10 and node.getInfo(silentErrors=True) is None:
-            time.sleep(1)
-            sleepTime+=1
-
     node0=cluster.getNode(0)
 
     Print("Wait for account creation to be irreversible")
@@ -144,15 +184,18 @@ try:
     Print("Cycle through catchup scenarios")
     twoRounds=21*2*12
     twoRoundsTimeout=(twoRounds/2 + 10)  #2 rounds in seconds + some leeway
+    runs=[]
     for catchup_num in range(0, catchupCount):
         Print("Start catchup node")
+        catchupNodeNum=len(cluster.getNodes())
+        catchupNode=cluster.unstartedNodes[0]
+        tracker=CatchupTracker(catchupNode, catchupNodeNum, node0, intervalMs=args.sample_interval_ms, stallSeconds=args.stall_seconds)
+        tracker.start()
         cluster.launchUnstarted(cachePopen=True)
         lastLibNum=lib(node0)
         # verify producer lib is still advancing
         waitForBlock(node0, lastLibNum+1, timeout=twoRoundsTimeout, blockType=BlockType.lib)
 
-        catchupNode=cluster.getNodes()[-1]
-        catchupNodeNum=cluster.getNodes().index(catchupNode)
         waitForNodeStarted(catchupNode)
         lastCatchupLibNum=lib(catchupNode)
 
@@ -163,11 +206,14 @@ try:
         Print("Verify catchup node is advancing to producer")
         numBlocksToCatchup=(lastLibNum-lastCatchupLibNum-1)+twoRounds
         waitForBlock(catchupNode, lastLibNum, timeout=twoRoundsTimeout, blockType=BlockType.lib)
+        runs.append(dict(phase="start", catchup=catchup_num, **trackerResults(tracker, twoRoundsTimeout)))
 
         Print("Shutdown catchup node and validate exit code")
         catchupNode.interruptAndVerifyExitStatus(60)
 
         Print("Restart catchup node")
+        tracker=CatchupTracker(catchupNode, catchupNodeNum, node0, intervalMs=args.sample_interval_ms, stallSeconds=args.stall_seconds)
+        tracker.start()
         catchupNode.relaunch(catchupNodeNum, cachePopen=True)
         waitForNodeStarted(catchupNode)
         lastCatchupLibNum=lib(catchupNode)
@@ -184,9 +230,38 @@ try:
         Print("Verify catchup node is advancing to producer")
         # verify catchup node is advancing to producer
         waitForBlock(catchupNode, lastLibNum, timeout=(numBlocksToCatchup/2 + 60), blockType=BlockType.lib)
+        runs.append(dict(phase="restart", catchup=catchup_num, **trackerResults(tracker, twoRoundsTimeout)))
         catchupNode.interruptAndVerifyExitStatus(60)
         catchupNode.popenProc=None
 
+    return runs
+
+def medianCell(values):
+    summary=Utils.percentiles([value for value in values if value is not None])
+    return "%10.1f" % (summary[50]) if summary is not None else "%10s" % ("n/a")
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+
+    scenarios=[]
+    for syncFetchSpan in syncFetchSpans:
+        for peerCount in peerCounts:
+            scenarios.append({"syncFetchSpan": syncFetchSpan, "peerCount": peerCount, "runs": runScenario(syncFetchSpan, peerCount)})
+
+    Print(Utils.FileDivider)
+    Print("Medians over the catchup nodes")
+    Print("%10s %6s %-8s %10s %10s %10s %10s %10s" % ("fetch span", "peers", "phase", "blocks/s", "min rate", "catchup s", "stalls", "restarts"))
+    for scenario in scenarios:
+        for phase in ("start", "restart"):
+            runs=[run for run in scenario["runs"] if run["phase"] == phase]
+            Print("%10d %6d %-8s %s %s %s %10d %10d" % (scenario["syncFetchSpan"], scenario["peerCount"], phase, medianCell(run["blocksPerSecond"] for run in runs),
+                  medianCell(run["intervalBlocksPerSecond"]["min"] if run["intervalBlocksPerSecond"] is not None else None for run in runs),
+                  medianCell(run["caughtUpSeconds"] for run in runs), sum(len(run["stalls"]) for run in runs), sum(run["syncRestarts"] for run in runs)))
+    with open(args.output, "w") as f:
+        json.dump(scenarios, f, indent=2)
+    Print("Sync rates written to %s" % (args.output))
+
     testSuccessful=True
 
 finally:
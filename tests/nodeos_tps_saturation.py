@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from Node import BlockType
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from TpsSaturationFinder import TpsSaturationFinder
+
+import json
+
+###############################################################
+# nodeos_tps_saturation
+#
+#  Benchmark finding the highest transaction rate a cluster sustains.  For every cluster configuration in
+#  <--configs>, given as pnodes:prodCount:txnGenNodes, a cluster is launched with txn_test_gen_plugin on the
+#  txnGenNodes non-producing nodes, and a TpsSaturationFinder climbs a rate ladder and binary searches the
+#  saturation point, measuring the blocks of the first producing node.  The saturation curve of every
+#  configuration is printed and written to <--output> as json.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--configs", type=str, help="Comma separated cluster configurations, each pnodes:prodCount:txnGenNodes", default="1:1:2")
+extraArgs = appArgs.add(flag="--start-tps", type=int, help="First rate of the ladder", default=200)
+extraArgs = appArgs.add(flag="--max-tps", type=int, help="Highest rate to probe", default=20000)
+extraArgs = appArgs.add(flag="--ladder-factor", type=float, help="Rate multiplier between ladder steps", default=2.0)
+extraArgs = appArgs.add(flag="--resolution", type=float, help="Stop the binary search when the sustainable and unsustainable rates are this fraction apart", default=0.05)
+extraArgs = appArgs.add(flag="--warmup-blocks", type=int, help="Blocks to wait after starting generation before measuring", default=10)
+extraArgs = appArgs.add(flag="--measure-blocks", type=int, help="Blocks measured per rate", default=30)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the saturation curves to", default="tps_saturation.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+configs=[]
+for config in args.configs.split(","):
+    try:
+        pnodes, prodCount, txnGenNodes=(int(value) for value in config.split(":"))
+    except ValueError:
+        errorExit("Invalid cluster configuration \"%s\", expected pnodes:prodCount:txnGenNodes" % (config))
+    configs.append((pnodes, prodCount, txnGenNodes))
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+
+    curves=[]
+    for pnodes, prodCount, txnGenNodes in configs:
+        label="pnodes=%d prodCount=%d txnGenNodes=%d" % (pnodes, prodCount, txnGenNodes)
+        Print("Stand up cluster %s" % (label))
+        cluster.killall(allInstances=killAll)
+        cluster.cleanup()
+        # a Cluster only launches once
+        cluster=Cluster(walletd=True)
+        cluster.setWalletMgr(walletMgr)
+        specificExtraNodeosArgs={}
+        for nodeNum in range(pnodes, pnodes+txnGenNodes):
+            specificExtraNodeosArgs[nodeNum]="--plugin eosio::txn_test_gen_plugin --txn-test-gen-account-prefix txntestacct"
+        if cluster.launch(prodCount=prodCount, onlyBios=False, pnodes=pnodes, totalNodes=pnodes+txnGenNodes, totalProducers=pnodes*prodCount,
+                          useBiosBootFile=False, specificExtraNodeosArgs=specificExtraNodeosArgs, loadSystemContract=False) is False:
+            errorExit("Failed to stand up eos cluster %s." % (label))
+
+        genNodes=[cluster.getNode(nodeNum) for nodeNum in range(pnodes, pnodes+txnGenNodes)]
+        Print("Create accounts for generated txns")
+        genNodes[0].txnGenCreateTestAccounts(cluster.eosioAccount.name, cluster.eosioAccount.activePrivateKey)
+        node0=cluster.getNode(0)
+        if not node0.waitForBlock(node0.getHeadBlockNum(), blockType=BlockType.lib):
+            errorExit("Account creation for %s did not become irreversible" % (label))
+
+        finder=TpsSaturationFinder(node0, genNodes, label=label, warmupBlocks=args.warmup_blocks, measureBlocks=args.measure_blocks)
+        curve=finder.run(startTps=args.start_tps, maxTps=args.max_tps, ladderFactor=args.ladder_factor, resolution=args.resolution)
+        curves.append(curve)
+        TpsSaturationFinder.printCurve(curve)
+
+    Print(Utils.FileDivider)
+    for curve in curves:
+        TpsSaturationFinder.printCurve(curve)
+    with open(args.output, "w") as f:
+        json.dump(curves, f, indent=2)
+    Print("Saturation curves written to %s" % (args.output))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+from testUtils import Utils
+from Cluster import Cluster
+from WalletMgr import WalletMgr
+from TestHelper import AppArgs
+from TestHelper import TestHelper
+from ActionBenchmark import ActionBenchmark
+from ActionBenchmark import median
+from AccountFactory import AccountFactory
+from NodeLog import NodeLog
+
+import concurrent.futures
+import datetime
+import json
+import random
+import re
+import signal
+
+###############################################################
+# nodeos_wasm_runtime_benchmark
+#
+#  Side by side comparison of WASM runtime configurations.  Node 0 produces with the default runtime, and one
+#  otherwise identical validator per configuration of <--runtimes> peers with it.  A configuration is a base
+#  --wasm-runtime optionally followed by "+oc" for the EOS VM OC tier-up (--eos-vm-oc-enable with
+#  <--oc-compile-threads> and <--oc-cache-size-mb>), e.g. the default "eos-vm,eos-vm-jit,eos-vm-jit+oc".
+#
+#  The integration_test contract is deployed and <--count> store actions are pushed to every validator
+#  concurrently, so every validator meets the contract code at the same time.  Per configuration it reports
+#    - billed cpu and action elapsed time of the speculative execution on the validator (median and MAD)
+#    - the warm-up curve, median action elapsed time per <--bucket> consecutive invocations
+#    - block apply time of blocks with transactions, from the debug "received incoming block" log line to the
+#      "Received block" line the producer_plugin logs once the block is applied
+#    - block receive latency of the same blocks, the latency of their "Received block" lines, which is measured from
+#      the block timestamp and therefore includes the wait for the production slot, not just apply time
+#    - code cache behaviour, the elapsed time of the first invocations after a restart of the validator
+#      compared to the first invocations of the cold run (EOS VM OC keeps compiled code on disk)
+#  and writes everything to <--output> as json.  Runtimes the nodeos build does not support fail the launch.
+#
+###############################################################
+
+Print=Utils.Print
+errorExit=Utils.errorExit
+
+appArgs=AppArgs()
+extraArgs = appArgs.add(flag="--runtimes", type=str, help="Comma separated runtime configurations, base runtime with optional +oc", default="eos-vm,eos-vm-jit,eos-vm-jit+oc")
+extraArgs = appArgs.add(flag="--oc-compile-threads", type=int, help="--eos-vm-oc-compile-threads of the +oc configurations", default=1)
+extraArgs = appArgs.add(flag="--oc-cache-size-mb", type=int, help="--eos-vm-oc-cache-size-mb of the +oc configurations", default=1024)
+extraArgs = appArgs.add(flag="--count", type=int, help="store actions pushed to every validator", default=200)
+extraArgs = appArgs.add(flag="--restart-count", type=int, help="store actions pushed to every validator after its restart", default=20)
+extraArgs = appArgs.add(flag="--bucket", type=int, help="Invocations per point of the warm-up curve", default=10)
+extraArgs = appArgs.add(flag="--accounts", type=int, help="Authorizing test accounts per validator", default=2)
+extraArgs = appArgs.add(flag="--seed", type=int, help="Seed of the action data", default=1)
+extraArgs = appArgs.add(flag="--output", type=str, help="File to write the comparison to", default="wasm_runtime_benchmark.json")
+args = TestHelper.parse_args({"--dump-error-details","--keep-logs","-v","--leave-running","--clean-run","--wallet-port"}, applicationSpecificArgs=appArgs)
+Utils.Debug=args.v
+cluster=Cluster(walletd=True)
+dumpErrorDetails=args.dump_error_details
+keepLogs=args.keep_logs
+dontKill=args.leave_running
+killAll=args.clean_run
+walletPort=args.wallet_port
+
+runtimes=args.runtimes.split(",")
+def runtimeArgs(runtime):
+    base, _, tierUp=runtime.partition("+")
+    nodeosArgs="--wasm-runtime %s" % (base)
+    if tierUp == "oc":
+        nodeosArgs+=" --eos-vm-oc-enable --eos-vm-oc-compile-threads %d --eos-vm-oc-cache-size-mb %d" % (args.oc_compile_threads, args.oc_cache_size_mb)
+    elif tierUp != "":
+        errorExit("Unknown tier-up \"%s\" in runtime configuration %s" % (tierUp, runtime))
+    return nodeosArgs
+
+LogTimePattern=re.compile(r"^\w+\s+(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3})\s")
+IncomingBlockPattern=re.compile(r"received incoming block (\d+) ")
+ReceivedBlockPattern=re.compile(r"Received block [0-9a-f]+\.\.\. #(\d+) @ \S+ signed by \S+ \[trxs: (\d+), lib: \d+, conf: \d+, latency: (-?\d+) ms\]")
+
+def receivedBlockTimings(nodeId, firstBlockNum, lastBlockNum):
+    """Apply times and receive latencies in ms of the blocks with transactions between firstBlockNum and lastBlockNum
+    that node nodeId received, from its stderr logs. The apply time is the time between the "received incoming block"
+    and "Received block" lines of a block, the receive latency is the one the "Received block" line reports."""
+    incoming={}
+    applyTimes=[]
+    latencies=[]
+    def logTime(line):
+        match=LogTimePattern.match(line)
+        return datetime.datetime.strptime(match.group(1), Utils.TimeFmt) if match is not None else None
+    for line in NodeLog.readLines(nodeId):
+        match=IncomingBlockPattern.search(line)
+        if match is not None:
+            incoming[int(match.group(1))]=logTime(line)
+            continue
+        match=ReceivedBlockPattern.search(line)
+        if match is None:
+            continue
+        blockNum=int(match.group(1))
+        if not firstBlockNum <= blockNum <= lastBlockNum or int(match.group(2)) == 0:
+            continue
+        latencies.append(int(match.group(3)))
+        appliedTime, incomingTime=logTime(line), incoming.pop(blockNum, None)
+        if appliedTime is not None and incomingTime is not None:
+            applyTimes.append((appliedTime - incomingTime).total_seconds() * 1000)
+    return applyTimes, latencies
+
+def storeData(accounts, seed):
+    rng=random.Random(seed)
+    def data(index):
+        account=accounts[index % len(accounts)]
+        return "{\"from\":\"%s\",\"to\":\"%s\",\"num\":%d}" % (account.name, account.name, rng.randint(50, 150))
+    return data
+
+def pushConcurrently(benches, count, seedOffset):
+    """Run count store actions on every bench at the same time, returns the head block num before the pushes and the
+    one once all pushed transactions are in blocks."""
+    node0=cluster.getNode(0)
+    head=node0.getHeadBlockNum()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(benches)) as executor:
+        futures=[executor.submit(bench.run, "store", storeData(accountSets[index], args.seed + seedOffset + index), count, accountSets[index], 0)
+                 for index, bench in enumerate(benches)]
+        for future in futures:
+            future.result()
+    if not node0.waitForTransactionsInBlocks([transId for bench in benches for transId in bench.transIds], head):
+        errorExit("Pushed store actions did not make it into blocks")
+    return head, node0.getHeadBlockNum()
+
+walletMgr=WalletMgr(True, port=walletPort)
+testSuccessful=False
+killEosInstances=not dontKill
+killWallet=not dontKill
+
+try:
+    TestHelper.printSystemInfo("BEGIN")
+    cluster.setWalletMgr(walletMgr)
+    cluster.killall(allInstances=killAll)
+    cluster.cleanup()
+    Print("Stand up cluster with validators for %s" % (", ".join(runtimes)))
+    specificExtraNodeosArgs={nodeId: runtimeArgs(runtime) for nodeId, runtime in enumerate(runtimes, start=1)}
+    if cluster.launch(pnodes=1, totalNodes=len(runtimes) + 1, prodCount=1, topo="mesh", useBiosBootFile=False, specificExtraNodeosArgs=specificExtraNodeosArgs,
+                      loadSystemContract=False) is False:
+        errorExit("Failed to stand up eos cluster.")
+    node0=cluster.getNode(0)
+    validators=[cluster.getNode(nodeId) for nodeId in range(1, len(runtimes) + 1)]
+
+    keys=Cluster.createAccountKeys(len(runtimes) * args.accounts + 1)
+    if keys is None:
+        errorExit("Failed to create account keys")
+    contractAccount=keys[0]
+    contractAccount.name="runtimebench"
+    for index, account in enumerate(keys[1:]):
+        account.name=AccountFactory.accountName("rtauth", index)
+    accountSets=[keys[1 + index * args.accounts:1 + (index + 1) * args.accounts] for index in range(len(runtimes))]
+    walletMgr.create("bench", keys)
+    for account in keys[1:]:
+        node0.createAccount(account, cluster.eosioAccount, stakedDeposit=0, exitOnError=True)
+    ActionBenchmark.deploy(node0, cluster.eosioAccount, contractAccount, "unittests/test-contracts/integration_test", "integration_test.wasm", "integration_test.abi")
+    if not all(validator.waitForBlock(node0.getHeadBlockNum()) for validator in validators):
+        errorExit("Validators did not sync the contract deployment")
+
+    Print("Push %d store actions to every validator" % (args.count))
+    benches=[ActionBenchmark(validator, contractAccount.name) for validator in validators]
+    firstBlockNum, lastBlockNum=pushConcurrently(benches, args.count, 0)
+    if not all(validator.waitForBlock(lastBlockNum) for validator in validators):
+        errorExit("Validators did not sync the workload")
+
+    Print("Restart validators")
+    for nodeId, validator in enumerate(validators, start=1):
+        if not validator.kill(signal.SIGTERM):
+            errorExit("Failed to stop validator %d" % (nodeId))
+        if not validator.relaunch(nodeId, cachePopen=True):
+            errorExit("Failed to relaunch validator %d" % (nodeId))
+    restartBenches=[ActionBenchmark(validator, contractAccount.name) for validator in validators]
+    pushConcurrently(restartBenches, args.restart_count, len(runtimes))
+
+    comparison={}
+    for nodeId, (runtime, bench, restartBench) in enumerate(zip(runtimes, benches, restartBenches), start=1):
+        summaries=bench.results()["store"]
+        coldElapsed=bench.samples["store"]["elapsedUs"][:args.restart_count]
+        applyTimes, latencies=receivedBlockTimings(nodeId, firstBlockNum, lastBlockNum)
+        restartElapsed=restartBench.samples["store"]["elapsedUs"]
+        comparison[runtime]={
+            "nodeosArgs": runtimeArgs(runtime),
+            "cpuUs": summaries["cpuUs"],
+            "elapsedUs": summaries["elapsedUs"],
+            "warmupCurve": bench.warmupCurve("store", bucket=args.bucket),
+            "blockApplyMs": Utils.percentiles(applyTimes),
+            "blockReceiveLatencyMs": Utils.percentiles(latencies),
+            "coldFirstElapsedUs": coldElapsed[0] if len(coldElapsed) > 0 else None,
+            "coldMedianElapsedUs": median(coldElapsed) if len(coldElapsed) > 0 else None,
+            "restartFirstElapsedUs": restartElapsed[0] if len(restartElapsed) > 0 else None,
+            "restartMedianElapsedUs": median(restartElapsed) if len(restartElapsed) > 0 else None
+        }
+
+    Print(Utils.FileDivider)
+    def cell(value, fmt="%10.1f"):
+        return fmt % (value) if value is not None else "%10s" % ("n/a")
+    Print("%-20s %10s %10s %10s %10s %10s %10s %10s %10s %10s" % ("runtime", "cpu p50", "cpu MAD", "elapsed", "apply p50", "apply p90", "recv p50", "cold 1st", "restart 1st", "restart p50"))
+    for runtime, entry in comparison.items():
+        applyMs, latency=entry["blockApplyMs"], entry["blockReceiveLatencyMs"]
+        Print("%-20s %s %s %s %s %s %s %s %s %s" % (runtime, cell(entry["cpuUs"]["median"]), cell(entry["cpuUs"]["mad"]), cell(entry["elapsedUs"]["median"]),
+              cell(applyMs[50] if applyMs is not None else None), cell(applyMs[90] if applyMs is not None else None), cell(latency[50] if latency is not None else None),
+              cell(entry["coldFirstElapsedUs"]), cell(entry["restartFirstElapsedUs"]), cell(entry["restartMedianElapsedUs"])))
+    Print("Warm-up curve, median action elapsed us per %d invocations" % (args.bucket))
+    Print("%8s  %s" % ("first", "  ".join("%20s" % (runtime) for runtime in comparison)))
+    for point in range(max(len(entry["warmupCurve"]) for entry in comparison.values())):
+        values=[entry["warmupCurve"][point] if point < len(entry["warmupCurve"]) else None for entry in comparison.values()]
+        Print("%8d  %s" % (point * args.bucket, "  ".join("%20s" % ("%.1f" % (value) if value is not None else "-") for value in values)))
+    with open(args.output, "w") as f:
+        json.dump(comparison, f, indent=2)
+    Print("Comparison written to %s" % (args.output))
+
+    testSuccessful=True
+
+finally:
+    TestHelper.shutdown(cluster, walletMgr, testSuccessful=testSuccessful, killEosInstances=killEosInstances, killWallet=killWallet, keepLogs=keepLogs, cleanRun=killAll, dumpErrorDetails=dumpErrorDetails)
+
+exit(0)
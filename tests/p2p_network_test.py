@@ -5,6 +5,7 @@ import p2p_test_peers
 import impaired_network
 import lossy_network
 import p2p_stress
+from BlockPropagationProfiler import BlockPropagationProfiler
 
 import copy
 import decimal
@@ -39,6 +40,7 @@ parser.add_argument("--impaired_network", help="test impaired network", action='
 parser.add_argument("--lossy_network", help="test lossy network", action='store_true')
 parser.add_argument("--stress_network", help="test load/stress network", action='store_true')
 parser.add_argument("--not_kill_wallet", help="not killing walletd", action='store_true')
+parser.add_argument("--profile_propagation", help="measure how long blocks take to reach each host while the tests run", action='store_true')
 
 args = parser.parse_args()
 enableMongo=False
@@ -73,6 +75,9 @@ init_str=init_str+']}'
 
 #Print('init nodes with json str %s',(init_str))
 cluster.initializeNodesFromJson(init_str);
+if args.stress_network:
+    # push the stress transfers to every peer, not only to the first
+    module.nodes=[cluster.getNode(i) for i in range(len(hosts))]
 
 if args.not_kill_wallet == False:
     print('killing all wallets')
@@ -154,9 +159,15 @@ if trans is None:
 else:
     Print("transaction id %s" % (node0.getTransId(trans)))
 
+propagationResults=[]
 try:
     maxIndex = module.maxIndex()
     for cmdInd in range(maxIndex):
+        profiler=None
+        if args.profile_propagation:
+            profiler=BlockPropagationProfiler.fromCluster(cluster, topo="%s[%d]" % (type(module).__name__, cmdInd), parseConfig=False)
+            profiler.start()
+
         (transIdList, checkacct, expBal, errmsg) = module.execute(cmdInd, node0, testeraAccount, eosio)
 
         if len(transIdList) == 0 and len(checkacct) == 0:
@@ -187,6 +198,16 @@ try:
                 if failedcount == 0:
                     successhosts.append(host)
         Print("%d host(s) passed, %d host(s) failed" % (len(successhosts), len(hosts) - len(successhosts)))
+
+        if profiler is not None:
+            profiler.stop()
+            results=profiler.results()
+            profiler.printReport(results)
+            propagationResults.append(results)
+
+    if len(propagationResults) > 0:
+        Print("Block propagation by test step:")
+        BlockPropagationProfiler.printComparison(propagationResults)
 finally:
     Print("\nfinally: restore everything")
     module.on_exit()
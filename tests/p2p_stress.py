@@ -1,17 +1,23 @@
 import testUtils
 import p2p_test_peers
 import random
-import time
 import copy
-import threading
+import os
+import tempfile
 
 from core_symbol import CORE_SYMBOL
+from LoadGenerator import RateSchedule
+from TransactionLatencyTracker import TransactionLatencyTracker
+from TransactionCorpus import TransactionCorpus
+from TransactionCorpus import TransferFactory
 
 class StressNetwork:
     speeds=[1,5,10,30,60,100,500]
     sec=10
-    maxthreads=100
-    trList=[]
+    senders=100
+    # nodes the transfers are spread over round robin, so blocks carry transactions that entered the network at every
+    # peer; only the node given to execute if not set
+    nodes=None
 
     def maxIndex(self):
         return len(self.speeds)
@@ -22,11 +28,6 @@ class StressNetwork:
             s=s+random.choice("abcdefghijklmnopqrstuvwxyz12345")
         return s
     
-    def _transfer(self, node, acc1, acc2, amount, threadId, round):
-        memo="%d %d" % (threadId, round)
-        tr = node.transferFunds(acc1, acc2, amount, memo)
-        self.trList.append(tr)
-
     def execute(self, cmdInd, node, ta, eosio):
         print("\n==== network stress test: %d transaction(s)/s for %d secs ====" % (self.speeds[cmdInd], self.sec))
         total = self.speeds[cmdInd] * self.sec
@@ -61,43 +62,33 @@ class StressNetwork:
         print("transaction id %s" % (trid))
         node.waitForTransInBlock(trid)
 
-        self.trList = []
-        expBal = 0
-        nthreads=self.maxthreads
-        if nthreads > self.speeds[cmdInd]:
-            nthreads = self.speeds[cmdInd]
-        cycle = int(total / nthreads)
-        total = cycle * nthreads # rounding
-        delay = 1.0 / self.speeds[cmdInd] * nthreads
+        amount = 1
+        nodes = self.nodes if self.nodes is not None else [node]
+        print("signing %d currency0000 transfers from %s to %s" % (total, acc1.name, acc2.name))
+        corpusDir = tempfile.mkdtemp(prefix="p2p_stress")
+        corpusPath = os.path.join(corpusDir, "stress%d.trx" % (cmdInd))
+        factory = TransferFactory(amount=amount, memoPrefix="stress %d" % (cmdInd), destination=acc2.name)
+        TransactionCorpus.generate(corpusPath, TransactionCorpus.taposFromNode(node), [acc1], total, factory=factory)
 
-        print("start currency0000 trasfer from %s to %s for %d times with %d threads" % (acc1.name, acc2.name, total, nthreads))
+        print("start currency0000 transfer from %s to %s for %d times at %d transaction(s)/s over %d node(s)" % (acc1.name, acc2.name, total, self.speeds[cmdInd], len(nodes)))
+        tracker = TransactionLatencyTracker(node)
+        with tracker, TransactionCorpus(corpusPath) as corpus:
+            generator = corpus.replay(nodes, RateSchedule.constant(self.speeds[cmdInd], self.sec), workers=min(self.senders, self.speeds[cmdInd]), tracker=tracker)
+            results = generator.results()
+            generator.printReport(results)
+            print("pushes per node: %s" % (results.get("perNode", {})))
 
-        t00 = time.time()
-        for k in range(cycle):
-            t0 = time.time()
-            amount = 1
-            threadList = []
-            for m in range(nthreads):
-                th = threading.Thread(target = self._transfer,args = (node, acc1, acc2, amount, m, k))
-                th.start()
-                threadList.append(th)
-            for th in threadList:
-                th.join()
-            expBal = expBal + amount * nthreads
-            t1 = time.time()
-            if (t1-t0 < delay):
-                time.sleep(delay - (t1-t0))
-        t11 = time.time()
-        print("time used = %lf" % (t11 - t00))
+            transIdlist = generator.acceptedTransactionIds()
+            expBal = amount * len(transIdlist)
 
+            if not tracker.waitForAll(timeout=120, final=False):
+                print("%d accepted transaction(s) did not make it into a block" % (tracker.pending(final=False)))
         actBal = node.getAccountBalance(acc2.name)
         print("account %s: expect Balance:%d, actual Balance %d" % (acc2.name, expBal, actBal))
-
-        transIdlist = []
-        for tr in self.trList:
-            trid = node.getTransId(tr)
-            transIdlist.append(trid)
-            node.waitForTransInBlock(trid)
+        tracker.printReport()
+        os.remove(corpusPath)
+        os.remove(TransactionCorpus.indexPath(corpusPath))
+        os.rmdir(corpusDir)
         return (transIdlist, acc2.name, expBal, "")
     
     def on_exit(self):
@@ -98,7 +98,7 @@ try:
     Print("nodeos instances killed.")
 
     Print("Spread funds and validate")
-    if not cluster.spreadFundsAndValidate(10):
+    if not cluster.spreadFundsAndValidate(10, strict=True):
         errorExit("Failed to spread and validate funds.")
 
     Print("Wait on cluster sync.")
@@ -116,7 +116,7 @@ try:
     Print ("Cluster synched")
 
     Print("Spread funds and validate")
-    if not cluster.spreadFundsAndValidate(10):
+    if not cluster.spreadFundsAndValidate(10, strict=True):
         errorExit("Failed to spread and validate funds.")
 
     Print("Wait on cluster sync.")
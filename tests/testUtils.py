@@ -8,8 +8,10 @@ from collections import deque
 from collections import namedtuple
 import inspect
 import json
+import math
 import shlex
 import socket
+import tempfile
 from datetime import datetime
 from sys import stdout
 from sys import exit
@@ -48,6 +50,136 @@ addEnum(BlockLogAction, "trim")
 addEnum(BlockLogAction, "smoke_test")
 addEnum(BlockLogAction, "return_blocks")
 
+###########################################################################################
+class JsonArrayStream(object):
+    """Incrementally decodes the elements of a top level json array read from a binary stream (e.g. a subprocess pipe).
+    Only the element currently being decoded is buffered. Any output before the opening '[' is ignored.
+    fields: optional collection of keys, when provided object elements are projected to those keys and the values of all
+            other keys are skipped over without being decoded."""
+    DefaultChunkSize=1 << 16
+
+    # a complete string, a lone (unterminated) quote, or a structural bracket
+    __tokenPattern=re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|"|[{}\[\]]', re.DOTALL)
+    __stringPattern=re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    __memberPattern=re.compile(rb'\s*("[^"\\]*(?:\\.[^"\\]*)*")\s*:\s*', re.DOTALL)
+    __separatorPattern=re.compile(rb'[\s,]*')
+    __scalarPattern=re.compile(rb'[^,}\]\s]+')
+
+    def __init__(self, stream, fields=None, chunkSize=DefaultChunkSize):
+        assert(chunkSize > 0)
+        self.stream=stream
+        self.fields=frozenset(fields) if fields is not None else None
+        self.chunkSize=chunkSize
+        self.bytesRead=0
+
+    def __read(self, buf):
+        read=self.stream.read1 if hasattr(self.stream, "read1") else self.stream.read
+        chunk=read(self.chunkSize)
+        if not chunk:
+            return False
+        self.bytesRead+=len(chunk)
+        buf+=chunk
+        return True
+
+    @staticmethod
+    def __scanComposite(data, pos, depth, pattern):
+        """Scan data from pos for the bracket closing a composite value. Returns (end, depth, resumePos); end is None
+        if data runs out first, in which case scanning is resumed at resumePos with the returned depth."""
+        for m in pattern.finditer(data, pos):
+            token=m.group(0)
+            first=token[0:1]
+            if first==b'"':
+                if len(token)==1:
+                    # string continues past the end of what has been read so far
+                    return (None, depth, m.start())
+                continue
+            if first in b"{[":
+                depth+=1
+            else:
+                depth-=1
+                if depth==0:
+                    return (m.end(), 0, m.end())
+        return (None, depth, len(data))
+
+    def __iter__(self):
+        buf=bytearray()
+        while True:
+            idx=buf.find(b"[")
+            if idx!=-1:
+                del buf[:idx+1]
+                break
+            del buf[:]
+            if not self.__read(buf):
+                return
+
+        while True:
+            m=JsonArrayStream.__separatorPattern.match(buf)
+            if m.end()==len(buf):
+                del buf[:]
+                if not self.__read(buf):
+                    raise ValueError("JSON array ended before closing ']' after reading %d bytes" % (self.bytesRead))
+                continue
+            start=m.end()
+            first=buf[start:start+1]
+            if first==b"]":
+                return
+
+            if first in (b"{", b"["):
+                depth=0
+                pos=start
+                while True:
+                    end,depth,pos=JsonArrayStream.__scanComposite(buf, pos, depth, JsonArrayStream.__tokenPattern)
+                    if end is not None:
+                        break
+                    if not self.__read(buf):
+                        raise ValueError("JSON array element truncated after reading %d bytes" % (self.bytesRead))
+            else:
+                while True:
+                    sm=JsonArrayStream.__stringPattern.match(buf, start) if first==b'"' else JsonArrayStream.__scalarPattern.match(buf, start)
+                    if sm is not None and sm.end() < len(buf):
+                        end=sm.end()
+                        break
+                    if not self.__read(buf):
+                        raise ValueError("JSON array element truncated after reading %d bytes" % (self.bytesRead))
+
+            element=bytes(buf[start:end])
+            del buf[:end]
+            if self.fields is not None and first==b"{":
+                yield JsonArrayStream.project(element, self.fields)
+            else:
+                yield json.loads(element)
+
+    @staticmethod
+    def __skipValue(data, pos):
+        first=data[pos:pos+1]
+        if first in (b"{", b"["):
+            end,_,_=JsonArrayStream.__scanComposite(data, pos, 0, JsonArrayStream.__tokenPattern)
+            return end
+        pattern=JsonArrayStream.__stringPattern if first==b'"' else JsonArrayStream.__scalarPattern
+        m=pattern.match(data, pos)
+        return m.end() if m is not None else None
+
+    @staticmethod
+    def project(data, fields):
+        """Decode only the top level members of the json object in data (bytes) whose keys are in fields."""
+        result={}
+        remaining=len(fields)
+        pos=data.index(b"{")+1
+        while remaining > 0:
+            m=JsonArrayStream.__memberPattern.match(data, pos)
+            if m is None:
+                break
+            key=json.loads(m.group(1))
+            valueStart=m.end()
+            valueEnd=JsonArrayStream.__skipValue(data, valueStart)
+            if valueEnd is None:
+                raise ValueError("Malformed value for key \"%s\" in JSON object" % (key))
+            if key in fields:
+                result[key]=json.loads(data[valueStart:valueEnd])
+                remaining-=1
+            pos=JsonArrayStream.__separatorPattern.match(data, valueEnd).end()
+        return result
+
 ###########################################################################################
 class Utils:
     Debug=False
@@ -65,6 +197,8 @@ class Utils:
     EosLauncherPath="programs/eosio-launcher/eosio-launcher"
     MongoPath="mongo"
     ShuttingDown=False
+    # dumpErrorDetails copies all logs to stdout instead of printing a LogTriage
+    FullErrorDetails=False
     CheckOutputDeque=deque(maxlen=10)
 
     EosBlockLogPath="programs/eosio-blocklog/eosio-blocklog"
@@ -313,8 +447,14 @@ class Utils:
         return "pgrep %s %s" % (pgrepOpts, serverName)
 
     @staticmethod
-    def getBlockLog(blockLogLocation, blockLogAction=BlockLogAction.return_blocks, outputFile=None, first=None, last=None, throwException=False, silentErrors=False, exitOnError=False):
+    def getBlockLog(blockLogLocation, blockLogAction=BlockLogAction.return_blocks, outputFile=None, first=None, last=None, throwException=False, silentErrors=False, exitOnError=False, stream=False, fields=None):
+        """Run eosio-blocklog against blockLogLocation. For BlockLogAction.return_blocks, stream=True returns a generator
+        of block dictionaries (see getBlockLogStream) instead of the whole decoded json array."""
         assert(isinstance(blockLogLocation, str))
+        if stream and blockLogAction==BlockLogAction.return_blocks:
+            assert outputFile is None, "streamed block logs are read from stdout, outputFile cannot be used"
+            return Utils.getBlockLogStream(blockLogLocation, first=first, last=last, fields=fields, throwException=throwException, silentErrors=silentErrors, exitOnError=exitOnError)
+
         outputFileStr=" --output-file %s " % (outputFile) if outputFile is not None else ""
         firstStr=" --first %s " % (first) if first is not None else ""
         lastStr=" --last %s " % (last) if last is not None else ""
@@ -360,6 +500,52 @@ class Utils:
 
         return rtn
 
+    @staticmethod
+    def getBlockLogStream(blockLogLocation, first=None, last=None, fields=None, throwException=False, silentErrors=False, exitOnError=False, chunkSize=JsonArrayStream.DefaultChunkSize):
+        """Generator yielding one block dictionary at a time from eosio-blocklog's stdout pipe, so only the current block is held in memory.
+        first/last: block number window passed as --first/--last.
+        fields: optional collection of top level block keys to decode, all other subtrees are skipped without being decoded."""
+        assert(isinstance(blockLogLocation, str))
+        cmdArr=[Utils.EosBlockLogPath, "--blocks-dir", blockLogLocation, "--as-json-array", "--no-pretty-print"]
+        if first is not None:
+            cmdArr+=["--first", str(first)]
+        if last is not None:
+            cmdArr+=["--last", str(last)]
+        cmd=" ".join(cmdArr)
+        if Utils.Debug: Utils.Print("cmd: %s" % (cmd))
+
+        # stderr goes to a file so that a chatty eosio-blocklog can never block on a full pipe while we only drain stdout
+        with tempfile.TemporaryFile() as errFile:
+            popen=subprocess.Popen(cmdArr, stdout=subprocess.PIPE, stderr=errFile)
+            try:
+                for block in JsonArrayStream(popen.stdout, fields=fields, chunkSize=chunkSize):
+                    yield block
+            except BaseException:
+                # consumer stopped early or the output was malformed, nothing else will drain the pipe
+                popen.kill()
+                popen.wait()
+                raise
+            finally:
+                popen.stdout.close()
+            popen.wait()
+
+            errFile.seek(0)
+            error=errFile.read()
+            Utils.CheckOutputDeque.append((b"", error, cmdArr))
+
+        if popen.returncode == 0:
+            return
+
+        if throwException:
+            raise subprocess.CalledProcessError(returncode=popen.returncode, cmd=cmd, output=error)
+        if not silentErrors:
+            errorMsg="Exception during \"%s\". %s" % (cmd, error.decode("utf-8"))
+            if exitOnError:
+                Utils.cmdError(errorMsg)
+                Utils.errorExit(errorMsg)
+            else:
+                Utils.Print("ERROR: %s" % (errorMsg))
+
     @staticmethod
     def compare(obj1,obj2,context):
         type1=type(obj1)
@@ -422,6 +608,47 @@ class Utils:
 
         return "comparison of %s type is not supported, context=%s" % (typeName,context)
 
+    @staticmethod
+    def percentiles(values, percents=(50, 90, 99)):
+        """Nearest rank percentiles of values, as a dictionary of percent to value, plus "count", "min", "max" and
+        "mean" entries.  None if values is empty."""
+        ordered=sorted(values)
+        if len(ordered) == 0:
+            return None
+        summary={"count": len(ordered), "min": ordered[0], "max": ordered[-1], "mean": sum(ordered) / len(ordered)}
+        for percent in percents:
+            rank=max(1, math.ceil(percent / 100 * len(ordered)))
+            summary[percent]=ordered[rank - 1]
+        return summary
+
+    NameCharMap=".12345abcdefghijklmnopqrstuvwxyz"
+
+    @staticmethod
+    def nameToUint64(name):
+        """Encode an eosio name (up to 12 chars of .1-5a-z, plus a 13th of .1-5a-j) into its uint64 value."""
+        assert(isinstance(name, str))
+        assert len(name) <= 13, "name %s is longer than 13 characters" % (name)
+        value=0
+        for i in range(13):
+            c=Utils.NameCharMap.index(name[i]) if i < len(name) else 0
+            if i < 12:
+                value|=(c & 0x1f) << (64 - 5 * (i + 1))
+            else:
+                assert c <= 0x0f, "13th character of name %s is out of range" % (name)
+                value|=c
+        return value
+
+    @staticmethod
+    def uint64ToName(value):
+        """Decode the uint64 value of an eosio name back into its string form."""
+        chars=[]
+        tmp=value
+        for i in range(13):
+            mask=0x0f if i == 0 else 0x1f
+            chars.append(Utils.NameCharMap[tmp & mask])
+            tmp>>=(4 if i == 0 else 5)
+        return "".join(reversed(chars)).rstrip(".")
+
 ###########################################################################################
 class Account(object):
     # pylint: disable=too-few-public-methods